@@ -0,0 +1,50 @@
+"""
+Бенчмарки горячих путей проекта. Запуск из корня репозитория:
+
+    python -m benchmarks.bench_embedding_index
+
+Сквозной бенчмарк API (создание, лента, проверка, отчёт, голос, комментарии)
+работает без сети на заглушке модели и пишет результаты в JSON, который
+сравнивается с прошлым прогоном:
+
+    python -m benchmarks.bench_api --json results/HEAD.json
+    python -m benchmarks.compare results/base.json results/HEAD.json --threshold 0.2
+"""
+import os
+import tempfile
+
+
+def setup_django(temp_db=False, offline=False):
+    """
+    temp_db=True — отдельная sqlite-база во временном каталоге с применёнными миграциями.
+    offline=True — вдобавок заглушка модели (benchmarks.stub_model) и все файлы
+    проекта (медиа, снимки индексов, журнал, профили) во временном каталоге.
+    """
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'ddd_project.settings')
+    import django
+    from django.conf import settings
+    if temp_db or offline:
+        root = tempfile.mkdtemp(prefix='bench_')
+        settings.DATABASES['default'] = {'ENGINE': 'django.db.backends.sqlite3', 'NAME': os.path.join(root, 'db.sqlite3')}
+    if offline:
+        settings.EMBEDDING_MODEL = {**settings.EMBEDDING_MODEL, 'LOADER': 'benchmarks.stub_model.load', 'PRELOAD': False}
+        settings.EMBEDDING_CACHE = {**settings.EMBEDDING_CACHE, 'DISK_PATH': None}
+        settings.MEDIA_ROOT = os.path.join(root, 'media')
+        settings.SIMILARITY_SEARCH = {
+            **settings.SIMILARITY_SEARCH,
+            'INDEX_PATH': os.path.join(root, 'similarity_index.npz'),
+            'CHUNK_INDEX_PATH': os.path.join(root, 'similarity_chunk_index.npz'),
+        }
+        settings.LEDGER = {
+            **settings.LEDGER,
+            'PATH': os.path.join(root, 'ledger.jsonl'),
+            'INDEX_PATH': os.path.join(root, 'ledger_index.sqlite3'),
+            'BLOCKS_PATH': os.path.join(root, 'ledger_blocks.jsonl'),
+        }
+        settings.PROFILING = {**settings.PROFILING, 'ENABLED': False, 'DIR': os.path.join(root, 'profiles')}
+        settings.POST_INGESTION = {**settings.POST_INGESTION, 'ASYNC': False}
+        settings.ALLOWED_HOSTS = ['*']
+    django.setup()
+    if temp_db or offline:
+        from django.core.management import call_command
+        call_command('migrate', verbosity=0)
@@ -0,0 +1,67 @@
+"""
+Полнота (recall) и задержка приближённого движка IVF относительно точного
+перебора на синтетических кластеризованных эмбеддингах.
+
+    python -m benchmarks.bench_ann_recall --size 200000 --nlist 512 --nprobe 8 16 32
+"""
+import argparse
+import time
+
+import numpy as np
+
+from posts.search_engines import BruteForceEngine, IVFEngine, normalize
+
+DIM = 384
+
+
+def synthetic_embeddings(rng, size, topics=2000, spread=1.0):
+    centers = rng.standard_normal((topics, DIM), dtype=np.float32)
+    labels = rng.integers(0, topics, size)
+    noise = rng.standard_normal((size, DIM), dtype=np.float32) * spread
+    return normalize(centers[labels] + noise)
+
+
+def timed_search(engine, queries, k):
+    started = time.perf_counter()
+    results = [[item_id for _, item_id in engine.search(q, k)] for q in queries]
+    return results, (time.perf_counter() - started) / len(queries) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--size', type=int, default=200_000)
+    parser.add_argument('--queries', type=int, default=200)
+    parser.add_argument('--k', type=int, default=10)
+    parser.add_argument('--nlist', type=int, default=512)
+    parser.add_argument('--nprobe', type=int, nargs='+', default=[4, 8, 16, 32])
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    vectors = synthetic_embeddings(rng, args.size)
+    ids = np.arange(1, args.size + 1, dtype=np.int64)
+    # запросы — зашумлённые копии существующих постов, как у реальных дубликатов
+    picked = rng.choice(args.size, args.queries, replace=False)
+    queries = normalize(vectors[picked] + rng.standard_normal((args.queries, DIM), dtype=np.float32) * 0.02)
+
+    exact = BruteForceEngine(DIM)
+    exact.build(ids, vectors)
+    truth, exact_ms = timed_search(exact, queries, args.k)
+    print(f"posts={args.size} dim={DIM} k={args.k}")
+    print(f"brute: {exact_ms:.2f} ms/query")
+
+    started = time.perf_counter()
+    ivf = IVFEngine(DIM, nlist=args.nlist, train_size=args.nlist)
+    ivf.build(ids, vectors)
+    print(f"ivf: обучение и разбиение {time.perf_counter() - started:.1f} s, nlist={args.nlist}")
+
+    print(f"{'nprobe':>7} {'recall@1':>9} {f'recall@{args.k}':>10} {'ms/query':>9} {'speedup':>8}")
+    for nprobe in args.nprobe:
+        ivf.nprobe = nprobe
+        found, ivf_ms = timed_search(ivf, queries, args.k)
+        recall_1 = np.mean([f[:1] == t[:1] for f, t in zip(found, truth)])
+        recall_k = np.mean([len(set(f) & set(t)) / len(t) for f, t in zip(found, truth)])
+        print(f"{nprobe:>7} {recall_1:>9.3f} {recall_k:>10.3f} {ivf_ms:>9.2f} {exact_ms / ivf_ms:>7.1f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,176 @@
+"""
+Сквозной бенчмарк горячих путей API на синтетических данных без сети:
+создание постов (текст, точная копия, PDF малый и большой, txt, изображение),
+лента, проверка хэша (одиночная, промах, пакет), отчёт (первая генерация,
+из кэша, 304), голос и комментарии. Модель — benchmarks.stub_model, база,
+медиа, индексы и журнал — во временном каталоге.
+
+Результат — медиана и p95 каждой операции; --json сохраняет их для
+сравнения между коммитами, --compare сразу сравнивает с базовым JSON и
+завершается с кодом 1 при регрессии медиан больше --threshold.
+
+    python -m benchmarks.bench_api --posts 5000 --json results/HEAD.json
+    python -m benchmarks.bench_api --json results/HEAD.json --compare results/base.json --threshold 0.2
+"""
+import argparse
+import random
+import statistics
+import sys
+import time
+
+from benchmarks import setup_django
+
+SUITE = 'api'
+
+
+class Runner:
+    def __init__(self, client):
+        self.client = client
+        self.timings = {}
+
+    def measure(self, name, calls, expected_status):
+        """calls — список функций без аргументов, каждая делает один запрос."""
+        samples = []
+        for call in calls:
+            started = time.perf_counter()
+            response = call()
+            if response.streaming:
+                b''.join(response.streaming_content)
+            elapsed = time.perf_counter() - started
+            if response.status_code != expected_status:
+                raise RuntimeError(f"{name}: ответ {response.status_code}, ожидался {expected_status}")
+            samples.append(elapsed * 1000)
+        self.timings[name] = samples
+        return samples
+
+
+def percentile(samples, q):
+    ordered = sorted(samples)
+    return ordered[min(int(len(ordered) * q), len(ordered) - 1)]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--posts', type=int, default=2000, help="постов в базе до замеров")
+    parser.add_argument('--ledger-records', type=int, default=10000)
+    parser.add_argument('--repeats', type=int, default=30)
+    parser.add_argument('--doc-pages', type=int, default=4)
+    parser.add_argument('--large-doc-pages', type=int, default=40)
+    parser.add_argument('--txt-kb', type=int, default=64)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--json', help="куда сохранить результаты")
+    parser.add_argument('--compare', help="базовый JSON для проверки регрессий")
+    parser.add_argument('--threshold', type=float, default=0.2)
+    args = parser.parse_args()
+
+    setup_django(offline=True)
+    from django.contrib.auth import get_user_model
+    from django.core.files.uploadedfile import SimpleUploadedFile
+    from rest_framework.test import APIClient
+
+    from benchmarks import data
+    from benchmarks.results import compare, load_results, metric, print_comparison, write_results
+    from posts.blockchain_utils import get_ledger
+    from posts.models import Post
+    from posts.pagination import KeysetPagination
+
+    rng = random.Random(args.seed)
+    User = get_user_model()
+    author = User.objects.create_user('bench', password='bench')
+    voter = User.objects.create_user('voter', password='voter')
+
+    started = time.perf_counter()
+    seeded = data.create_posts(author, args.posts, rng)
+    data.fill_ledger(get_ledger(), args.ledger_records)
+    print(f"данные: {args.posts} постов, {args.ledger_records} записей журнала за {time.perf_counter() - started:.1f} s")
+
+    client = APIClient()
+    client.force_authenticate(author)
+    voter_client = APIClient()
+    voter_client.force_authenticate(voter)
+    runner = Runner(client)
+    repeats = args.repeats
+    few = max(repeats // 5, 3)
+
+    def create(title, post_type, **fields):
+        return lambda: client.post('/api/posts/create/', {'title': title, 'type': post_type, **fields}, format='multipart')
+
+    def upload(name, content, content_type):
+        return SimpleUploadedFile(name, content, content_type)
+
+    # прогрев: модель, индексы, фильтр Блума, пул процессов PDF
+    create('warmup', 'text', content=data.make_text(rng))()
+    create('warmup', 'document', document=upload('w.pdf', data.make_pdf(rng, args.large_doc_pages), 'application/pdf'))()
+
+    runner.measure('create_text', [create(f't{i}', 'text', content=data.make_text(rng)) for i in range(repeats)], 201)
+    duplicates = Post.objects.filter(sha256_hash__in=seeded[:repeats]).values_list('content', flat=True)
+    runner.measure('create_text_duplicate', [create(f'd{i}', 'text', content=c) for i, c in enumerate(duplicates)], 201)
+    runner.measure('create_document_pdf', [
+        create(f'p{i}', 'document', document=upload(f'p{i}.pdf', data.make_pdf(rng, args.doc_pages), 'application/pdf'))
+        for i in range(repeats)
+    ], 201)
+    runner.measure('create_document_pdf_large', [
+        create(f'l{i}', 'document', document=upload(f'l{i}.pdf', data.make_pdf(rng, args.large_doc_pages), 'application/pdf'))
+        for i in range(few)
+    ], 201)
+    runner.measure('create_document_txt', [
+        create(f'x{i}', 'document', document=upload(f'x{i}.txt', data.make_txt(rng, args.txt_kb), 'text/plain'))
+        for i in range(repeats)
+    ], 201)
+    runner.measure('create_image', [
+        create(f'i{i}', 'image', image=upload(f'i{i}.png', data.make_image(rng), 'image/png'))
+        for i in range(repeats)
+    ], 201)
+
+    middle = Post.objects.order_by('-created_at', '-id').only('id', 'created_at')[Post.objects.count() // 2]
+    deep_url = f'/api/posts/?cursor={KeysetPagination().encode_cursor(middle)}'
+    runner.measure('list_first_page', [lambda: client.get('/api/posts/')] * repeats, 200)
+    runner.measure('list_deep_page', [lambda: client.get(deep_url)] * repeats, 200)
+
+    hits = rng.sample(seeded, min(repeats, len(seeded)))
+    runner.measure('verify_hit', [lambda h=h: client.get(f'/api/posts/verify/?hash={h}') for h in hits], 200)
+    runner.measure('verify_miss', [lambda i=i: client.get(f'/api/posts/verify/?hash={i:064x}') for i in range(repeats)], 200)
+    batch = rng.sample(seeded, min(250, len(seeded))) + [f'{i:064x}' for i in range(250)]
+    runner.measure('verify_batch_500', [
+        lambda: client.post('/api/posts/verify/batch/', {'hashes': batch}, format='json')
+    ] * few, 200)
+
+    report_hashes = hits[:repeats]
+    runner.measure('report_cold', [lambda h=h: client.get(f'/api/posts/report/?hash={h}') for h in report_hashes], 200)
+    runner.measure('report_cached', [lambda h=h: client.get(f'/api/posts/report/?hash={h}') for h in report_hashes], 200)
+    etags = {h: client.get(f'/api/posts/report/?hash={h}')['ETag'] for h in report_hashes}
+    runner.measure('report_not_modified', [
+        lambda h=h: client.get(f'/api/posts/report/?hash={h}', HTTP_IF_NONE_MATCH=etags[h]) for h in report_hashes
+    ], 304)
+
+    post_ids = list(Post.objects.filter(sha256_hash__in=hits).values_list('id', flat=True))
+    runner.measure('vote', [lambda pk=pk: voter_client.post(f'/api/posts/{pk}/vote/') for pk in post_ids], 200)
+    runner.measure('comment_create', [
+        lambda pk=pk: client.post(f'/api/posts/{pk}/comments/add/', {'text': data.make_text(rng, 20)}, format='json')
+        for pk in post_ids
+    ], 201)
+    runner.measure('comment_list', [lambda pk=pk: client.get(f'/api/posts/{pk}/comments/') for pk in post_ids], 200)
+
+    metrics = {}
+    print(f"{'операция':<28} {'медиана, ms':>12} {'p95, ms':>9} {'n':>4}")
+    for name, samples in runner.timings.items():
+        median, p95 = statistics.median(samples), percentile(samples, 0.95)
+        metrics[f'{name}.median_ms'] = metric(median)
+        metrics[f'{name}.p95_ms'] = metric(p95)
+        print(f"{name:<28} {median:>12.2f} {p95:>9.2f} {len(samples):>4}")
+
+    params = {key: value for key, value in vars(args).items() if key not in ('json', 'compare', 'threshold')}
+    current = {'suite': SUITE, 'params': params, 'metrics': metrics, 'environment': {}}
+    if args.json:
+        current = write_results(args.json, SUITE, params, metrics)
+        print(f"результаты: {args.json}")
+    if args.compare:
+        baseline = load_results(args.compare)
+        rows = compare(baseline, current, args.threshold, '*.median_ms')
+        print_comparison(rows, baseline, current, args.threshold)
+        if any(row[4] for row in rows):
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
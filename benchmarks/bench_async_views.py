@@ -0,0 +1,61 @@
+"""
+Конкурентная нагрузка на три варианта развёртывания: WSGI (ddd_project.wsgi в
+пуле из --wsgi-threads потоков), ASGI с синхронными DRF-представлениями и ASGI
+с async-представлениями (settings.ASYNC_VIEWS). Каждый вариант при каждом
+числе пользователей из --users — отдельный прогон benchmarks.bench_load в
+своём процессе с чистыми данными; смесь по умолчанию — чтение с редкими
+созданиями постов.
+
+    python -m benchmarks.bench_async_views --users 1 8 32 128 --duration 15
+    python -m benchmarks.bench_async_views --mix verify=1 --users 64 256
+"""
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+
+from benchmarks.results import load_results
+
+DEPLOYMENTS = {
+    'wsgi': ['--app', 'wsgi'],
+    'asgi_sync': ['--app', 'asgi', '--sync-views'],
+    'asgi_async': ['--app', 'asgi'],
+}
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--users', type=int, nargs='+', default=[1, 8, 32, 128])
+    parser.add_argument('--duration', type=float, default=15)
+    parser.add_argument('--mix', default='verify=4,list=4,comment_list=2,create_text=1')
+    parser.add_argument('--wsgi-threads', type=int, default=8)
+    parser.add_argument('--deployments', nargs='+', choices=list(DEPLOYMENTS), default=list(DEPLOYMENTS))
+    args = parser.parse_args()
+
+    print(f"{'вариант':<11} {'польз.':>6} {'в секунду':>10} {'p50, ms':>9} {'p95, ms':>9} {'p99, ms':>9} {'ошибки':>7}")
+    with tempfile.TemporaryDirectory(prefix='bench_async_') as root:
+        for users in args.users:
+            for name in args.deployments:
+                path = os.path.join(root, f'{name}_{users}.json')
+                command = [
+                    sys.executable, '-m', 'benchmarks.bench_load', *DEPLOYMENTS[name],
+                    '--users', str(users), '--duration', str(args.duration), '--mix', args.mix,
+                    '--wsgi-threads', str(args.wsgi_threads), '--json', path,
+                ]
+                completed = subprocess.run(command, capture_output=True, text=True)
+                if completed.returncode != 0:
+                    print(f"{name:<11} {users:>6}  прогон завершился с кодом {completed.returncode}:")
+                    print(completed.stderr[-2000:])
+                    continue
+                metrics = load_results(path)['metrics']
+
+                def value(key):
+                    return metrics[f'total.{key}']['value']
+
+                print(f"{name:<11} {users:>6} {value('rps'):>10.1f} {value('p50_ms'):>9.1f} "
+                      f"{value('p95_ms'):>9.1f} {value('p99_ms'):>9.1f} {value('error_rate'):>7.1%}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,56 @@
+"""
+Задержка сравнения документа по фрагментам (chunk_similarity) в зависимости
+от размера корпуса и движка индекса. Эмбеддинги синтетические, кодирование
+фрагментов моделью сюда не входит.
+
+    python -m benchmarks.bench_chunk_similarity --posts 1000 10000 --chunks 16 --engines brute ivf
+"""
+import argparse
+import time
+
+import numpy as np
+
+from benchmarks import setup_django
+
+DIM = 384
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--posts', type=int, nargs='+', default=[1000, 10000])
+    parser.add_argument('--chunks', type=int, default=16, help="фрагментов на пост и в запросе")
+    parser.add_argument('--engines', nargs='+', default=['brute', 'ivf'])
+    parser.add_argument('--queries', type=int, default=10)
+    args = parser.parse_args()
+
+    setup_django()
+    from posts.chunking import CHUNK_ID_BASE, ChunkIndex, chunk_similarity
+    from posts.search_engines import normalize
+
+    if not 0 < args.chunks <= CHUNK_ID_BASE:
+        parser.error(f"--chunks должно быть от 1 до {CHUNK_ID_BASE}")
+    rng = np.random.default_rng(0)
+    print(f"{'posts':>7} {'chunks':>8} {'engine':>6} {'ms/document':>12}")
+    for posts in args.posts:
+        total = posts * args.chunks
+        vectors = normalize(rng.standard_normal((total, DIM), dtype=np.float32))
+        post_ids = np.repeat(np.arange(1, posts + 1), args.chunks)
+        item_ids = post_ids * CHUNK_ID_BASE + np.tile(np.arange(args.chunks), posts)
+        for engine in args.engines:
+            options = {'nlist': max(int(np.sqrt(total)), 16), 'nprobe': 8} if engine == 'ivf' else {}
+            index = ChunkIndex(engine=engine, options=options)
+            index._ensure_engine(DIM)
+            index.engine.build(item_ids, vectors)
+            # документ-запрос: зашумлённые фрагменты случайного поста
+            started = time.perf_counter()
+            for _ in range(args.queries):
+                source = rng.integers(0, posts)
+                query = vectors[source * args.chunks:(source + 1) * args.chunks]
+                query = query + rng.standard_normal(query.shape, dtype=np.float32) * 0.01
+                chunk_similarity(query, index=index)
+            elapsed = (time.perf_counter() - started) / args.queries * 1000
+            print(f"{posts:>7} {total:>8} {engine:>6} {elapsed:>12.1f}")
+
+
+if __name__ == '__main__':
+    main()
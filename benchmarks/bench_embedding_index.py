@@ -0,0 +1,64 @@
+"""
+Сравнивает старый поиск максимального сходства (json.loads + косинус на каждую
+строку в цикле Python) с точным движком индекса (одно умножение матрицы на вектор).
+
+    python -m benchmarks.bench_embedding_index --sizes 10000 100000 1000000
+"""
+import argparse
+import json
+import time
+
+import numpy as np
+
+from posts.search_engines import BruteForceEngine
+
+DIM = 384
+
+
+def legacy_max_similarity(query, stored):
+    max_sim = 0.0
+    for raw in stored:
+        existing = np.asarray(json.loads(raw), dtype=np.float32)
+        sim = float(np.dot(query, existing) / (np.linalg.norm(query) * np.linalg.norm(existing)))
+        if sim > max_sim:
+            max_sim = sim
+    return max_sim
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10_000, 100_000, 1_000_000])
+    parser.add_argument('--queries', type=int, default=20)
+    parser.add_argument('--legacy-limit', type=int, default=20_000,
+                        help="старый цикл меряется на выборке такого размера и экстраполируется линейно")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    queries = rng.standard_normal((args.queries, DIM), dtype=np.float32)
+
+    print(f"{'posts':>10} {'legacy, ms':>12} {'index, ms':>10} {'speedup':>9} {'build, s':>9}")
+    for size in args.sizes:
+        vectors = rng.standard_normal((size, DIM), dtype=np.float32)
+
+        started = time.perf_counter()
+        index = BruteForceEngine(DIM, capacity=size)
+        for post_id, vector in enumerate(vectors, start=1):
+            index.add(post_id, vector)
+        build = time.perf_counter() - started
+
+        started = time.perf_counter()
+        for query in queries:
+            index.search(query, k=1)
+        index_ms = (time.perf_counter() - started) / len(queries) * 1000
+
+        sample = min(size, args.legacy_limit)
+        stored = [json.dumps(v.tolist()) for v in vectors[:sample]]
+        started = time.perf_counter()
+        legacy_max_similarity(queries[0], stored)
+        legacy_ms = (time.perf_counter() - started) * 1000 * size / sample
+
+        print(f"{size:>10} {legacy_ms:>12.1f} {index_ms:>10.2f} {legacy_ms / index_ms:>8.0f}x {build:>9.2f}")
+
+
+if __name__ == '__main__':
+    main()
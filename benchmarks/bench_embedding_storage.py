@@ -0,0 +1,66 @@
+"""
+Размер хранения и время разбора эмбеддингов: старый JSON-текст против
+бинарных блобов float32/float16 (embedding_codec). Размер БД меряется на
+отдельных sqlite-файлах с одной таблицей.
+
+    python -m benchmarks.bench_embedding_storage --rows 20000
+"""
+import argparse
+import json
+import os
+import sqlite3
+import tempfile
+import time
+
+import numpy as np
+
+from benchmarks import setup_django
+
+DIM = 384
+
+
+def sqlite_size(values, column_type):
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'bench.sqlite3')
+        conn = sqlite3.connect(path)
+        conn.execute(f"CREATE TABLE post (id INTEGER PRIMARY KEY, embedding {column_type})")
+        conn.executemany("INSERT INTO post (embedding) VALUES (?)", ((v,) for v in values))
+        conn.commit()
+        conn.execute("VACUUM")
+        conn.close()
+        return os.path.getsize(path)
+
+
+def parse_time(values, decode):
+    started = time.perf_counter()
+    for value in values:
+        decode(value)
+    return (time.perf_counter() - started) / len(values) * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--rows', type=int, default=20_000)
+    args = parser.parse_args()
+
+    setup_django()
+    from posts.embedding_codec import pack_embedding, unpack_embedding
+
+    vectors = np.random.default_rng(0).standard_normal((args.rows, DIM), dtype=np.float32)
+    formats = [
+        ('json', 'TEXT', [json.dumps(v.tolist()) for v in vectors],
+         lambda v: np.asarray(json.loads(v), dtype=np.float32)),
+        ('float32', 'BLOB', [pack_embedding(v, 'float32') for v in vectors], unpack_embedding),
+        ('float16', 'BLOB', [pack_embedding(v, 'float16') for v in vectors], unpack_embedding),
+    ]
+
+    print(f"rows={args.rows} dim={DIM}")
+    print(f"{'format':>8} {'bytes/row':>10} {'db, MB':>8} {'parse, us/row':>14}")
+    for name, column_type, values, decode in formats:
+        per_row = sum(len(v) for v in values) / len(values)
+        db_mb = sqlite_size(values, column_type) / 2 ** 20
+        print(f"{name:>8} {per_row:>10.0f} {db_mb:>8.1f} {parse_time(values, decode):>14.2f}")
+
+
+if __name__ == '__main__':
+    main()
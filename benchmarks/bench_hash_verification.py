@@ -0,0 +1,90 @@
+"""
+Проверка хэшей на базе из --posts постов: доля ложных срабатываний фильтра
+Блума и запросы в секунду для прежнего GET /verify/ по одному хэшу и для
+POST /verify/batch/ без фильтра и с ним. В пакетах --hit-ratio хэшей известны.
+
+    python -m benchmarks.bench_hash_verification --posts 200000 --batch 1000
+"""
+import argparse
+import hashlib
+import random
+import time
+
+from benchmarks import setup_django
+
+
+def random_hash(rng):
+    return hashlib.sha256(rng.randbytes(16)).hexdigest()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--posts', type=int, default=200000)
+    parser.add_argument('--batch', type=int, default=1000)
+    parser.add_argument('--requests', type=int, default=20)
+    parser.add_argument('--hit-ratio', type=float, default=0.1)
+    parser.add_argument('--probes', type=int, default=200000, help="отсутствующих хэшей для оценки FPR")
+    args = parser.parse_args()
+
+    setup_django(temp_db=True)
+    from django.contrib.auth import get_user_model
+    from django.test.utils import override_settings
+    from rest_framework.test import APIClient
+
+    from posts.bloom import BloomFilter, KnownHashFilter, get_config
+    from posts.models import Post
+
+    rng = random.Random(0)
+    user = get_user_model().objects.create_user('bench', password='bench')
+    known = [random_hash(rng) for _ in range(args.posts)]
+    started = time.perf_counter()
+    for start in range(0, args.posts, 10000):
+        Post.objects.bulk_create([
+            Post(user=user, title=f'post {i}', type='text', sha256_hash=known[i], status='original')
+            for i in range(start, min(start + 10000, args.posts))
+        ])
+    print(f"создано {args.posts} постов за {time.perf_counter() - started:.1f} s")
+
+    config = get_config()
+    started = time.perf_counter()
+    bloom_filter = KnownHashFilter()
+    bloom_filter.sync()
+    print(f"построение фильтра: {time.perf_counter() - started:.2f} s, {bloom_filter.bloom.nbytes / 2 ** 20:.1f} MB, "
+          f"k={bloom_filter.bloom.hash_count}")
+    probes = [random_hash(rng) for _ in range(args.probes)]
+    false_positives = int(bloom_filter.might_contain(probes).sum())
+    print(f"ложные срабатывания при {args.posts} постах: {false_positives / args.probes:.4%} "
+          f"(заданы {config['BLOOM_ERROR_RATE']:.4%} при ёмкости {config['BLOOM_CAPACITY']})")
+    full = BloomFilter(config['BLOOM_CAPACITY'], config['BLOOM_ERROR_RATE'])
+    for start in range(0, config['BLOOM_CAPACITY'], 100000):
+        full.add_many([random_hash(rng) for _ in range(min(100000, config['BLOOM_CAPACITY'] - start))])
+    false_positives = int(full.contains_many(probes).sum())
+    print(f"ложные срабатывания при заполнении до ёмкости: {false_positives / args.probes:.4%}")
+
+    def make_batch():
+        return [rng.choice(known) if rng.random() < args.hit_ratio else random_hash(rng) for _ in range(args.batch)]
+
+    client = APIClient()
+    client.force_authenticate(user)
+    with override_settings(ALLOWED_HOSTS=['*']):
+        batch = make_batch()[:max(args.batch // 10, 1)]
+        started = time.perf_counter()
+        for sha256_hash in batch:
+            assert client.get('/api/posts/verify/', {'hash': sha256_hash}).status_code == 200
+        elapsed = time.perf_counter() - started
+        print(f"GET /verify/ по одному: {len(batch) / elapsed:.0f} хэшей/s")
+
+        for enabled in (False, True):
+            with override_settings(HASH_VERIFICATION={**config, 'BLOOM_ENABLED': enabled}):
+                batches = [make_batch() for _ in range(args.requests)]
+                started = time.perf_counter()
+                for batch in batches:
+                    assert client.post('/api/posts/verify/batch/', {'hashes': batch}, format='json').status_code == 200
+                elapsed = time.perf_counter() - started
+                label = 'с фильтром Блума' if enabled else 'без фильтра'
+                print(f"POST /verify/batch/ по {args.batch}, {label}: {args.requests / elapsed:.1f} запросов/s, "
+                      f"{args.requests * args.batch / elapsed:.0f} хэшей/s")
+
+
+if __name__ == '__main__':
+    main()
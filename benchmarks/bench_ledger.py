@@ -0,0 +1,123 @@
+"""
+"Блокчейн": прежний blockchain_log.json (каждая запись перечитывает и
+переписывает весь массив) против журнала Ledger на 1M записей — заполнение,
+одиночные дозаписи с пакетным и с поштучным fsync, поиск по хэшу.
+
+    python -m benchmarks.bench_ledger --records 1000000 --legacy-sizes 1000 10000 100000
+"""
+import argparse
+import hashlib
+import json
+import os
+import random
+import tempfile
+import time
+
+from benchmarks import setup_django
+
+
+def make_record(i):
+    return {
+        'timestamp': '2025-06-04T18:19:26.581371',
+        'hash': hashlib.sha256(str(i).encode()).hexdigest(),
+        'user': f'user{i % 1000}',
+        'title': f'Пост номер {i}',
+    }
+
+
+def legacy_save(path, record):
+    # прежний save_to_blockchain
+    if not os.path.exists(path):
+        with open(path, 'w') as f:
+            json.dump([record], f, indent=4)
+    else:
+        with open(path, 'r+') as f:
+            data = json.load(f)
+            data.append(record)
+            f.seek(0)
+            json.dump(data, f, indent=4)
+
+
+def legacy_is_recorded(path, sha256_hash):
+    with open(path) as f:
+        return any(entry['hash'] == sha256_hash for entry in json.load(f))
+
+
+def bench_legacy(tmp, sizes, repeats=3):
+    print(f"{'legacy N':>10} {'append, ms':>11} {'lookup, ms':>11}")
+    for size in sizes:
+        path = os.path.join(tmp, f'legacy_{size}.json')
+        with open(path, 'w') as f:
+            json.dump([make_record(i) for i in range(size)], f, indent=4)
+        started = time.perf_counter()
+        for i in range(repeats):
+            legacy_save(path, make_record(size + i))
+        append_ms = (time.perf_counter() - started) / repeats * 1000
+        started = time.perf_counter()
+        for i in range(repeats):
+            legacy_is_recorded(path, make_record(size // 2 + i)['hash'])
+        lookup_ms = (time.perf_counter() - started) / repeats * 1000
+        print(f"{size:>10} {append_ms:>11.1f} {lookup_ms:>11.1f}")
+
+
+def bench_ledger(tmp, records, appends, lookups):
+    from posts.blockchain_utils import Ledger
+
+    path = os.path.join(tmp, 'ledger.jsonl')
+    ledger = Ledger(path, os.path.join(tmp, 'ledger_index.sqlite3'))
+    started = time.perf_counter()
+    for start in range(0, records, 10000):
+        ledger.append_many([make_record(i) for i in range(start, min(start + 10000, records))])
+    ledger.flush()
+    elapsed = time.perf_counter() - started
+    print(f"заполнение {records} записей пачками: {elapsed:.1f} s ({records / elapsed:.0f} записей/s), "
+          f"журнал {os.path.getsize(path) / 2 ** 20:.0f} MB")
+
+    for fsync_every in (ledger.fsync_every, 1):
+        ledger.fsync_every = fsync_every
+        count = appends if fsync_every > 1 else max(appends // 10, 1)
+        started = time.perf_counter()
+        for i in range(count):
+            ledger.append(make_record(records + i))
+        ledger.flush()
+        elapsed = time.perf_counter() - started
+        print(f"дозапись по одной, fsync раз в {fsync_every}: {elapsed / count * 1e6:.0f} us/запись")
+        records += count
+
+    hashes = [make_record(random.randrange(records))['hash'] for _ in range(lookups)]
+    started = time.perf_counter()
+    assert all(ledger.contains(h) for h in hashes)
+    elapsed = time.perf_counter() - started
+    print(f"is_hash_recorded: {elapsed / lookups * 1e6:.0f} us/запрос")
+    started = time.perf_counter()
+    for h in hashes:
+        ledger.find(h)
+    elapsed = time.perf_counter() - started
+    print(f"поиск записи по хэшу: {elapsed / lookups * 1e6:.0f} us/запрос")
+    ledger.close()
+
+    os.remove(os.path.join(tmp, 'ledger_index.sqlite3'))
+    started = time.perf_counter()
+    ledger = Ledger(path, os.path.join(tmp, 'ledger_index.sqlite3'))
+    ledger.contains(hashes[0])
+    print(f"перестроение удалённого индекса: {time.perf_counter() - started:.1f} s")
+    ledger.close()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--records', type=int, default=1_000_000)
+    parser.add_argument('--appends', type=int, default=10000)
+    parser.add_argument('--lookups', type=int, default=10000)
+    parser.add_argument('--legacy-sizes', type=int, nargs='*', default=[1000, 10000, 100000])
+    args = parser.parse_args()
+
+    setup_django()
+    with tempfile.TemporaryDirectory() as tmp:
+        if args.legacy_sizes:
+            bench_legacy(tmp, args.legacy_sizes)
+        bench_ledger(tmp, args.records, args.appends, args.lookups)
+
+
+if __name__ == '__main__':
+    main()
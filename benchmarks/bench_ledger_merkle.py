@@ -0,0 +1,68 @@
+"""
+Блоки журнала с деревьями Меркла: скорость запечатывания, генерации
+доказательств включения (с холодным и прогретым кэшем деревьев) и потоковой
+проверки цепочки.
+
+    python -m benchmarks.bench_ledger_merkle --records 1000000 --block-size 1024
+"""
+import argparse
+import os
+import random
+import tempfile
+import time
+
+from benchmarks import setup_django
+from benchmarks.bench_ledger import make_record
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--records', type=int, default=1_000_000)
+    parser.add_argument('--block-size', type=int, default=1024)
+    parser.add_argument('--proofs', type=int, default=2000)
+    args = parser.parse_args()
+
+    setup_django()
+    from posts.blockchain_utils import Ledger, verify_chain
+    from posts.merkle import verify_proof
+
+    with tempfile.TemporaryDirectory() as tmp:
+        ledger = Ledger(os.path.join(tmp, 'ledger.jsonl'), os.path.join(tmp, 'ledger_index.sqlite3'),
+                        block_size=args.records + 1, block_interval=10 ** 9)
+        for start in range(0, args.records, 10000):
+            ledger.append_many([make_record(i) for i in range(start, min(start + 10000, args.records))])
+
+        ledger.block_size = args.block_size
+        started = time.perf_counter()
+        blocks = ledger.seal()
+        elapsed = time.perf_counter() - started
+        print(f"запечатывание: {blocks} блоков по {args.block_size}, {elapsed:.1f} s "
+              f"({args.records / elapsed:.0f} записей/s, {blocks / elapsed:.0f} блоков/s)")
+
+        hashes = [make_record(random.randrange(args.records))['hash'] for _ in range(args.proofs)]
+        started = time.perf_counter()
+        proofs = [ledger.proof(h) for h in hashes]
+        cold = time.perf_counter() - started
+        assert all(verify_proof(p['record'].encode('utf-8'), p['proof'], p['block']['merkle_root']) for p in proofs)
+
+        # прогретый кэш: доказательства для записей одного блока
+        block_hashes = [make_record(i)['hash'] for i in range(min(args.block_size, args.records))]
+        ledger.proof(block_hashes[0])
+        started = time.perf_counter()
+        for h in block_hashes:
+            ledger.proof(h)
+        warm = time.perf_counter() - started
+        print(f"доказательство: {args.proofs / cold:.0f}/s со случайными блоками, "
+              f"{len(block_hashes) / warm:.0f}/s из кэша деревьев; "
+              f"длина пути {len(proofs[0]['proof'])} хэшей")
+
+        started = time.perf_counter()
+        checked, error = verify_chain(ledger)
+        elapsed = time.perf_counter() - started
+        assert error is None, error
+        print(f"проверка цепочки: {checked} блоков за {elapsed:.1f} s ({args.records / elapsed:.0f} записей/s)")
+        ledger.close()
+
+
+if __name__ == '__main__':
+    main()
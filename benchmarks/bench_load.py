@@ -0,0 +1,436 @@
+"""
+Нагрузочный тест: --users пользователей регистрируются и входят через
+/api/auth/ (JWT), затем параллельно шлют запросы в заданной пропорции
+(--mix create_text=2,list=4,...) в течение --duration секунд. Отчёт —
+пропускная способность, p50/p95/p99 и доля ошибок по каждой операции.
+
+По умолчанию приложение ddd_project.asgi вызывается прямо в процессе (без
+сети, заглушка модели, данные во временном каталоге, как в bench_api);
+--sync-views — под ASGI, но с синхронными DRF-представлениями (без
+settings.ASYNC_VIEWS). --app wsgi вызывает ddd_project.wsgi в пуле из
+--wsgi-threads потоков, как многопоточный WSGI-сервер. С --url запросы идут
+на уже запущенный сервер (runserver, gunicorn и т.п.) по HTTP/1.1 с
+keep-alive, по соединению на пользователя.
+
+    python -m benchmarks.bench_load --users 16 --duration 30
+    python -m benchmarks.bench_load --app wsgi --wsgi-threads 8 --users 16
+    python -m benchmarks.bench_load --url http://127.0.0.1:8000 --users 32 --mix create_text=1,verify=8,list=4
+"""
+import argparse
+import asyncio
+import http.client
+import io
+import json
+import os
+import random
+import sys
+import time
+import uuid
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlencode, urlsplit
+
+from benchmarks import data, setup_django
+
+DEFAULT_MIX = (
+    'create_text=2,create_document=1,create_image=1,list=4,verify=4,verify_batch=1,'
+    'report=1,vote=1,comment=1,comment_list=2'
+)
+
+
+def parse_mix(value):
+    mix = {}
+    for part in value.split(','):
+        name, _, weight = part.partition('=')
+        if name.strip() not in OPERATIONS:
+            raise argparse.ArgumentTypeError(f"неизвестная операция {name!r}, есть: {', '.join(OPERATIONS)}")
+        mix[name.strip()] = float(weight or 1)
+    return mix
+
+
+def encode_multipart(fields, files=()):
+    boundary = uuid.uuid4().hex
+    parts = []
+    for name, value in fields.items():
+        parts.append(f'--{boundary}\r\nContent-Disposition: form-data; name="{name}"\r\n\r\n{value}\r\n'.encode())
+    for name, file_name, content_type, content in files:
+        parts.append((
+            f'--{boundary}\r\nContent-Disposition: form-data; name="{name}"; filename="{file_name}"\r\n'
+            f'Content-Type: {content_type}\r\n\r\n'
+        ).encode() + content + b'\r\n')
+    parts.append(f'--{boundary}--\r\n'.encode())
+    return f'multipart/form-data; boundary={boundary}', b''.join(parts)
+
+
+class AsgiTransport:
+    """Вызывает ASGI-приложение в этом же цикле событий."""
+
+    def __init__(self, application):
+        self.application = application
+
+    async def request(self, session, method, path, headers, body=b''):
+        path, _, query = path.partition('?')
+        scope = {
+            'type': 'http', 'asgi': {'version': '3.0'}, 'http_version': '1.1',
+            'method': method, 'scheme': 'http', 'path': path, 'raw_path': path.encode(),
+            'query_string': query.encode(), 'root_path': '',
+            'headers': [(b'host', b'testserver')] + [(k.lower().encode(), v.encode()) for k, v in headers.items()],
+            'client': ('127.0.0.1', 50000), 'server': ('testserver', 80),
+        }
+        finished = asyncio.Event()
+        body_sent = False
+        response = {'status': None, 'chunks': []}
+
+        async def receive():
+            nonlocal body_sent
+            if not body_sent:
+                body_sent = True
+                return {'type': 'http.request', 'body': body, 'more_body': False}
+            # Django ждёт разрыва соединения параллельно с обработкой запроса
+            await finished.wait()
+            return {'type': 'http.disconnect'}
+
+        async def send(message):
+            if message['type'] == 'http.response.start':
+                response['status'] = message['status']
+            elif message['type'] == 'http.response.body':
+                response['chunks'].append(message.get('body', b''))
+                if not message.get('more_body'):
+                    finished.set()
+
+        try:
+            await self.application(scope, receive, send)
+        finally:
+            finished.set()
+        return response['status'], b''.join(response['chunks'])
+
+
+class WsgiTransport:
+    """Вызывает WSGI-приложение в пуле потоков — как многопоточный WSGI-сервер."""
+
+    def __init__(self, application, threads):
+        self.application = application
+        self.executor = ThreadPoolExecutor(threads, thread_name_prefix='wsgi')
+
+    def _request(self, method, path, headers, body):
+        path, _, query = path.partition('?')
+        environ = {
+            'REQUEST_METHOD': method, 'SCRIPT_NAME': '', 'PATH_INFO': path, 'QUERY_STRING': query,
+            'SERVER_NAME': 'testserver', 'SERVER_PORT': '80', 'SERVER_PROTOCOL': 'HTTP/1.1',
+            'REMOTE_ADDR': '127.0.0.1', 'wsgi.version': (1, 0), 'wsgi.url_scheme': 'http',
+            'wsgi.input': io.BytesIO(body), 'wsgi.errors': sys.stderr,
+            'wsgi.multithread': True, 'wsgi.multiprocess': False, 'wsgi.run_once': False,
+        }
+        for name, value in headers.items():
+            key = name.upper().replace('-', '_')
+            environ[key if key in ('CONTENT_TYPE', 'CONTENT_LENGTH') else f'HTTP_{key}'] = value
+        response = {}
+
+        def start_response(status, response_headers, exc_info=None):
+            response['status'] = int(status.split(' ', 1)[0])
+
+        result = self.application(environ, start_response)
+        try:
+            content = b''.join(result)
+        finally:
+            if hasattr(result, 'close'):
+                result.close()
+        return response['status'], content
+
+    async def request(self, session, method, path, headers, body=b''):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor, self._request, method, path, headers, body)
+
+
+class HttpTransport:
+    """HTTP/1.1 к запущенному серверу; блокирующий http.client в потоках."""
+
+    def __init__(self, url):
+        parts = urlsplit(url)
+        self.host = parts.hostname
+        self.port = parts.port or 80
+
+    def _request(self, session, method, path, headers, body):
+        for attempt in range(2):
+            connection = session.get('connection')
+            if connection is None:
+                connection = session['connection'] = http.client.HTTPConnection(self.host, self.port, timeout=120)
+            try:
+                connection.request(method, path, body=body or None, headers=headers)
+                response = connection.getresponse()
+                return response.status, response.read()
+            except (ConnectionError, http.client.HTTPException):
+                # сервер закрыл keep-alive соединение: один повтор на новом
+                connection.close()
+                session['connection'] = None
+                if attempt:
+                    raise
+
+    async def request(self, session, method, path, headers, body=b''):
+        return await asyncio.to_thread(self._request, session, method, path, headers, body)
+
+
+class VirtualUser:
+    def __init__(self, transport, username):
+        self.transport = transport
+        self.username = username
+        self.password = 'load-test-password'
+        self.session = {}
+        self.token = None
+
+    async def call(self, method, path, body=b'', content_type=None, headers=None):
+        headers = dict(headers or {})
+        if self.token:
+            headers['Authorization'] = f'Bearer {self.token}'
+        if content_type:
+            headers['Content-Type'] = content_type
+        headers['Content-Length'] = str(len(body))
+        return await self.transport.request(self.session, method, path, headers, body)
+
+    async def json(self, method, path, payload):
+        return await self.call(method, path, json.dumps(payload).encode(), 'application/json')
+
+    async def login(self):
+        await self.json('POST', '/api/auth/register/', {
+            'username': self.username, 'password': self.password, 'email': f'{self.username}@example.com',
+        })
+        status, body = await self.json('POST', '/api/auth/login/', {'username': self.username, 'password': self.password})
+        if status != 200:
+            raise RuntimeError(f"вход {self.username}: {status} {body[:200]!r}")
+        self.token = json.loads(body)['access']
+
+
+class Workload:
+    """Общие для всех пользователей данные: известные посты и заранее подготовленные файлы."""
+
+    def __init__(self, rng, documents, images):
+        self.rng = rng
+        self.posts = []
+        self.documents = documents
+        self.images = images
+        self.uploads = 0
+
+    def remember(self, status, body):
+        if status == 201:
+            post = json.loads(body)
+            if post.get('sha256_hash'):
+                self.posts.append((post['id'], post['sha256_hash']))
+
+    def post(self):
+        return self.rng.choice(self.posts)
+
+    def next_upload(self, pool):
+        self.uploads += 1
+        return pool[self.uploads % len(pool)]
+
+
+async def op_create_text(user, workload):
+    content_type, body = encode_multipart({'title': 'load', 'type': 'text', 'content': data.make_text(workload.rng)})
+    status, response = await user.call('POST', '/api/posts/create/', body, content_type)
+    workload.remember(status, response)
+    return status
+
+
+async def op_create_document(user, workload):
+    document = workload.next_upload(workload.documents)
+    content_type, body = encode_multipart(
+        {'title': 'load', 'type': 'document'}, [('document', 'load.pdf', 'application/pdf', document)])
+    status, response = await user.call('POST', '/api/posts/create/', body, content_type)
+    workload.remember(status, response)
+    return status
+
+
+async def op_create_image(user, workload):
+    image = workload.next_upload(workload.images)
+    content_type, body = encode_multipart({'title': 'load', 'type': 'image'}, [('image', 'load.png', 'image/png', image)])
+    status, response = await user.call('POST', '/api/posts/create/', body, content_type)
+    workload.remember(status, response)
+    return status
+
+
+async def op_list(user, workload):
+    return (await user.call('GET', '/api/posts/'))[0]
+
+
+async def op_verify(user, workload):
+    # половина запросов — хэши, которых нет
+    sha256_hash = workload.post()[1] if workload.rng.random() < 0.5 else uuid.uuid4().hex * 2
+    return (await user.call('GET', '/api/posts/verify/?' + urlencode({'hash': sha256_hash})))[0]
+
+
+async def op_verify_batch(user, workload):
+    hashes = [workload.post()[1] for _ in range(50)] + [uuid.uuid4().hex * 2 for _ in range(50)]
+    return (await user.json('POST', '/api/posts/verify/batch/', {'hashes': hashes}))[0]
+
+
+async def op_report(user, workload):
+    return (await user.call('GET', '/api/posts/report/?' + urlencode({'hash': workload.post()[1]})))[0]
+
+
+async def op_vote(user, workload):
+    return (await user.call('POST', f'/api/posts/{workload.post()[0]}/vote/'))[0]
+
+
+async def op_comment(user, workload):
+    path = f'/api/posts/{workload.post()[0]}/comments/add/'
+    return (await user.json('POST', path, {'text': data.make_text(workload.rng, 20)}))[0]
+
+
+async def op_comment_list(user, workload):
+    return (await user.call('GET', f'/api/posts/{workload.post()[0]}/comments/'))[0]
+
+
+OPERATIONS = {
+    'create_text': op_create_text,
+    'create_document': op_create_document,
+    'create_image': op_create_image,
+    'list': op_list,
+    'verify': op_verify,
+    'verify_batch': op_verify_batch,
+    'report': op_report,
+    'vote': op_vote,
+    'comment': op_comment,
+    'comment_list': op_comment_list,
+}
+
+
+async def user_loop(user, workload, mix, deadline, think, results, rng):
+    names, weights = list(mix), list(mix.values())
+    while time.perf_counter() < deadline:
+        name = rng.choices(names, weights)[0]
+        started = time.perf_counter()
+        try:
+            status = await OPERATIONS[name](user, workload)
+            error = None if status < 400 else str(status)
+        except Exception as exc:
+            error = type(exc).__name__
+        results[name].append(((time.perf_counter() - started) * 1000, error))
+        if think:
+            await asyncio.sleep(rng.expovariate(1 / think))
+
+
+def percentile(samples, q):
+    ordered = sorted(samples)
+    return ordered[min(int(len(ordered) * q), len(ordered) - 1)] if ordered else 0.0
+
+
+def summarize(results, elapsed):
+    rows = {}
+    for name, samples in sorted(results.items()):
+        latencies = [latency for latency, _ in samples]
+        errors = defaultdict(int)
+        for _, error in samples:
+            if error:
+                errors[error] += 1
+        rows[name] = {
+            'count': len(samples),
+            'rps': len(samples) / elapsed,
+            'p50': percentile(latencies, 0.50),
+            'p95': percentile(latencies, 0.95),
+            'p99': percentile(latencies, 0.99),
+            'errors': dict(errors),
+            'error_rate': sum(errors.values()) / len(samples) if samples else 0.0,
+        }
+    every = [sample for samples in results.values() for sample in samples]
+    latencies = [latency for latency, _ in every]
+    failed = sum(1 for _, error in every if error)
+    rows['total'] = {
+        'count': len(every), 'rps': len(every) / elapsed,
+        'p50': percentile(latencies, 0.50), 'p95': percentile(latencies, 0.95), 'p99': percentile(latencies, 0.99),
+        'errors': {}, 'error_rate': failed / len(every) if every else 0.0,
+    }
+    return rows
+
+
+async def run(args, transport, rng):
+    users = [VirtualUser(transport, f'load_{uuid.uuid4().hex[:10]}') for _ in range(args.users)]
+    for user in users:
+        # по одному: хэширование паролей не должно попасть в замер
+        await user.login()
+
+    workload = Workload(
+        rng,
+        documents=[data.make_pdf(rng, args.doc_pages) for _ in range(args.unique_uploads)],
+        images=[data.make_image(rng) for _ in range(args.unique_uploads)],
+    )
+    for _ in range(args.seed_posts):
+        await op_create_text(users[0], workload)
+    if not workload.posts:
+        raise RuntimeError("не удалось создать ни одного поста для проверки и отчётов")
+
+    results = defaultdict(list)
+    started = time.perf_counter()
+    deadline = started + args.duration
+    await asyncio.gather(*(
+        user_loop(user, workload, args.mix, deadline, args.think_ms / 1000, results, random.Random(rng.random()))
+        for user in users
+    ))
+    elapsed = time.perf_counter() - started
+    if workload.uploads > args.unique_uploads:
+        print(f"внимание: {workload.uploads} загрузок файлов на {args.unique_uploads} уникальных, часть — точные копии")
+    return summarize(results, elapsed), elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--url', help="адрес запущенного сервера; без него — ddd_project.asgi в процессе")
+    parser.add_argument('--app', choices=('asgi', 'wsgi'), default='asgi', help="что вызывать в процессе без --url")
+    parser.add_argument('--sync-views', action='store_true', help="ASGI без async-представлений")
+    parser.add_argument('--wsgi-threads', type=int, default=8)
+    parser.add_argument('--users', type=int, default=8)
+    parser.add_argument('--duration', type=float, default=20)
+    parser.add_argument('--mix', type=parse_mix, default=DEFAULT_MIX)
+    parser.add_argument('--think-ms', type=float, default=0, help="средняя пауза пользователя между запросами")
+    parser.add_argument('--seed-posts', type=int, default=50)
+    parser.add_argument('--doc-pages', type=int, default=2)
+    parser.add_argument('--unique-uploads', type=int, default=100)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--json', help="куда сохранить результаты (см. benchmarks.compare)")
+    args = parser.parse_args()
+    if isinstance(args.mix, str):
+        args.mix = parse_mix(args.mix)
+
+    if args.url:
+        transport = HttpTransport(args.url)
+        target = args.url
+    else:
+        # до загрузки настроек: ddd_project.asgi по умолчанию включает async-представления
+        os.environ['DJANGO_ASYNC_VIEWS'] = '1' if args.app == 'asgi' and not args.sync_views else '0'
+        setup_django(offline=True)
+        if args.app == 'wsgi':
+            from ddd_project.wsgi import application
+            transport = WsgiTransport(application, args.wsgi_threads)
+            target = f'ddd_project.wsgi в процессе, {args.wsgi_threads} потоков'
+        else:
+            from ddd_project.asgi import application
+            transport = AsgiTransport(application)
+            views = 'синхронные' if args.sync_views else 'async'
+            target = f'ddd_project.asgi в процессе, {views} представления'
+
+    rows, elapsed = asyncio.run(run(args, transport, random.Random(args.seed)))
+
+    print(f"{target}: {args.users} пользователей, {elapsed:.1f} s")
+    print(f"{'операция':<16} {'запросов':>8} {'в секунду':>10} {'p50, ms':>9} {'p95, ms':>9} {'p99, ms':>9} {'ошибки':>8}")
+    for name, row in rows.items():
+        errors = ', '.join(f'{code}: {count}' for code, count in sorted(row['errors'].items()))
+        print(f"{name:<16} {row['count']:>8} {row['rps']:>10.1f} {row['p50']:>9.1f} {row['p95']:>9.1f} "
+              f"{row['p99']:>9.1f} {row['error_rate']:>7.1%} {errors}")
+
+    if args.json:
+        from benchmarks.results import metric, write_results
+
+        metrics = {}
+        for name, row in rows.items():
+            metrics[f'{name}.rps'] = metric(row['rps'], 'req/s', 'higher')
+            for q in ('p50', 'p95', 'p99'):
+                metrics[f'{name}.{q}_ms'] = metric(row[q])
+            metrics[f'{name}.error_rate'] = metric(row['error_rate'], 'ratio')
+        params = {key: value for key, value in vars(args).items() if key != 'json'}
+        write_results(args.json, 'load', params, metrics)
+        print(f"результаты: {args.json}")
+    if rows['total']['count'] == 0:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
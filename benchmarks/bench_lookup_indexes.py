@@ -0,0 +1,109 @@
+"""
+Задержка горячих запросов на sqlite-базе из --posts постов и --comments
+комментариев без индексов из 0012_lookup_indexes и с ними: поиск по хэшу
+(проверка и отчёт), первая страница ленты, комментарии поста, пакетная
+проверка IN-запросом.
+
+    python -m benchmarks.bench_lookup_indexes --posts 1000000 --comments 1000000
+"""
+import argparse
+import random
+import statistics
+import time
+from datetime import datetime, timedelta, timezone
+
+from benchmarks import setup_django
+
+
+def fill(connection, user_id, posts, comments, rng):
+    started = datetime(2024, 1, 1, tzinfo=timezone.utc)
+    with connection.cursor() as cursor:
+        for start in range(0, posts, 50000):
+            rows = []
+            for i in range(start, min(start + 50000, posts)):
+                created = started + timedelta(seconds=rng.randrange(10 ** 8))
+                rows.append((user_id, f'post {i}', '', 'text', f'{i:064x}', 'original', created.isoformat(' ')))
+            cursor.executemany(
+                'INSERT INTO posts_post (user_id, title, content, type, sha256_hash, status, created_at) '
+                'VALUES (?, ?, ?, ?, ?, ?, ?)', rows,
+            )
+        for start in range(0, comments, 50000):
+            rows = []
+            for i in range(start, min(start + 50000, comments)):
+                created = started + timedelta(seconds=rng.randrange(10 ** 8))
+                rows.append((rng.randrange(1, posts + 1), user_id, f'comment {i}', created.isoformat(' ')))
+            cursor.executemany(
+                'INSERT INTO posts_comment (post_id, user_id, text, created_at) VALUES (?, ?, ?, ?)', rows,
+            )
+
+
+def timed(func, args_list):
+    samples = []
+    for args in args_list:
+        started = time.perf_counter()
+        func(*args)
+        samples.append((time.perf_counter() - started) * 1000)
+    return statistics.median(samples)
+
+
+def run_queries(posts, rng, repeats):
+    from posts.models import Comment, Post
+
+    hashes = [(f'{rng.randrange(posts):064x}',) for _ in range(repeats)]
+    post_ids = [(rng.randrange(1, posts + 1),) for _ in range(repeats)]
+    batches = [([f'{rng.randrange(posts * 2):064x}' for _ in range(500)],) for _ in range(max(repeats // 10, 1))]
+    return {
+        'проверка по хэшу': timed(
+            lambda h: Post.objects.filter(sha256_hash=h).order_by('-created_at').first(), hashes),
+        'лента, 20 постов': timed(
+            lambda: list(Post.objects.order_by('-created_at')[:20]), [()] * max(repeats // 10, 1)),
+        'комментарии поста': timed(
+            lambda p: list(Comment.objects.filter(post_id=p).order_by('created_at')), post_ids),
+        'IN по 500 хэшам': timed(
+            lambda b: list(Post.objects.filter(sha256_hash__in=b).values_list('sha256_hash', 'created_at')),
+            batches),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--posts', type=int, default=1_000_000)
+    parser.add_argument('--comments', type=int, default=1_000_000)
+    parser.add_argument('--repeats', type=int, default=50)
+    args = parser.parse_args()
+
+    setup_django(temp_db=True)
+    from django.contrib.auth import get_user_model
+    from django.db import connection, transaction
+
+    from posts.models import Comment, Post
+
+    indexes = [(Post, index) for index in Post._meta.indexes] + [(Comment, index) for index in Comment._meta.indexes]
+    with connection.schema_editor() as editor:
+        for model, index in indexes:
+            editor.remove_index(model, index)
+
+    rng = random.Random(0)
+    user = get_user_model().objects.create_user('bench', password='bench')
+    started = time.perf_counter()
+    with transaction.atomic():
+        fill(connection, user.pk, args.posts, args.comments, rng)
+    print(f"заполнение: {args.posts} постов, {args.comments} комментариев за {time.perf_counter() - started:.0f} s")
+
+    before = run_queries(args.posts, random.Random(1), args.repeats)
+
+    started = time.perf_counter()
+    with connection.schema_editor() as editor:
+        for model, index in indexes:
+            editor.add_index(model, index)
+    print(f"создание индексов: {time.perf_counter() - started:.1f} s")
+
+    after = run_queries(args.posts, random.Random(1), args.repeats)
+
+    print(f"{'запрос (медиана)':<20} {'без индексов, ms':>17} {'с индексами, ms':>16} {'ускорение':>10}")
+    for name in before:
+        print(f"{name:<20} {before[name]:>17.2f} {after[name]:>16.3f} {before[name] / after[name]:>9.0f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,60 @@
+"""
+Накладные расходы инструментирования на одно создание поста: трекер этапов
+с --stages таймерами (как в PostCreateView) при включённых и выключенных
+метриках, а также время отрисовки /metrics/.
+
+    python -m benchmarks.bench_metrics_overhead --posts 100000
+"""
+import argparse
+import time
+
+from benchmarks import setup_django
+
+STAGE_NAMES = ['extract', 'lookup', 'encode', 'similarity', 'encode', 'similarity', 'save', 'index', 'ledger']
+
+
+def instrumented_create(post_type):
+    from posts.metrics import POSTS_CREATED, stage, track_stages
+
+    with track_stages(post_type):
+        for name in STAGE_NAMES:
+            with stage(name):
+                pass
+    POSTS_CREATED.inc(type=post_type, status='original')
+
+
+def per_call_us(func, count):
+    types = ['text', 'document', 'image']
+    started = time.perf_counter()
+    for i in range(count):
+        func(types[i % 3])
+    return (time.perf_counter() - started) / count * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--posts', type=int, default=100000)
+    args = parser.parse_args()
+
+    setup_django()
+    from django.test.utils import override_settings
+
+    from posts.metrics import get_config, render_metrics
+
+    baseline = per_call_us(lambda post_type: None, args.posts)
+    enabled = per_call_us(instrumented_create, args.posts)
+    with override_settings(METRICS={**get_config(), 'ENABLED': False}):
+        disabled = per_call_us(instrumented_create, args.posts)
+
+    started = time.perf_counter()
+    body = render_metrics()
+    render_ms = (time.perf_counter() - started) * 1000
+
+    print(f"{len(STAGE_NAMES)} этапов на пост")
+    print(f"метрики включены:  {enabled - baseline:>7.2f} мкс на пост")
+    print(f"метрики выключены: {disabled - baseline:>7.2f} мкс на пост")
+    print(f"/metrics/: {len(body.splitlines())} строк за {render_ms:.2f} ms")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,85 @@
+"""
+Пропускная способность и задержки кодирования при параллельных запросах:
+вызов модели на каждый текст (как раньше) против EmbeddingBatcher.
+
+Модель заменена заглушкой со стоимостью вызова fixed_ms + per_item_ms * n;
+вычисления сериализуются одной блокировкой, как если бы forward pass занимал
+все ядра CPU. Так воспроизводится главный эффект: накладные расходы на
+вызов делятся на весь батч.
+
+    python -m benchmarks.bench_micro_batching --clients 32 --requests 50
+"""
+import argparse
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from benchmarks import setup_django
+
+DIM = 384
+
+
+class CostModel:
+    def __init__(self, fixed_ms, per_item_ms):
+        self.fixed = fixed_ms / 1000
+        self.per_item = per_item_ms / 1000
+        self.cpu = threading.Lock()
+
+    def encode_batch(self, texts):
+        with self.cpu:
+            time.sleep(self.fixed + self.per_item * len(texts))
+        return np.zeros((len(texts), DIM), dtype=np.float32)
+
+
+def run(encode, clients, requests):
+    latencies = []
+    lock = threading.Lock()
+
+    def client(_):
+        local = []
+        for i in range(requests):
+            started = time.perf_counter()
+            encode(f"text {i}")
+            local.append(time.perf_counter() - started)
+        with lock:
+            latencies.extend(local)
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(clients) as pool:
+        list(pool.map(client, range(clients)))
+    elapsed = time.perf_counter() - started
+    latencies = np.array(latencies) * 1000
+    return len(latencies) / elapsed, np.percentile(latencies, 50), np.percentile(latencies, 99)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--clients', type=int, nargs='+', default=[1, 8, 32])
+    parser.add_argument('--requests', type=int, default=50)
+    parser.add_argument('--fixed-ms', type=float, default=8.0)
+    parser.add_argument('--per-item-ms', type=float, default=1.0)
+    parser.add_argument('--max-batch-size', type=int, default=32)
+    parser.add_argument('--max-wait-ms', type=float, default=5.0)
+    args = parser.parse_args()
+
+    setup_django()
+    from posts.embedding_service import EmbeddingBatcher
+
+    print(f"{'clients':>7} {'mode':>8} {'req/s':>8} {'p50, ms':>8} {'p99, ms':>8}")
+    for clients in args.clients:
+        model = CostModel(args.fixed_ms, args.per_item_ms)
+        batcher = EmbeddingBatcher(model.encode_batch, args.max_batch_size, args.max_wait_ms)
+        modes = [
+            ('direct', lambda text: model.encode_batch([text])[0]),
+            ('batched', batcher.encode),
+        ]
+        for name, encode in modes:
+            rps, p50, p99 = run(encode, clients, args.requests)
+            print(f"{clients:>7} {name:>8} {rps:>8.1f} {p50:>8.1f} {p99:>8.1f}")
+        print(f"{'':>7} средний батч: {batcher.items / max(batcher.batches, 1):.1f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,81 @@
+"""
+Доля созданий поста, которым MinHash/LSH-префильтр позволяет не запускать
+модель, и средняя задержка с префильтром и без. Корпус синтетический:
+часть загрузок — почти дословные копии (несколько заменённых слов), остальные
+— новые тексты. Стоимость модели задаётся параметром --model-ms, корзины LSH
+держатся в словаре вместо таблицы LSHBucket.
+
+    python -m benchmarks.bench_minhash_prefilter --corpus 5000 --creates 1000 --copy-ratio 0.3
+"""
+import argparse
+import random
+import time
+from collections import defaultdict
+
+from benchmarks import setup_django
+
+
+def random_text(rng, vocab, words):
+    return ' '.join(rng.choice(vocab) for _ in range(words))
+
+
+def near_copy(rng, text, edits):
+    words = text.split()
+    for _ in range(edits):
+        words[rng.randrange(len(words))] = f"edit{rng.randrange(10 ** 6)}"
+    return ' '.join(words)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--corpus', type=int, default=5000)
+    parser.add_argument('--creates', type=int, default=1000)
+    parser.add_argument('--words', type=int, default=400)
+    parser.add_argument('--copy-ratio', type=float, default=0.3)
+    parser.add_argument('--edits', type=int, default=3)
+    parser.add_argument('--model-ms', type=float, default=30.0, help="стоимость model.encode на документ")
+    args = parser.parse_args()
+
+    setup_django()
+    from posts.minhash import band_buckets, estimate_jaccard, get_config, is_near_duplicate, minhash_signature
+
+    threshold = get_config()['DUPLICATE_JACCARD']
+    rng = random.Random(0)
+    vocab = [f"w{i}" for i in range(20000)]
+    corpus = [random_text(rng, vocab, args.words) for _ in range(args.corpus)]
+
+    signatures = {}
+    buckets = defaultdict(set)
+    started = time.perf_counter()
+    for post_id, text in enumerate(corpus):
+        signatures[post_id] = minhash_signature(text)
+        for key in band_buckets(signatures[post_id]):
+            buckets[key].add(post_id)
+    print(f"индексация корпуса {args.corpus}: {(time.perf_counter() - started) / args.corpus * 1000:.2f} ms/пост")
+
+    skipped = 0
+    prefilter_ms = 0.0
+    for _ in range(args.creates):
+        if rng.random() < args.copy_ratio:
+            text = near_copy(rng, rng.choice(corpus), args.edits)
+        else:
+            text = random_text(rng, vocab, args.words)
+        started = time.perf_counter()
+        signature = minhash_signature(text)
+        candidates = set().union(*(buckets.get(key, ()) for key in band_buckets(signature)))
+        best = max((estimate_jaccard(signature, signatures[c]) for c in candidates), default=0.0)
+        prefilter_ms += (time.perf_counter() - started) * 1000
+        if is_near_duplicate(best, threshold):
+            skipped += 1
+
+    ratio = skipped / args.creates
+    mean_prefilter = prefilter_ms / args.creates
+    with_prefilter = mean_prefilter + (1 - ratio) * args.model_ms
+    print(f"копий в потоке: {args.copy_ratio:.0%}, порог Жаккара: {threshold}")
+    print(f"без модели обработано: {ratio:.1%} созданий")
+    print(f"префильтр: {mean_prefilter:.2f} ms/создание")
+    print(f"средняя задержка кодирования: {args.model_ms:.1f} ms без префильтра, {with_prefilter:.1f} ms с ним")
+
+
+if __name__ == '__main__':
+    main()
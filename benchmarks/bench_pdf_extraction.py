@@ -0,0 +1,88 @@
+"""
+Извлечение текста из PDF на 10, 100 и 1000 страниц: прежний однопоточный
+разбор всех страниц в одну строку против iter_pdf_pages (пул процессов,
+потоковая выдача страниц). Пиковая память Python родительского процесса
+меряется tracemalloc; при одном воркере iter_pdf_pages работает без пула.
+
+    python -m benchmarks.bench_pdf_extraction --pages 10 100 1000 --workers 4
+"""
+import argparse
+import os
+import tempfile
+import time
+import tracemalloc
+
+import PyPDF2
+from reportlab.lib.pagesizes import A4
+from reportlab.pdfgen import canvas
+
+from benchmarks import setup_django
+
+LINE = "Lorem ipsum dolor sit amet, consectetur adipiscing elit, sed do eiusmod tempor incididunt"
+
+
+def make_pdf(path, pages, lines_per_page=45):
+    c = canvas.Canvas(path, pagesize=A4)
+    width, height = A4
+    for page in range(pages):
+        c.setFont("Helvetica", 9)
+        for line in range(lines_per_page):
+            c.drawString(40, height - 40 - line * 16, f"{page}:{line} {LINE}")
+        c.showPage()
+    c.save()
+
+
+def legacy_extract(path):
+    with open(path, 'rb') as f:
+        reader = PyPDF2.PdfReader(f)
+        return '\n'.join([page.extract_text() or '' for page in reader.pages])
+
+
+def streamed_extract(path, workers):
+    from posts.utils import iter_pdf_pages
+    chars = 0
+    with open(path, 'rb') as f:
+        for text in iter_pdf_pages(f, workers=workers):
+            chars += len(text)
+    return chars
+
+
+def measure(func, *args):
+    # время и память меряются отдельными прогонами: tracemalloc замедляет только текущий процесс
+    started = time.perf_counter()
+    func(*args)
+    elapsed = time.perf_counter() - started
+    tracemalloc.start()
+    func(*args)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return elapsed, peak / 2 ** 20
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--pages', type=int, nargs='+', default=[10, 100, 1000])
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 4)
+    args = parser.parse_args()
+
+    setup_django()
+    from posts.utils import _get_pool
+
+    started = time.perf_counter()
+    pool = _get_pool(args.workers)
+    list(pool.map(abs, range(args.workers * 2)))
+    print(f"запуск пула из {args.workers} процессов: {time.perf_counter() - started:.2f} s (один раз на процесс)")
+
+    print(f"{'pages':>6} {'legacy, s':>10} {'parallel, s':>12} {'speedup':>8} {'legacy MB':>10} {'stream MB':>10}")
+    with tempfile.TemporaryDirectory() as tmp:
+        for pages in args.pages:
+            path = os.path.join(tmp, f'{pages}.pdf')
+            make_pdf(path, pages)
+            legacy_s, legacy_mb = measure(legacy_extract, path)
+            stream_s, stream_mb = measure(streamed_extract, path, args.workers)
+            print(f"{pages:>6} {legacy_s:>10.2f} {stream_s:>12.2f} {legacy_s / stream_s:>7.1f}x "
+                  f"{legacy_mb:>10.1f} {stream_mb:>10.1f}")
+
+
+if __name__ == '__main__':
+    main()
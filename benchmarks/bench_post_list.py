@@ -0,0 +1,92 @@
+"""
+Задержка GET /api/posts/ при росте таблицы: первая страница и страница из
+середины ленты (keyset-курсор), а на небольших таблицах — прежний ответ со
+всеми постами и полным content (PostCreateSerializer без пагинации).
+
+    python -m benchmarks.bench_post_list --sizes 10000 100000 1000000 --content-chars 500
+"""
+import argparse
+import random
+import statistics
+import time
+from datetime import datetime, timedelta, timezone
+
+from benchmarks import setup_django
+
+
+def add_posts(connection, user_id, start, end, content_chars, rng):
+    base = datetime(2024, 1, 1, tzinfo=timezone.utc)
+    content = 'lorem ipsum ' * (content_chars // 12)
+    with connection.cursor() as cursor:
+        for chunk in range(start, end, 50000):
+            rows = [
+                (user_id, f'post {i}', content, 'text', f'{i:064x}', 'original',
+                 (base + timedelta(seconds=rng.randrange(10 ** 8))).isoformat(' '))
+                for i in range(chunk, min(chunk + 50000, end))
+            ]
+            cursor.executemany(
+                'INSERT INTO posts_post (user_id, title, content, type, sha256_hash, status, created_at) '
+                'VALUES (?, ?, ?, ?, ?, ?, ?)', rows,
+            )
+
+
+def median_ms(func, repeats):
+    samples = []
+    for _ in range(repeats):
+        started = time.perf_counter()
+        func()
+        samples.append((time.perf_counter() - started) * 1000)
+    return statistics.median(samples)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10000, 100000, 1000000])
+    parser.add_argument('--content-chars', type=int, default=500)
+    parser.add_argument('--repeats', type=int, default=20)
+    parser.add_argument('--legacy-max', type=int, default=10000, help="прежний ответ меряется до этого размера")
+    args = parser.parse_args()
+
+    setup_django(temp_db=True)
+    from django.contrib.auth import get_user_model
+    from django.db import connection, transaction
+    from django.test.utils import override_settings
+    from rest_framework.renderers import JSONRenderer
+    from rest_framework.test import APIClient
+
+    from posts.models import Post
+    from posts.pagination import KeysetPagination
+    from posts.serializers import PostCreateSerializer
+
+    rng = random.Random(0)
+    user = get_user_model().objects.create_user('bench', password='bench')
+    client = APIClient()
+
+    def legacy_list():
+        # прежний PostListView: все посты, полный сериализатор
+        queryset = Post.objects.all().order_by('-created_at')
+        return JSONRenderer().render(PostCreateSerializer(queryset, many=True).data)
+
+    print(f"{'posts':>8} {'page 1, ms':>11} {'deep page, ms':>14} {'page KB':>8} {'legacy, ms':>11} {'legacy MB':>10}")
+    filled = 0
+    with override_settings(ALLOWED_HOSTS=['*']):
+        for size in sorted(args.sizes):
+            with transaction.atomic():
+                add_posts(connection, user.pk, filled, size, args.content_chars, rng)
+            filled = size
+
+            middle = Post.objects.order_by('-created_at', '-id').only('id', 'created_at')[size // 2]
+            deep_url = f'/api/posts/?cursor={KeysetPagination().encode_cursor(middle)}'
+            first_ms = median_ms(lambda: client.get('/api/posts/'), args.repeats)
+            deep_ms = median_ms(lambda: client.get(deep_url), args.repeats)
+            page_kb = len(client.get('/api/posts/').content) / 1024
+
+            legacy = f"{'-':>11} {'-':>10}"
+            if size <= args.legacy_max:
+                legacy_ms = median_ms(legacy_list, 3)
+                legacy = f"{legacy_ms:>11.0f} {len(legacy_list()) / 2 ** 20:>10.1f}"
+            print(f"{size:>8} {first_ms:>11.2f} {deep_ms:>14.2f} {page_kb:>8.1f} {legacy}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,66 @@
+"""
+Во сколько обходится сэмплер стека профилировщика запросов: извлечение
+текста из сгенерированного PDF (--pages страниц, в потоке запроса) без
+профилирования и с сэмплером при разных интервалах, плюс самые частые
+"листовые" кадры последнего снимка.
+
+    python -m benchmarks.bench_profiler_overhead --pages 12 --intervals 0.001 0.005 0.02
+"""
+import argparse
+import io
+import random
+import statistics
+import threading
+import time
+from collections import Counter
+
+from benchmarks import data, setup_django
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--pages', type=int, default=12)
+    parser.add_argument('--repeats', type=int, default=10)
+    parser.add_argument('--intervals', type=float, nargs='+', default=[0.001, 0.005, 0.02])
+    args = parser.parse_args()
+
+    setup_django()
+    from posts.profiling import StackSampler
+    from posts.utils import extract_text_from_file
+
+    document = data.make_pdf(random.Random(0), args.pages)
+
+    def workload():
+        extract_text_from_file(io.BytesIO(document), 'bench.pdf')
+
+    def median_ms(interval=None):
+        samples = []
+        sampler = None
+        for _ in range(args.repeats):
+            if interval:
+                sampler = StackSampler(threading.get_ident(), interval).start()
+            started = time.perf_counter()
+            workload()
+            samples.append((time.perf_counter() - started) * 1000)
+            if sampler:
+                sampler.stop()
+        return statistics.median(samples), sampler
+
+    workload()
+    baseline, _ = median_ms()
+    print(f"без профилирования: {baseline:.1f} ms")
+    print(f"{'интервал, ms':>12} {'время, ms':>10} {'замедление':>11} {'выборок':>8}")
+    for interval in args.intervals:
+        elapsed, sampler = median_ms(interval)
+        print(f"{interval * 1000:>12g} {elapsed:>10.1f} {(elapsed / baseline - 1) * 100:>10.1f}% {sampler.samples:>8}")
+
+    leaves = Counter()
+    for stack, count in sampler.stacks.items():
+        leaves[stack.rsplit(';', 1)[-1]] += count
+    print("самые частые кадры последнего снимка:")
+    for frame, count in leaves.most_common(5):
+        print(f"  {count:>5}  {frame}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,94 @@
+"""
+Задержка GET /api/posts/report/: первая генерация отчёта, повторная отдача
+готового файла, ответ 304 по If-None-Match и кусок по Range, а также сколько
+раз рендерится отчёт, когда --threads запросов приходят за ним одновременно.
+
+    python -m benchmarks.bench_report_cache --posts 50 --threads 16
+"""
+import argparse
+import statistics
+import tempfile
+import threading
+import time
+
+from benchmarks import setup_django
+
+
+def timed_ms(func, args_list):
+    samples = []
+    for args in args_list:
+        started = time.perf_counter()
+        func(*args)
+        samples.append((time.perf_counter() - started) * 1000)
+    return statistics.median(samples)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--posts', type=int, default=50)
+    parser.add_argument('--threads', type=int, default=16)
+    args = parser.parse_args()
+
+    setup_django(temp_db=True)
+    from django.contrib.auth import get_user_model
+    from django.test.utils import override_settings
+    from rest_framework.test import APIClient
+
+    from posts import pdf_utils
+    from posts.models import Post
+
+    user = get_user_model().objects.create_user('bench', password='bench')
+    hashes = [f'{i:064x}' for i in range(args.posts + 1)]
+    Post.objects.bulk_create(
+        Post(user=user, title=f'post {i}', type='text', content='', sha256_hash=h,
+             status='original', similarity_score=0.25)
+        for i, h in enumerate(hashes)
+    )
+    client = APIClient()
+    client.force_authenticate(user)
+
+    def get(sha256_hash, **headers):
+        response = client.get(f'/api/posts/report/?hash={sha256_hash}', **headers)
+        if response.streaming:
+            b''.join(response.streaming_content)
+        return response
+
+    with override_settings(ALLOWED_HOSTS=['*'], MEDIA_ROOT=tempfile.mkdtemp(prefix='bench_reports_')):
+        concurrent_hash = hashes.pop()
+        urls = [(h,) for h in hashes]
+        cold = timed_ms(get, urls)
+        warm = timed_ms(get, urls)
+        etags = {h: get(h)['ETag'] for h in hashes}
+        not_modified = timed_ms(lambda h: get(h, HTTP_IF_NONE_MATCH=etags[h]), urls)
+        ranged = timed_ms(lambda h: get(h, HTTP_RANGE='bytes=0-1023'), urls)
+
+        renders = []
+        render = pdf_utils.render_report_pdf
+
+        def counting_render(context, target):
+            renders.append(context['sha256_hash'])
+            render(context, target)
+
+        pdf_utils.render_report_pdf = counting_render
+        barrier = threading.Barrier(args.threads)
+
+        def worker():
+            barrier.wait()
+            get(concurrent_hash)
+
+        threads = [threading.Thread(target=worker) for _ in range(args.threads)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        pdf_utils.render_report_pdf = render
+
+    print(f"{'запрос (медиана)':<28} {'ms':>8}")
+    for name, value in [('первая генерация', cold), ('готовый файл, 200', warm),
+                        ('If-None-Match, 304', not_modified), ('Range 1 KB, 206', ranged)]:
+        print(f"{name:<28} {value:>8.2f}")
+    print(f"{args.threads} одновременных запросов нового отчёта: рендеров {len(renders)}")
+
+
+if __name__ == '__main__':
+    main()
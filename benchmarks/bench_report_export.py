@@ -0,0 +1,90 @@
+"""
+Пропускная способность выгрузки отчётов (POST /api/posts/report/export/) на
+--reports хэшах: многостраничный PDF и ZIP при разном числе процессов пула
+(0 — рендеринг в процессе веб-сервера), время до первого байта и пик памяти
+Python в процессе сервера. Для сравнения — те же отчёты отдельными
+GET /api/posts/report/ по одному.
+
+    python -m benchmarks.bench_report_export --reports 1000 --workers 0 2 4
+"""
+import argparse
+import tempfile
+import time
+import tracemalloc
+
+from benchmarks import setup_django
+
+
+def consume(response):
+    started = time.perf_counter()
+    first_byte = None
+    size = 0
+    for chunk in response.streaming_content:
+        if first_byte is None:
+            first_byte = time.perf_counter() - started
+        size += len(chunk)
+    return size, first_byte or 0.0
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--reports', type=int, default=1000)
+    parser.add_argument('--workers', type=int, nargs='+', default=[0, 2, 4])
+    parser.add_argument('--batch-size', type=int, default=25)
+    parser.add_argument('--single-requests', type=int, default=200,
+                        help="сколько отдельных запросов отчёта мерить для сравнения")
+    args = parser.parse_args()
+
+    setup_django(temp_db=True)
+    from django.contrib.auth import get_user_model
+    from django.test.utils import override_settings
+    from rest_framework.test import APIClient
+
+    from posts.models import Post
+    from posts.pdf_utils import get_config
+
+    user = get_user_model().objects.create_user('bench', password='bench')
+    hashes = [f'{i:064x}' for i in range(args.reports)]
+    Post.objects.bulk_create(
+        Post(user=user, title=f'post {i}', type='text', content='', sha256_hash=h,
+             status='original', similarity_score=(i % 100) / 100)
+        for i, h in enumerate(hashes)
+    )
+    client = APIClient()
+    client.force_authenticate(user)
+
+    def export(fmt, workers, trace=False):
+        config = {**get_config(), 'EXPORT_WORKERS': workers, 'EXPORT_BATCH_SIZE': args.batch_size}
+        # пустой каталог отчётов: каждый отчёт рендерится заново
+        with override_settings(ALLOWED_HOSTS=['*'], REPORTS=config, MEDIA_ROOT=tempfile.mkdtemp(prefix='bench_')):
+            if trace:
+                tracemalloc.start()
+            started = time.perf_counter()
+            response = client.post('/api/posts/report/export/', {'hashes': hashes, 'format': fmt}, format='json')
+            size, first_byte = consume(response)
+            elapsed = time.perf_counter() - started
+            peak = tracemalloc.get_traced_memory()[1] if trace else 0
+            tracemalloc.stop()
+        return elapsed, first_byte, size, peak
+
+    print(f"{'формат':<7} {'процессов':>9} {'отчётов/с':>10} {'всего, s':>9} {'1-й байт, ms':>13} "
+          f"{'размер, MB':>11} {'пик памяти, MB':>15}")
+    for fmt in ('pdf', 'zip'):
+        for workers in args.workers:
+            export(fmt, workers)  # прогрев пула
+            elapsed, first_byte, size, _ = export(fmt, workers)
+            peak = export(fmt, workers, trace=True)[3]
+            print(f"{fmt:<7} {workers:>9} {args.reports / elapsed:>10.0f} {elapsed:>9.2f} "
+                  f"{first_byte * 1000:>13.1f} {size / 2 ** 20:>11.2f} {peak / 2 ** 20:>15.2f}")
+
+    with override_settings(ALLOWED_HOSTS=['*'], MEDIA_ROOT=tempfile.mkdtemp(prefix='bench_')):
+        count = min(args.single_requests, args.reports)
+        started = time.perf_counter()
+        for sha256_hash in hashes[:count]:
+            consume(client.get(f'/api/posts/report/?hash={sha256_hash}'))
+        elapsed = time.perf_counter() - started
+    print(f"отдельные запросы отчёта: {count / elapsed:.0f} отчётов/с ({count} запросов за {elapsed:.2f} s)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,123 @@
+"""
+Пиковая память Python при хэшировании загрузок разного размера (tracemalloc).
+Multipart-тело разбирается MultiPartParser с обработчиками из настроек, затем
+хэш считается по-старому (file.read() целиком) и по-новому (SHA-256 из
+обработчика загрузки). Для .txt-документа сравниваются прежние извлечение
+текста + encode() и extract_text_and_hash.
+
+    python -m benchmarks.bench_upload_hashing --sizes 8 64 256
+"""
+import argparse
+import hashlib
+import os
+import tempfile
+import tracemalloc
+
+from benchmarks import setup_django
+
+BOUNDARY = 'BenchBoundary'
+BLOCK = 1024 * 1024
+
+
+def write_multipart(path, size_mb, file_name):
+    with open(path, 'wb') as f:
+        f.write((
+            f'--{BOUNDARY}\r\n'
+            f'Content-Disposition: form-data; name="image"; filename="{file_name}"\r\n'
+            'Content-Type: application/octet-stream\r\n\r\n'
+        ).encode())
+        line = b'lorem ipsum dolor sit amet consectetur adipiscing elit\n'
+        block = line * (BLOCK // len(line))
+        for _ in range(size_mb):
+            f.write(block)
+        f.write(f'\r\n--{BOUNDARY}--\r\n'.encode())
+
+
+def parse_upload(path):
+    from django.core.files.uploadhandler import load_handler
+    from django.conf import settings
+    from django.http.multipartparser import MultiPartParser
+
+    meta = {
+        'CONTENT_TYPE': f'multipart/form-data; boundary={BOUNDARY}',
+        'CONTENT_LENGTH': str(os.path.getsize(path)),
+    }
+    handlers = [load_handler(name) for name in settings.FILE_UPLOAD_HANDLERS]
+    with open(path, 'rb') as body:
+        _, files = MultiPartParser(meta, body, handlers).parse()
+    return files['image']
+
+
+def legacy_image(path):
+    upload = parse_upload(path)
+    digest = hashlib.sha256(upload.read()).hexdigest()
+    upload.close()
+    return digest
+
+
+def streamed_image(path):
+    from posts.uploads import file_sha256
+    upload = parse_upload(path)
+    digest = file_sha256(upload)
+    upload.close()
+    return digest
+
+
+def legacy_document(path):
+    upload = parse_upload(path)
+    upload.seek(0)
+    text = upload.read().decode('utf-8')
+    digest = hashlib.sha256(text.encode('utf-8')).hexdigest()
+    upload.close()
+    return digest
+
+
+def streamed_document(path):
+    from posts.utils import extract_text_and_hash
+    upload = parse_upload(path)
+    _, digest = extract_text_and_hash(upload, upload.name)
+    upload.close()
+    return digest
+
+
+def peak_mb(func, path):
+    tracemalloc.start()
+    digest = func(path)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return digest, peak / 2 ** 20
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--sizes', type=int, nargs='+', default=[8, 64, 256], help='размер загрузки, МБ')
+    args = parser.parse_args()
+
+    setup_django()
+    from posts.utils import get_pdf_config
+    max_bytes = get_pdf_config()['MAX_BYTES']
+
+    print(f"{'MB':>5} {'image legacy':>13} {'image stream':>13} {'txt legacy':>11} {'txt stream':>11}")
+    with tempfile.TemporaryDirectory() as tmp:
+        for size in args.sizes:
+            image_path = os.path.join(tmp, f'{size}.img')
+            text_path = os.path.join(tmp, f'{size}.txt.body')
+            write_multipart(image_path, size, 'upload.bin')
+            write_multipart(text_path, size, 'upload.txt')
+
+            row = []
+            for func, path in [
+                (legacy_image, image_path), (streamed_image, image_path),
+                (legacy_document, text_path), (streamed_document, text_path),
+            ]:
+                row.append(peak_mb(func, path))
+            assert row[0][0] == row[1][0], "хэши разошлись"
+            # текст больше MAX_BYTES обрезается, и его хэш закономерно отличается от прежнего
+            if size * BLOCK <= max_bytes:
+                assert row[2][0] == row[3][0], "хэши разошлись"
+            print(f"{size:>5} " + ' '.join(f"{mb:>{w}.1f}" for (_, mb), w in zip(row, [13, 13, 11, 11])))
+    print("пиковая память, МБ; текст документа хранится в Post.content и обрезается на PDF_EXTRACTION['MAX_BYTES']")
+
+
+if __name__ == '__main__':
+    main()
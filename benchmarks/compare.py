@@ -0,0 +1,33 @@
+"""
+Сравнение двух JSON-результатов бенчмарка (см. benchmarks.results); код
+выхода 1, если хоть одна метрика ухудшилась больше чем на --threshold.
+
+    python -m benchmarks.compare results/base.json results/HEAD.json --threshold 0.2 --metrics '*.median_ms'
+"""
+import argparse
+import sys
+
+from benchmarks.results import compare, load_results, print_comparison
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('baseline')
+    parser.add_argument('current')
+    parser.add_argument('--threshold', type=float, default=0.2, help="допустимое ухудшение, доля")
+    parser.add_argument('--metrics', default='*', help="шаблон имён метрик (fnmatch)")
+    args = parser.parse_args()
+
+    baseline, current = load_results(args.baseline), load_results(args.current)
+    if baseline.get('params') != current.get('params'):
+        print("внимание: параметры прогонов различаются, сравнение может быть некорректным")
+    rows = compare(baseline, current, args.threshold, args.metrics)
+    print_comparison(rows, baseline, current, args.threshold)
+    regressions = [row for row in rows if row[4]]
+    if regressions:
+        print(f"регрессий: {len(regressions)}")
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,100 @@
+"""
+Синтетические данные для бенчмарков: тексты из фиксированного словаря,
+PDF- и txt-документы заданного размера, изображения, посты с эмбеддингами
+в БД и записи журнала. Все генераторы детерминированы при одном seed.
+"""
+import hashlib
+import io
+import random
+
+import numpy as np
+
+VOCABULARY_SIZE = 5000
+
+
+def vocabulary(seed=0):
+    rng = random.Random(seed)
+    letters = 'abcdefghijklmnopqrstuvwxyz'
+    return [''.join(rng.choice(letters) for _ in range(rng.randint(3, 10))) for _ in range(VOCABULARY_SIZE)]
+
+
+_VOCABULARY = vocabulary()
+
+
+def make_text(rng, words=200):
+    return ' '.join(rng.choice(_VOCABULARY) for _ in range(words))
+
+
+def make_pdf(rng, pages=2, lines_per_page=45):
+    from reportlab.pdfgen import canvas
+
+    buffer = io.BytesIO()
+    c = canvas.Canvas(buffer)
+    for _ in range(pages):
+        for line in range(lines_per_page):
+            c.drawString(40, 800 - line * 17, make_text(rng, 12))
+        c.showPage()
+    c.save()
+    return buffer.getvalue()
+
+
+def make_txt(rng, size_kb=16):
+    parts = []
+    size = 0
+    while size < size_kb * 1024:
+        line = make_text(rng, 15) + '\n'
+        parts.append(line)
+        size += len(line)
+    return ''.join(parts).encode('utf-8')
+
+
+def make_image(rng, size=256):
+    """PNG с крупными цветными блоками: разные seed дают далёкие перцептивные хэши."""
+    from PIL import Image
+
+    blocks = np.array([rng.randrange(256) for _ in range(8 * 8 * 3)], dtype=np.uint8).reshape(8, 8, 3)
+    image = Image.fromarray(blocks).resize((size, size), Image.NEAREST)
+    buffer = io.BytesIO()
+    image.save(buffer, format='PNG')
+    return buffer.getvalue()
+
+
+def create_posts(user, count, rng, words=120, batch_size=2000):
+    """
+    Текстовые посты с эмбеддингами заглушки модели (MinHash-подписи не
+    заполняются: LSH-индекс строится по новым постам). Возвращает их хэши.
+    """
+    from posts.embedding_codec import pack_embedding
+    from posts.models import Post
+
+    from benchmarks.stub_model import StubModel
+
+    model = StubModel()
+    hashes = []
+    for start in range(0, count, batch_size):
+        posts = []
+        for i in range(start, min(start + batch_size, count)):
+            content = make_text(rng, words)
+            sha256_hash = hashlib.sha256(content.encode('utf-8')).hexdigest()
+            hashes.append(sha256_hash)
+            posts.append(Post(
+                user=user, title=f'seed {i}', type='text', content=content, sha256_hash=sha256_hash,
+                status='original', similarity_score=0.0,
+                embedding_vector=pack_embedding(model.encode(content)),
+            ))
+        Post.objects.bulk_create(posts)
+    return hashes
+
+
+def fill_ledger(ledger, count, batch_size=10000):
+    for start in range(0, count, batch_size):
+        ledger.append_many([
+            {
+                'timestamp': '2025-01-01T00:00:00',
+                'hash': hashlib.sha256(f'ledger {i}'.encode()).hexdigest(),
+                'user': f'user{i % 1000}',
+                'title': f'seed {i}',
+            }
+            for i in range(start, min(start + batch_size, count))
+        ])
+    ledger.flush()
@@ -0,0 +1,82 @@
+"""
+Результаты бенчмарков в JSON: окружение (коммит, Python, платформа, число
+CPU), параметры прогона и метрики вида {"имя": {"value", "unit", "better"}},
+где better — "lower" или "higher". compare() находит метрики, ухудшившиеся
+больше чем на threshold (доля) относительно базового прогона.
+"""
+import fnmatch
+import json
+import os
+import platform
+import subprocess
+import sys
+from datetime import datetime, timezone
+
+
+def git_revision():
+    try:
+        revision = subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, check=True, timeout=10,
+        ).stdout.strip()
+        dirty = subprocess.run(
+            ['git', 'status', '--porcelain', '--untracked-files=no'], capture_output=True, text=True, timeout=10,
+        ).stdout.strip()
+    except (OSError, subprocess.SubprocessError):
+        return None
+    return revision + ('-dirty' if dirty else '')
+
+
+def environment():
+    return {
+        'commit': git_revision(),
+        'python': sys.version.split()[0],
+        'platform': platform.platform(),
+        'cpus': os.cpu_count(),
+        'created_at': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+    }
+
+
+def metric(value, unit='ms', better='lower'):
+    return {'value': round(value, 4), 'unit': unit, 'better': better}
+
+
+def write_results(path, suite, params, metrics):
+    data = {'suite': suite, 'environment': environment(), 'params': params, 'metrics': metrics}
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(data, f, ensure_ascii=False, indent=2)
+        f.write('\n')
+    return data
+
+
+def load_results(path):
+    with open(path, encoding='utf-8') as f:
+        return json.load(f)
+
+
+def compare(baseline, current, threshold=0.2, pattern='*'):
+    """
+    Строки сравнения общих метрик, подходящих под pattern: (имя, было, стало,
+    относительное изменение в сторону ухудшения, регрессия ли).
+    """
+    rows = []
+    for name, new in current['metrics'].items():
+        old = baseline['metrics'].get(name)
+        if old is None or not fnmatch.fnmatch(name, pattern) or not old['value']:
+            continue
+        change = (new['value'] - old['value']) / old['value']
+        if new.get('better', 'lower') == 'higher':
+            change = -change
+        rows.append((name, old['value'], new['value'], change, change > threshold))
+    return rows
+
+
+def print_comparison(rows, baseline, current, threshold):
+    print(f"база: {baseline['environment'].get('commit')}, текущий: {current['environment'].get('commit')}, "
+          f"порог {threshold:.0%}")
+    print(f"{'метрика':<36} {'было':>10} {'стало':>10} {'хуже на':>9}")
+    for name, old, new, change, regressed in rows:
+        mark = '  РЕГРЕССИЯ' if regressed else ''
+        print(f"{name:<36} {old:>10.3f} {new:>10.3f} {change:>8.1%}{mark}")
@@ -0,0 +1,40 @@
+"""
+Заглушка SentenceTransformer для бенчмарков без сети и torch: детерминированный
+"мешок слов" с хэшированием слов в DIM измерений. Похожие тексты получают
+близкие векторы, поэтому статусы original/suspicious/duplicate распределяются
+правдоподобно. STUB_MODEL_COST_MS (переменная окружения) добавляет задержку на
+текст, чтобы приблизить стоимость к настоящей модели.
+"""
+import os
+import time
+import zlib
+
+import numpy as np
+
+DIM = 384
+
+
+class StubModel:
+    def __init__(self, dim=DIM, cost_ms=0.0):
+        self.dim = dim
+        self.cost_ms = cost_ms
+
+    def _encode_one(self, text):
+        vector = np.zeros(self.dim, dtype=np.float32)
+        for word in text.lower().split()[:256]:
+            # как у модели: учитывается только начало текста
+            vector[zlib.crc32(word.encode('utf-8')) % self.dim] += 1.0
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def encode(self, sentences, convert_to_numpy=True, batch_size=32, **kwargs):
+        single = isinstance(sentences, str)
+        texts = [sentences] if single else list(sentences)
+        if self.cost_ms:
+            time.sleep(self.cost_ms * len(texts) / 1000)
+        vectors = np.stack([self._encode_one(t) for t in texts]) if texts else np.empty((0, self.dim), np.float32)
+        return vectors[0] if single else vectors
+
+
+def load(name):
+    return StubModel(cost_ms=float(os.environ.get('STUB_MODEL_COST_MS', '0')))
@@ -124,6 +124,190 @@ DATABASES = {
 }
 
 
+# Модель эмбеддингов загружается лениво при первом запросе.
+# PRELOAD=True загружает её при импорте WSGI-приложения: с gunicorn --preload это
+# происходит в мастере до fork, и воркеры делят веса через copy-on-write.
+EMBEDDING_MODEL = {
+    'NAME': 'all-MiniLM-L6-v2',
+    'LOADER': 'posts.model_registry.load_sentence_transformer',
+    'PRELOAD': os.environ.get('EMBEDDING_MODEL_PRELOAD') == '1',
+}
+
+# Микробатчинг: тексты параллельных запросов кодируются одним вызовом модели
+# в отдельном потоке (до MAX_BATCH_SIZE текстов или MAX_WAIT_MS миллисекунд ожидания)
+EMBEDDING_BATCHING = {
+    'ENABLED': True,
+    'MAX_BATCH_SIZE': 32,
+    'MAX_WAIT_MS': 5,
+}
+
+# Кэш эмбеддингов по SHA-256 содержимого: LRU в памяти и, если задан DISK_PATH,
+# sqlite-файл, общий для всех воркеров
+EMBEDDING_CACHE = {
+    'MAX_ITEMS': 10000,
+    'DISK_PATH': None,  # например os.path.join(BASE_DIR, 'embedding_cache.sqlite3')
+}
+
+# Тип хранения эмбеддингов в Post.embedding_vector: 'float32' или 'float16' (вдвое компактнее)
+EMBEDDING_STORAGE_DTYPE = 'float32'
+
+# Поиск похожих постов: 'brute' (точный перебор), 'ivf' (приближённый) или путь к своему классу
+SIMILARITY_SEARCH = {
+    'ENGINE': 'brute',
+    'OPTIONS': {},  # для 'ivf': {'nlist': 256, 'nprobe': 16, 'train_size': 10000}
+    'INDEX_PATH': os.path.join(BASE_DIR, 'similarity_index.npz'),
+    'CHUNK_INDEX_PATH': os.path.join(BASE_DIR, 'similarity_chunk_index.npz'),
+    'RESAVE_AFTER': 1000,  # пересохранить снимок, если при старте догружено столько постов
+    'PRUNE_CHECK_SECONDS': 5,  # как часто проверять, не удалены ли посты другими процессами
+}
+
+
+# Длинные тексты дополнительно сравниваются по перекрывающимся фрагментам
+# (CHUNK_WORDS слов с перекрытием OVERLAP_WORDS, не больше MAX_CHUNKS на пост).
+# Для каждого фрагмента берутся TOP_K ближайших; сходство с постом — 'max' по парам
+# фрагментов или 'topk' (среднее AGGREGATION_K лучших пар)
+CHUNKING = {
+    'ENABLED': True,
+    'CHUNK_WORDS': 200,
+    'OVERLAP_WORDS': 50,
+    'MAX_CHUNKS': 64,
+    'TOP_K': 5,
+    'AGGREGATION': 'max',
+    'AGGREGATION_K': 3,
+}
+
+# MinHash/LSH-префильтр: почти дословные копии (оценка Жаккара по словесным шинглам
+# выше DUPLICATE_JACCARD) помечаются дубликатами без запуска модели.
+# NARROW_VECTOR_SEARCH сравнивает эмбеддинг только с LSH-кандидатами, если они есть
+LSH = {
+    'ENABLED': True,
+    'NUM_PERM': 128,
+    'BANDS': 32,
+    'SHINGLE_WORDS': 5,
+    'DUPLICATE_JACCARD': 0.9,
+    'MAX_CANDIDATES': 50,
+    'NARROW_VECTOR_SEARCH': False,
+}
+
+# Перцептивный хэш изображений ('phash' или 'dhash'): расстояние Хэмминга до ближайшего
+# поста не больше DUPLICATE_DISTANCE бит — дубликат, не больше SUSPICIOUS_DISTANCE — подозрительный
+IMAGE_HASH = {
+    'ALGORITHM': 'phash',
+    'DUPLICATE_DISTANCE': 4,
+    'SUSPICIOUS_DISTANCE': 10,
+    'PRUNE_CHECK_SECONDS': 5,  # как часто проверять, не удалены ли посты другими процессами
+}
+
+# Извлечение текста из PDF: документы от PARALLEL_MIN_PAGES страниц (вне главного потока —
+# все) разбираются пулом из WORKERS процессов; страница дольше PAGE_TIMEOUT_SECONDS пропускается, текст
+# обрезается на MAX_PAGES страницах или MAX_BYTES байтах (.txt-документы — тоже на MAX_BYTES)
+PDF_EXTRACTION = {
+    'WORKERS': 4,
+    'PARALLEL_MIN_PAGES': 16,
+    'MAX_PAGES': 2000,
+    'MAX_BYTES': 20 * 1024 * 1024,
+    'PAGE_TIMEOUT_SECONDS': 10,
+}
+
+# Асинхронная обработка постов: создание сразу отвечает 202 со статусом 'processing',
+# извлечение текста, эмбеддинг, поиск похожих и запись в "блокчейн" выполняют воркеры
+# (потоки в веб-процессе и/или python manage.py run_ingestion_worker)
+POST_INGESTION = {
+    'ASYNC': False,
+    'WORKERS': 2,
+    'START_LOCAL_WORKERS': True,
+    'MAX_ATTEMPTS': 3,
+    'RETRY_BACKOFF_SECONDS': 5,
+    'POLL_INTERVAL_SECONDS': 2,
+    'LEASE_SECONDS': 300,
+}
+
+
+# "Блокчейн": журнал JSON-строк, в который только дописывают, и sqlite-индекс хэш -> смещение.
+# fsync делается раз в FSYNC_EVERY записей или FSYNC_INTERVAL_SECONDS секунд (1 — после каждой).
+# Записи запечатываются в блоки с корнем Меркла по BLOCK_SIZE штук или через
+# BLOCK_INTERVAL_SECONDS после первой незапечатанной записи
+LEDGER = {
+    'PATH': os.path.join(BASE_DIR, 'ledger.jsonl'),
+    'INDEX_PATH': os.path.join(BASE_DIR, 'ledger_index.sqlite3'),
+    'BLOCKS_PATH': os.path.join(BASE_DIR, 'ledger_blocks.jsonl'),
+    'FSYNC_EVERY': 64,
+    'FSYNC_INTERVAL_SECONDS': 1.0,
+    'BLOCK_SIZE': 1024,
+    'BLOCK_INTERVAL_SECONDS': 60,
+}
+
+# Проверка хэшей: фильтр Блума по хэшам постов (ёмкость BLOOM_CAPACITY, доля ложных
+# срабатываний BLOOM_ERROR_RATE) отсекает отсутствующие хэши без запроса к БД.
+# Пакетная проверка принимает до MAX_HASHES хэшей и ищет их IN-запросами по IN_CHUNK_SIZE
+HASH_VERIFICATION = {
+    'BLOOM_ENABLED': True,
+    'BLOOM_CAPACITY': 1_000_000,
+    'BLOOM_ERROR_RATE': 0.001,
+    'MAX_HASHES': 10000,
+    'IN_CHUNK_SIZE': 500,
+}
+
+# Асинхронные представления (posts/async_views.py): лента, проверка хэша и комментарии
+# читают БД через async ORM, создание поста и PDF-отчёт выполняются в пуле из
+# OFFLOAD_WORKERS потоков. Нужны только под ASGI: ddd_project/asgi.py включает их
+# переменной окружения DJANGO_ASYNC_VIEWS, под WSGI остаются синхронные DRF-представления
+ASYNC_VIEWS = {
+    'ENABLED': os.environ.get('DJANGO_ASYNC_VIEWS') == '1',
+    'OFFLOAD_WORKERS': 4,
+}
+
+# PDF-отчёты кэшируются в MEDIA_ROOT/reports (или DIR) по хэшу поста и отпечатку
+# данных отчёта; PREGENERATE — генерировать отчёт фоновым воркером сразу после
+# обработки поста (только в асинхронном режиме POST_INGESTION). Выгрузка отчётов
+# по списку хэшей рендерит пачки по EXPORT_BATCH_SIZE в EXPORT_WORKERS процессах
+# (0 — в процессе веб-сервера), не больше EXPORT_MAX_HASHES хэшей за запрос
+REPORTS = {
+    'DIR': None,
+    'PREGENERATE': False,
+    'LOCK_STRIPES': 64,
+    'EXPORT_WORKERS': 2,
+    'EXPORT_BATCH_SIZE': 25,
+    'EXPORT_MAX_HASHES': 5000,
+}
+
+# Метрики в формате Prometheus на GET /metrics/: время этапов создания поста по типу,
+# отчёты, проверка хэшей. TOKEN — если задан, нужен заголовок Authorization: Bearer <TOKEN>;
+# без токена метрики отдаются только при DEBUG или адресам из INTERNAL_IPS
+METRICS = {
+    'ENABLED': True,
+    'TOKEN': None,
+    'BUCKETS': (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0),
+}
+
+# Профилировщик запросов: при ENABLED профилируются запросы к PATH_PREFIXES с заголовком
+# HEADER (со значением TOKEN, если он задан; без токена — только при DEBUG или с адресов
+# из INTERNAL_IPS) и доля SAMPLE_RATE остальных. Стек снимается раз в INTERVAL_SECONDS;
+# снимки дольше MIN_DURATION_SECONDS сохраняются в DIR, хранятся MAX_CAPTURES последних. Список и загрузка — /api/posts/profiles/ (только staff)
+PROFILING = {
+    'ENABLED': False,
+    'HEADER': 'X-Profile',
+    'TOKEN': None,
+    'SAMPLE_RATE': 0.0,
+    'PATH_PREFIXES': ['/api/'],
+    'INTERVAL_SECONDS': 0.005,
+    'MIN_DURATION_SECONDS': 0.0,
+    'DIR': os.path.join(BASE_DIR, 'profiles'),
+    'MAX_CAPTURES': 200,
+}
+if PROFILING['ENABLED']:
+    # выключенный профилировщик не стоит в цепочке совсем
+    MIDDLEWARE.append('posts.profiling.SamplingProfilerMiddleware')
+
+# SHA-256 загружаемых файлов считается по кускам во время приёма загрузки;
+# файлы больше FILE_UPLOAD_MAX_MEMORY_SIZE пишутся во временный файл на диске
+FILE_UPLOAD_HANDLERS = [
+    'posts.uploads.HashingMemoryFileUploadHandler',
+    'posts.uploads.HashingTemporaryFileUploadHandler',
+]
+FILE_UPLOAD_MAX_MEMORY_SIZE = 2621440
+
+
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
 
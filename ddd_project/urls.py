@@ -4,6 +4,8 @@ from drf_yasg.views import get_schema_view
 from drf_yasg import openapi
 from rest_framework import permissions
 
+from posts.metrics import metrics_view
+
 
 from django.conf import settings
 from django.conf.urls.static import static
@@ -28,6 +30,7 @@ urlpatterns = [
     path('swagger/', schema_view.with_ui('swagger', cache_timeout=0), name='schema-swagger-ui'),
     path('redoc/', schema_view.with_ui('redoc', cache_timeout=0), name='schema-redoc'),
     path('api/posts/', include('posts.urls')),
+    path('metrics/', metrics_view, name='metrics'),
 ]
 
 if settings.DEBUG:
@@ -0,0 +1,10 @@
+# gunicorn -c gunicorn.conf.py ddd_project.wsgi
+# Приложение (и модель эмбеддингов, см. EMBEDDING_MODEL в settings) загружается
+# в мастере до fork, воркеры разделяют её страницы памяти через copy-on-write.
+import os
+
+os.environ.setdefault('EMBEDDING_MODEL_PRELOAD', '1')
+
+bind = os.environ.get('GUNICORN_BIND', '127.0.0.1:8000')
+workers = int(os.environ.get('GUNICORN_WORKERS', '4'))
+preload_app = True
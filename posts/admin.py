@@ -1,5 +1,6 @@
 from django.contrib import admin
-from .models import Post, Comment, Vote
+from .models import Post, Comment, Vote, IngestionJob
 admin.site.register(Post)
 admin.site.register(Comment)
-admin.site.register(Vote)
\ No newline at end of file
+admin.site.register(Vote)
+admin.site.register(IngestionJob)
\ No newline at end of file
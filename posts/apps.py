@@ -1,6 +1,17 @@
 from django.apps import AppConfig
+from django.core.signals import request_started
 
 
 class PostsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'posts'
+
+    def ready(self):
+        from . import signals  # noqa: F401
+        from .ingestion_queue import get_config as get_ingestion_config, start_local_workers
+
+        # пул стартует с первым запросом, а не здесь: ready выполняется и в manage.py migrate,
+        # а потоки не переживают fork предзагруженного приложения
+        config = get_ingestion_config()
+        if config['ASYNC'] and config['START_LOCAL_WORKERS']:
+            request_started.connect(start_local_workers, dispatch_uid='posts.start_local_workers')
@@ -0,0 +1,189 @@
+"""
+Асинхронные представления для запуска под ASGI (ddd_project/asgi.py, настройка
+ASYNC_VIEWS). Синхронное представление под ASGI целиком выполняется в потоке,
+который Django заводит на каждый запрос, так что число потоков и соединений с
+БД растёт вместе с числом запросов в работе.
+
+Лента, проверка хэша и список комментариев здесь — async-функции: БД читается
+через async ORM (поток занят только на время запроса к БД), JWT проверяется без
+DRF, ответ совпадает с ответом DRF-представлений. Создание поста и PDF-отчёт
+остаются DRF-представлениями, но выполняются в пуле из OFFLOAD_WORKERS потоков:
+цикл событий не ждёт model.encode и рендеринга PDF, а тяжёлых запросов
+одновременно выполняется не больше, чем потоков в пуле.
+"""
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from functools import wraps
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.auth.models import AnonymousUser
+from django.db import close_old_connections
+from django.http import Http404, JsonResponse
+from rest_framework.exceptions import APIException, MethodNotAllowed, NotAuthenticated, NotFound
+from rest_framework.request import Request
+from rest_framework.utils.encoders import JSONEncoder
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+from rest_framework_simplejwt.settings import api_settings as jwt_settings
+from rest_framework_simplejwt.utils import get_md5_hash_password
+
+from .bloom import async_get_hash_filter, get_config as get_verification_config
+from .metrics import VERIFY_LOOKUPS, VERIFY_REQUEST_SECONDS, timed_response
+from .pagination import KeysetPagination
+from .serializers import CommentSerializer, PostListSerializer
+from .views import (
+    PostCommentsListView, PostListView, PostVerifyView, comments_queryset, verify_queryset, verify_result,
+)
+
+DEFAULTS = {
+    'ENABLED': False,
+    'OFFLOAD_WORKERS': 4,
+}
+
+
+def get_config():
+    return {**DEFAULTS, **getattr(settings, 'ASYNC_VIEWS', {})}
+
+
+def json_response(data, status=200, headers=None):
+    # как JSONRenderer DRF: компактно и без экранирования не-ASCII
+    return JsonResponse(data, status=status, headers=headers, encoder=JSONEncoder, safe=False,
+                        json_dumps_params={'separators': (',', ':'), 'ensure_ascii': False})
+
+
+def exception_response(exc):
+    """Ответ на APIException в формате exception_handler DRF."""
+    data = exc.detail if isinstance(exc.detail, (list, dict)) else {'detail': exc.detail}
+    headers = {}
+    if isinstance(exc, (NotAuthenticated, AuthenticationFailed)):
+        headers['WWW-Authenticate'] = JWTAuthentication().authenticate_header(None)
+    return json_response(data, status=exc.status_code, headers=headers)
+
+
+async def authenticate(request):
+    """
+    Пользователь из JWT в заголовке Authorization — те же проверки, что у
+    JWTAuthentication, но пользователь читается через async ORM. None —
+    токена в запросе нет.
+    """
+    authentication = JWTAuthentication()
+    header = authentication.get_header(request)
+    raw_token = authentication.get_raw_token(header) if header is not None else None
+    if raw_token is None:
+        return None
+    token = authentication.get_validated_token(raw_token)
+    try:
+        user_id = token[jwt_settings.USER_ID_CLAIM]
+    except KeyError:
+        raise InvalidToken("Token contained no recognizable user identification")
+
+    User = get_user_model()
+    try:
+        user = await User.objects.aget(**{jwt_settings.USER_ID_FIELD: user_id})
+    except User.DoesNotExist:
+        raise AuthenticationFailed("User not found", code='user_not_found')
+    if jwt_settings.CHECK_USER_IS_ACTIVE and not user.is_active:
+        raise AuthenticationFailed("User is inactive", code='user_inactive')
+    if jwt_settings.CHECK_REVOKE_TOKEN and token.get(jwt_settings.REVOKE_TOKEN_CLAIM) != get_md5_hash_password(user.password):
+        raise AuthenticationFailed("The user's password has been changed.", code='password_changed')
+    return user
+
+
+def api_view(methods, authenticated=False, schema_view=None):
+    """
+    Обёртка async-представления: допустимые методы, JWT-аутентификация и
+    ошибки DRF. schema_view — DRF-представление с тем же контрактом, по нему
+    drf_yasg описывает путь в Swagger.
+    """
+    def decorator(func):
+        @wraps(func)
+        async def view(request, *args, **kwargs):
+            try:
+                if request.method not in methods:
+                    raise MethodNotAllowed(request.method)
+                # как DRF: неверный токен — 401 даже там, где вход не обязателен
+                request.user = await authenticate(request) or AnonymousUser()
+                if authenticated and not request.user.is_authenticated:
+                    raise NotAuthenticated()
+                return await func(request, *args, **kwargs)
+            except Http404:
+                return exception_response(NotFound())
+            except APIException as exc:
+                return exception_response(exc)
+
+        view.csrf_exempt = True
+        if schema_view is not None:
+            view.cls = schema_view
+            view.initkwargs = {}
+        return view
+    return decorator
+
+
+@api_view(['GET'], authenticated=True, schema_view=PostVerifyView)
+@timed_response(VERIFY_REQUEST_SECONDS, endpoint='single')
+async def post_verify(request):
+    hash_to_check = request.GET.get('hash')
+    if not hash_to_check:
+        return json_response({"error": "Hash parameter is required."}, status=400)
+
+    if get_verification_config()['BLOOM_ENABLED']:
+        known = await async_get_hash_filter()
+        if not known.might_contain([hash_to_check])[0]:
+            VERIFY_LOOKUPS.inc(result='bloom_rejected')
+            return json_response({"exists": False})
+
+    post = await verify_queryset(hash_to_check).afirst()
+    VERIFY_LOOKUPS.inc(result='found' if post else 'not_found')
+    return json_response(verify_result(request, post))
+
+
+@api_view(['GET'], schema_view=PostListView)
+async def post_list(request):
+    # query_params и build_absolute_uri для пагинации и ссылок на файлы
+    api_request = Request(request)
+    paginator = KeysetPagination()
+    page = await paginator.apaginate_queryset(PostListView.queryset.all(), api_request)
+    data = PostListSerializer(page, many=True, context={'request': api_request}).data
+    return json_response(paginator.get_paginated_response(data).data)
+
+
+@api_view(['GET'], schema_view=PostCommentsListView)
+async def post_comments(request, pk):
+    comments = [comment async for comment in comments_queryset(pk)]
+    return json_response(CommentSerializer(comments, many=True).data)
+
+
+_executor = None
+_executor_pid = None
+_executor_lock = threading.Lock()
+
+
+def _get_executor():
+    global _executor, _executor_pid
+    with _executor_lock:
+        if _executor is None or _executor_pid != os.getpid():
+            _executor = ThreadPoolExecutor(get_config()['OFFLOAD_WORKERS'], thread_name_prefix='offload')
+            _executor_pid = os.getpid()
+        return _executor
+
+
+def offloaded(view):
+    """Синхронное представление, которое под ASGI выполняется в общем пуле из OFFLOAD_WORKERS потоков."""
+    def run(request, *args, **kwargs):
+        # соединения с БД у потоков пула свои: закрываем их, как Django по request_finished
+        close_old_connections()
+        try:
+            response = view(request, *args, **kwargs)
+            if callable(getattr(response, 'render', None)):
+                response = response.render()
+            return response
+        finally:
+            close_old_connections()
+
+    @wraps(view)
+    async def wrapper(request, *args, **kwargs):
+        return await sync_to_async(run, thread_sensitive=False, executor=_get_executor())(request, *args, **kwargs)
+    return wrapper
@@ -1,10 +1,477 @@
+"""
+"Блокчейн" записей о загруженных хэшах: журнал JSON-строк, в который только
+дописывают (LEDGER['PATH']), и sqlite-индекс хэш -> смещение записи в журнале
+(LEDGER['INDEX_PATH']). Дозапись идёт под файловой блокировкой, поэтому
+журнал общий для всех воркеров; fsync делается пачками. Индекс можно удалить:
+он достраивается по журналу при следующем открытии.
+
+Записи запечатываются в блоки (LEDGER['BLOCKS_PATH']): блок хранит диапазон
+журнала, корень дерева Меркла его записей и хэш предыдущего блока. Блок
+закрывается, когда в нём BLOCK_SIZE записей или первой из них больше
+BLOCK_INTERVAL_SECONDS секунд.
+
+Старый blockchain_log.json (один JSON-массив) переносится командой
+python manage.py import_blockchain_log.
+"""
+import atexit
+import hashlib
 import json
 import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
 from datetime import datetime
+
 from django.conf import settings
 
+from .file_locks import lock_file, unlock_file
+from .merkle import build_levels, inclusion_proof, leaf_hash, merkle_root
+
 BLOCKCHAIN_FILE = os.path.join(settings.BASE_DIR, 'blockchain_log.json')
 
+DEFAULTS = {
+    'PATH': os.path.join(settings.BASE_DIR, 'ledger.jsonl'),
+    'INDEX_PATH': os.path.join(settings.BASE_DIR, 'ledger_index.sqlite3'),
+    'BLOCKS_PATH': os.path.join(settings.BASE_DIR, 'ledger_blocks.jsonl'),
+    'FSYNC_EVERY': 64,
+    'FSYNC_INTERVAL_SECONDS': 1.0,
+    'BLOCK_SIZE': 1024,
+    'BLOCK_INTERVAL_SECONDS': 60,
+}
+
+INDEX_BATCH_SIZE = 10000
+GENESIS_HASH = '0' * 64
+BLOCK_HEADER_FIELDS = ('index', 'prev_hash', 'merkle_root', 'start', 'end', 'count', 'sealed_at')
+TREE_CACHE_SIZE = 16
+
+
+def get_config():
+    return {**DEFAULTS, **getattr(settings, 'LEDGER', {})}
+
+
+def _truncate_torn_line(fd, path):
+    """Обрезает недописанную (без перевода строки) последнюю строку; возвращает размер файла."""
+    size = os.fstat(fd).st_size
+    if not size:
+        return 0
+    with open(path, 'rb') as f:
+        f.seek(size - 1)
+        if f.read(1) == b'\n':
+            return size
+        end = size
+        while end > 0:
+            start = max(end - 65536, 0)
+            f.seek(start)
+            newline = f.read(end - start).rfind(b'\n')
+            if newline >= 0:
+                size = start + newline + 1
+                break
+            end = start
+        else:
+            size = 0
+    os.ftruncate(fd, size)
+    return size
+
+
+def _iter_lines(path, start, end):
+    """(смещение, строка без '\\n') для полных строк файла в диапазоне [start, end)."""
+    with open(path, 'rb') as f:
+        f.seek(start)
+        offset = start
+        for line in f:
+            if offset + len(line) > end or not line.endswith(b'\n'):
+                return
+            yield offset, line[:-1]
+            offset += len(line)
+
+
+def block_hash(header):
+    payload = json.dumps({key: header[key] for key in BLOCK_HEADER_FIELDS}, sort_keys=True, separators=(',', ':'))
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+class Ledger:
+    """
+    Журнал записей с индексом по хэшу. Записи не теряются при падении процесса:
+    каждая сразу уходит в файл одним write(); fsync (защита от сбоя ОС) делается
+    раз в fsync_every записей или fsync_interval секунд, а также при выходе.
+    """
+
+    def __init__(self, path, index_path, blocks_path=None, fsync_every=64, fsync_interval=1.0,
+                 block_size=1024, block_interval=60):
+        self.path = path
+        self.index_path = index_path
+        self.blocks_path = blocks_path or os.path.splitext(path)[0] + '_blocks.jsonl'
+        self.fsync_every = fsync_every
+        self.fsync_interval = fsync_interval
+        self.block_size = block_size
+        self.block_interval = block_interval
+        self._lock = threading.Lock()
+        self._fd = None
+        self._blocks_fd = None
+        self._db = None
+        self._unsynced = 0
+        self._synced_at = time.monotonic()
+        self._pending_since = (None, None)  # (sealed_until, время первой незапечатанной записи)
+        self._trees = OrderedDict()
+
+    # --- файлы ---
+
+    def _open(self):
+        if self._fd is not None:
+            return
+        self._fd = os.open(self.path, os.O_RDWR | os.O_CREAT | os.O_APPEND, 0o644)
+        self._blocks_fd = os.open(self.blocks_path, os.O_RDWR | os.O_CREAT | os.O_APPEND, 0o644)
+        self._db = sqlite3.connect(self.index_path, check_same_thread=False, isolation_level=None)
+        self._db.executescript('''
+            PRAGMA journal_mode=WAL;
+            PRAGMA synchronous=NORMAL;
+            CREATE TABLE IF NOT EXISTS entries (hash TEXT NOT NULL, offset INTEGER NOT NULL);
+            CREATE INDEX IF NOT EXISTS entries_hash ON entries (hash);
+            CREATE INDEX IF NOT EXISTS entries_offset ON entries (offset);
+            CREATE TABLE IF NOT EXISTS blocks (
+                idx INTEGER PRIMARY KEY, start INTEGER NOT NULL, "end" INTEGER NOT NULL,
+                hash TEXT NOT NULL, offset INTEGER NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value INTEGER);
+        ''')
+        lock_file(self._fd)
+        try:
+            self._recover()
+        finally:
+            unlock_file(self._fd)
+
+    def _meta(self, key):
+        row = self._db.execute('SELECT value FROM meta WHERE key = ?', (key,)).fetchone()
+        return row[0] if row else 0
+
+    def _set_meta(self, key, value):
+        self._db.execute('INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)', (key, value))
+
+    def _recover(self):
+        """Обрезает недописанные строки и индексирует записи и блоки, добавленные после индексации."""
+        size = _truncate_torn_line(self._fd, self.path)
+        start = self._meta('indexed_until')
+        if start > size:
+            # журнал заменили или обрезали: индекс строится заново
+            self._db.execute('DELETE FROM entries')
+            self._db.execute('DELETE FROM blocks')
+            self._set_meta('blocks_indexed_until', 0)
+            start = 0
+        batch = []
+        for offset, line in _iter_lines(self.path, start, size):
+            batch.append((json.loads(line)['hash'], offset))
+            if len(batch) >= INDEX_BATCH_SIZE:
+                self._index(batch, offset + len(line) + 1)
+                batch = []
+        self._index(batch, size)
+
+        blocks_size = _truncate_torn_line(self._blocks_fd, self.blocks_path)
+        start = self._meta('blocks_indexed_until')
+        if start > blocks_size:
+            self._db.execute('DELETE FROM blocks')
+            start = 0
+        self._db.execute('BEGIN')
+        for offset, line in _iter_lines(self.blocks_path, start, blocks_size):
+            block = json.loads(line)
+            self._db.execute(
+                'INSERT OR REPLACE INTO blocks (idx, start, "end", hash, offset) VALUES (?, ?, ?, ?, ?)',
+                (block['index'], block['start'], block['end'], block['hash'], offset),
+            )
+        self._set_meta('blocks_indexed_until', blocks_size)
+        self._db.execute('COMMIT')
+
+    def _catch_up(self):
+        # индекс мог отстать, если другой процесс упал между записью и индексацией
+        if (self._meta('indexed_until') != os.fstat(self._fd).st_size
+                or self._meta('blocks_indexed_until') != os.fstat(self._blocks_fd).st_size):
+            self._recover()
+
+    def _index(self, entries, indexed_until):
+        self._db.execute('BEGIN')
+        self._db.executemany('INSERT INTO entries (hash, offset) VALUES (?, ?)', entries)
+        self._set_meta('indexed_until', indexed_until)
+        self._db.execute('COMMIT')
+
+    def _fsync(self):
+        os.fsync(self._fd)
+        os.fsync(self._blocks_fd)
+        self._unsynced = 0
+        self._synced_at = time.monotonic()
+
+    # --- запись ---
+
+    def append_many(self, records):
+        """Дописывает записи одним write() под блокировкой; возвращает их смещения."""
+        if not records:
+            return []
+        lines = [json.dumps(record, ensure_ascii=False).encode('utf-8') + b'\n' for record in records]
+        with self._lock:
+            self._open()
+            lock_file(self._fd)
+            try:
+                self._catch_up()
+                start = os.fstat(self._fd).st_size
+                os.write(self._fd, b''.join(lines))
+                offsets = []
+                offset = start
+                for line in lines:
+                    offsets.append(offset)
+                    offset += len(line)
+                self._index([(record['hash'], o) for record, o in zip(records, offsets)], offset)
+                self._seal_due()
+            finally:
+                unlock_file(self._fd)
+            self._unsynced += len(lines)
+            if self._unsynced >= self.fsync_every or time.monotonic() - self._synced_at >= self.fsync_interval:
+                self._fsync()
+        return offsets
+
+    def append(self, record):
+        return self.append_many([record])[0]
+
+    def flush(self):
+        with self._lock:
+            if self._fd is not None and self._unsynced:
+                self._fsync()
+
+    def close(self):
+        self.flush()
+        with self._lock:
+            if self._fd is not None:
+                os.close(self._fd)
+                os.close(self._blocks_fd)
+                self._db.close()
+                self._fd = self._blocks_fd = self._db = None
+
+    # --- блоки ---
+
+    def _last_block(self):
+        row = self._db.execute('SELECT idx, "end", hash FROM blocks ORDER BY idx DESC LIMIT 1').fetchone()
+        return row or (-1, 0, GENESIS_HASH)
+
+    def _pending_started(self, sealed_until):
+        """Время (epoch) первой незапечатанной записи; кэшируется до следующего блока."""
+        if self._pending_since[0] != sealed_until:
+            started = time.time()
+            for _, line in _iter_lines(self.path, sealed_until, os.fstat(self._fd).st_size):
+                timestamp = json.loads(line).get('timestamp')
+                try:
+                    # save_to_blockchain пишет время в UTC без часового пояса
+                    started = (datetime.fromisoformat(timestamp) - datetime(1970, 1, 1)).total_seconds()
+                except (TypeError, ValueError):
+                    pass
+                break
+            self._pending_since = (sealed_until, started)
+        return self._pending_since[1]
+
+    def _seal_due(self, force=False):
+        """Запечатывает полные блоки, а также неполный — по времени или при force. Под блокировкой."""
+        sealed = 0
+        while True:
+            index, sealed_until, prev_hash = self._last_block()
+            pending = self._db.execute(
+                'SELECT offset FROM entries WHERE offset >= ? ORDER BY offset LIMIT ?',
+                (sealed_until, self.block_size + 1),
+            ).fetchall()
+            if not pending:
+                return sealed
+            if len(pending) > self.block_size:
+                end = pending[self.block_size][0]
+            elif force or time.time() - self._pending_started(sealed_until) >= self.block_interval:
+                end = self._meta('indexed_until')
+            else:
+                return sealed
+            self._write_block(index + 1, prev_hash, sealed_until, end)
+            sealed += 1
+
+    def _write_block(self, index, prev_hash, start, end):
+        leaves = [leaf_hash(line) for _, line in _iter_lines(self.path, start, end)]
+        block = {
+            'index': index,
+            'prev_hash': prev_hash,
+            'merkle_root': merkle_root(leaves),
+            'start': start,
+            'end': end,
+            'count': len(leaves),
+            'sealed_at': datetime.utcnow().isoformat(),
+        }
+        block['hash'] = block_hash(block)
+        offset = os.fstat(self._blocks_fd).st_size
+        line = json.dumps(block).encode('utf-8') + b'\n'
+        os.write(self._blocks_fd, line)
+        self._db.execute('BEGIN')
+        self._db.execute(
+            'INSERT INTO blocks (idx, start, "end", hash, offset) VALUES (?, ?, ?, ?, ?)',
+            (index, start, end, block['hash'], offset),
+        )
+        self._set_meta('blocks_indexed_until', offset + len(line))
+        self._db.execute('COMMIT')
+        return block
+
+    def seal(self, force=True):
+        """Запечатывает накопившиеся записи (без force — только подошедшие по размеру или времени)."""
+        with self._lock:
+            self._open()
+            lock_file(self._fd)
+            try:
+                self._catch_up()
+                sealed = self._seal_due(force=force)
+            finally:
+                unlock_file(self._fd)
+            if sealed:
+                self._fsync()
+        return sealed
+
+    def _block_offset(self, record_offset):
+        with self._lock:
+            row = self._db.execute(
+                'SELECT offset FROM blocks WHERE start <= ? AND "end" > ? ORDER BY idx DESC LIMIT 1',
+                (record_offset, record_offset),
+            ).fetchone()
+        return row[0] if row else None
+
+    def read_block(self, offset):
+        with open(self.blocks_path, 'rb') as f:
+            f.seek(offset)
+            return json.loads(f.readline())
+
+    def iter_blocks(self):
+        if not os.path.exists(self.blocks_path):
+            return
+        for _, line in _iter_lines(self.blocks_path, 0, os.path.getsize(self.blocks_path)):
+            yield json.loads(line)
+
+    def _tree(self, block):
+        """Уровни дерева блока и смещения его записей; последние деревья держатся в кэше."""
+        cached = self._trees.get(block['hash'])
+        if cached is None:
+            rows = list(_iter_lines(self.path, block['start'], block['end']))
+            cached = (build_levels([leaf_hash(line) for _, line in rows]), [offset for offset, _ in rows])
+            self._trees[block['hash']] = cached
+            if len(self._trees) > TREE_CACHE_SIZE:
+                self._trees.popitem(last=False)
+        else:
+            self._trees.move_to_end(block['hash'])
+        return cached
+
+    def proof(self, sha256_hash):
+        """
+        Доказательство включения первой записи с этим хэшем: запись, блок и соседние
+        хэши дерева. None — хэш не записан; {'sealed': False} — блок ещё не закрыт.
+        """
+        offsets = self.offsets(sha256_hash)
+        if not offsets:
+            return None
+        offset = offsets[0]
+        block_offset = self._block_offset(offset)
+        if block_offset is None and self.seal(force=False):
+            block_offset = self._block_offset(offset)
+        if block_offset is None:
+            return {'hash': sha256_hash, 'sealed': False}
+        block = self.read_block(block_offset)
+        with self._lock:
+            levels, leaf_offsets = self._tree(block)
+        position = leaf_offsets.index(offset)
+        with open(self.path, 'rb') as f:
+            f.seek(offset)
+            line = f.readline()[:-1]
+        return {
+            'hash': sha256_hash,
+            'sealed': True,
+            'record': line.decode('utf-8'),
+            'leaf_index': position,
+            'leaf_hash': levels[0][position].hex(),
+            'proof': inclusion_proof(levels, position),
+            'block': block,
+        }
+
+    # --- чтение ---
+
+    def offsets(self, sha256_hash):
+        with self._lock:
+            self._open()
+            rows = self._db.execute('SELECT offset FROM entries WHERE hash = ? ORDER BY offset', (sha256_hash,))
+            return [offset for offset, in rows]
+
+    def contains(self, sha256_hash):
+        with self._lock:
+            self._open()
+            return self._db.execute('SELECT 1 FROM entries WHERE hash = ? LIMIT 1', (sha256_hash,)).fetchone() is not None
+
+    def read_at(self, offset):
+        with open(self.path, 'rb') as f:
+            f.seek(offset)
+            return json.loads(f.readline())
+
+    def find(self, sha256_hash):
+        """Первая запись с этим хэшем или None."""
+        offsets = self.offsets(sha256_hash)
+        return self.read_at(offsets[0]) if offsets else None
+
+    def __iter__(self):
+        if not os.path.exists(self.path):
+            return
+        for _, line in _iter_lines(self.path, 0, os.path.getsize(self.path)):
+            yield json.loads(line)
+
+
+def verify_chain(ledger):
+    """
+    Проверяет блоки по одному, не загружая журнал целиком: хэш блока, связь с
+    предыдущим, непрерывность диапазонов и корень Меркла. Возвращает
+    (число проверенных блоков, ошибка или None).
+    """
+    prev_hash = GENESIS_HASH
+    expected_start = 0
+    checked = 0
+    for block in ledger.iter_blocks():
+        index = block.get('index')
+        if block_hash(block) != block.get('hash'):
+            return checked, f"блок {index}: хэш заголовка не совпадает"
+        if block['index'] != checked:
+            return checked, f"блок {index}: ожидался номер {checked}"
+        if block['prev_hash'] != prev_hash:
+            return checked, f"блок {index}: разорвана связь с предыдущим блоком"
+        if block['start'] != expected_start:
+            return checked, f"блок {index}: диапазон журнала начинается не с {expected_start}"
+        leaves = [leaf_hash(line) for _, line in _iter_lines(ledger.path, block['start'], block['end'])]
+        if len(leaves) != block['count'] or merkle_root(leaves) != block['merkle_root']:
+            return checked, f"блок {index}: записи журнала не совпадают с корнем Меркла"
+        prev_hash = block['hash']
+        expected_start = block['end']
+        checked += 1
+    return checked, None
+
+
+_ledger = None
+_ledger_pid = None
+_ledger_lock = threading.Lock()
+
+
+def get_ledger():
+    global _ledger, _ledger_pid
+    # блокировка flock принадлежит открытому файлу, поэтому после fork журнал открывается заново
+    if _ledger is None or _ledger_pid != os.getpid():
+        with _ledger_lock:
+            if _ledger is None or _ledger_pid != os.getpid():
+                config = get_config()
+                _ledger = Ledger(
+                    config['PATH'], config['INDEX_PATH'], config['BLOCKS_PATH'],
+                    config['FSYNC_EVERY'], config['FSYNC_INTERVAL_SECONDS'],
+                    config['BLOCK_SIZE'], config['BLOCK_INTERVAL_SECONDS'],
+                )
+                _ledger_pid = os.getpid()
+    return _ledger
+
+
+@atexit.register
+def _flush_ledger():
+    if _ledger is not None and _ledger_pid == os.getpid():
+        _ledger.flush()
+
+
 def save_to_blockchain(sha256_hash, user, title):
     record = {
         'timestamp': datetime.utcnow().isoformat(),
@@ -12,26 +479,9 @@ def save_to_blockchain(sha256_hash, user, title):
         'user': str(user),
         'title': title
     }
+    get_ledger().append(record)
+    return record
 
-    if not os.path.exists(BLOCKCHAIN_FILE):
-        with open(BLOCKCHAIN_FILE, 'w') as f:
-            json.dump([record], f, indent=4)
-    else:
-        with open(BLOCKCHAIN_FILE, 'r+') as f:
-            try:
-                data = json.load(f)
-            except json.JSONDecodeError:
-                data = []
-            data.append(record)
-            f.seek(0)
-            json.dump(data, f, indent=4)
 
 def is_hash_recorded(sha256_hash):
-    if not os.path.exists(BLOCKCHAIN_FILE):
-        return False
-    with open(BLOCKCHAIN_FILE, 'r') as f:
-        try:
-            data = json.load(f)
-            return any(entry['hash'] == sha256_hash for entry in data)
-        except json.JSONDecodeError:
-            return False
+    return get_ledger().contains(sha256_hash)
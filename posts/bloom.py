@@ -0,0 +1,227 @@
+"""
+Фильтр Блума по sha256_hash постов: хэш, которого точно нет, отсекается без
+запроса к БД. Фильтр строится при первом обращении и догружает новые посты
+по водяному знаку id, поэтому видит посты, созданные другими процессами.
+Удалённые посты из фильтра не убираются — их хэши просто проверяются в БД.
+"""
+import hashlib
+import math
+import threading
+
+import numpy as np
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db.models import Q
+
+from .metrics import VERIFY_LOOKUPS
+from .models import Post
+
+DEFAULTS = {
+    'BLOOM_ENABLED': True,
+    'BLOOM_CAPACITY': 1_000_000,
+    'BLOOM_ERROR_RATE': 0.001,
+    'MAX_HASHES': 10000,
+    'IN_CHUNK_SIZE': 500,
+}
+
+
+def get_config():
+    return {**DEFAULTS, **getattr(settings, 'HASH_VERIFICATION', {})}
+
+
+class BloomFilter:
+    """Битовый массив m бит и k позиций на элемент (двойное хэширование blake2b)."""
+
+    def __init__(self, capacity, error_rate=0.001):
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.size = max(int(-capacity * math.log(error_rate) / math.log(2) ** 2), 64)
+        self.hash_count = max(round(self.size / capacity * math.log(2)), 1)
+        self.bits = np.zeros((self.size + 7) // 8, dtype=np.uint8)
+        self.count = 0
+        self._steps = np.arange(self.hash_count, dtype=np.uint64)
+
+    def _positions(self, values):
+        digests = b''.join(hashlib.blake2b(v.encode('utf-8'), digest_size=16).digest() for v in values)
+        pairs = np.frombuffer(digests, dtype='<u8').reshape(-1, 2)
+        # переполнение uint64 здесь ожидаемо: берётся остаток по модулю 2**64
+        with np.errstate(over='ignore'):
+            positions = pairs[:, :1] + self._steps * pairs[:, 1:]
+        return positions % np.uint64(self.size)
+
+    def add_many(self, values):
+        if not values:
+            return
+        positions = self._positions(values).reshape(-1)
+        masks = np.left_shift(1, positions & np.uint64(7)).astype(np.uint8)
+        np.bitwise_or.at(self.bits, positions >> np.uint64(3), masks)
+        self.count += len(values)
+
+    def add(self, value):
+        self.add_many([value])
+
+    def contains_many(self, values):
+        """Массив bool: False — значения точно нет, True — возможно есть."""
+        if not values:
+            return np.zeros(0, dtype=bool)
+        positions = self._positions(values)
+        bits = (self.bits[positions >> np.uint64(3)] >> (positions & np.uint64(7)).astype(np.uint8)) & 1
+        return bits.all(axis=1)
+
+    def __contains__(self, value):
+        return bool(self.contains_many([value])[0])
+
+    @property
+    def nbytes(self):
+        return self.bits.nbytes
+
+
+class KnownHashFilter:
+    """Фильтр Блума по хэшам постов с догрузкой новых постов по id."""
+
+    def __init__(self, capacity=None, error_rate=None):
+        config = get_config()
+        self.capacity = capacity or config['BLOOM_CAPACITY']
+        self.error_rate = error_rate or config['BLOOM_ERROR_RATE']
+        self._lock = threading.Lock()
+        self.bloom = BloomFilter(self.capacity, self.error_rate)
+        self._last_id = 0
+        self._processing = set()
+
+    def _new_rows(self):
+        return (
+            Post.objects.filter(Q(id__gt=self._last_id) | Q(id__in=list(self._processing)))
+            .order_by('id')
+            .values_list('id', 'status', 'sha256_hash')
+        )
+
+    def sync(self):
+        """Догружает хэши постов, созданных после последней синхронизации."""
+        with self._lock:
+            self._apply(self._new_rows().iterator(chunk_size=10000))
+
+    async def async_sync(self):
+        """sync() для асинхронных представлений: новые строки читаются async ORM."""
+        # без aiterator(): у values_list он выполняет запрос прямо в цикле событий
+        rows = [row async for row in self._new_rows()]
+        if rows:
+            # _add может перестроить фильтр синхронными запросами
+            await sync_to_async(self._apply_locked)(rows)
+
+    def _apply_locked(self, rows):
+        with self._lock:
+            self._apply(rows)
+
+    def _apply(self, rows):
+        batch = []
+        for post_id, status, sha256_hash in rows:
+            if post_id <= self._last_id and post_id not in self._processing:
+                continue  # уже учтена параллельной синхронизацией
+            self._last_id = max(self._last_id, post_id)
+            if status == 'processing':
+                # хэш появится после фоновой обработки
+                self._processing.add(post_id)
+                continue
+            self._processing.discard(post_id)
+            if sha256_hash:
+                batch.append(sha256_hash)
+            if len(batch) >= 10000:
+                self._add(batch)
+                batch = []
+        self._add(batch)
+
+    def _add(self, values):
+        self.bloom.add_many(values)
+        if self.bloom.count > self.bloom.capacity:
+            # переполненный фильтр теряет точность: строим заново с удвоенной ёмкостью
+            capacity = self.capacity * 2
+            while capacity < self.bloom.count:
+                capacity *= 2
+            self._rebuild(capacity)
+
+    def _rebuild(self, capacity):
+        self.capacity = capacity
+        bloom = BloomFilter(capacity, self.error_rate)
+        rows = (
+            Post.objects.filter(id__lte=self._last_id).exclude(id__in=list(self._processing))
+            .exclude(sha256_hash='')
+            .values_list('sha256_hash', flat=True)
+            .iterator(chunk_size=10000)
+        )
+        batch = []
+        for sha256_hash in rows:
+            batch.append(sha256_hash)
+            if len(batch) >= 10000:
+                bloom.add_many(batch)
+                batch = []
+        bloom.add_many(batch)
+        self.bloom = bloom
+
+    def add(self, sha256_hash):
+        if sha256_hash:
+            with self._lock:
+                self._add([sha256_hash])
+
+    def might_contain(self, hashes):
+        with self._lock:
+            return self.bloom.contains_many(hashes)
+
+
+_filter = None
+_filter_lock = threading.Lock()
+
+
+def get_hash_filter():
+    global _filter
+    if _filter is None:
+        with _filter_lock:
+            if _filter is None:
+                known = KnownHashFilter()
+                known.sync()
+                _filter = known
+    return _filter
+
+
+async def async_get_hash_filter():
+    """get_hash_filter() и sync() из асинхронного кода: первое построение — в потоке."""
+    if _filter is None:
+        return await sync_to_async(get_hash_filter)()
+    await _filter.async_sync()
+    return _filter
+
+
+def remember_hash(sha256_hash):
+    """Добавляет хэш нового поста в уже построенный фильтр этого процесса."""
+    if _filter is not None:
+        _filter.add(sha256_hash)
+
+
+def verify_hashes(hashes):
+    """
+    Проверка списка хэшей: {hash: {title, user, created_at, document} или None},
+    document — имя файла документа или пустая строка. Промахи
+    фильтра Блума в БД не проверяются, остальные — одним IN-запросом на пачку.
+    """
+    config = get_config()
+    hashes = list(dict.fromkeys(hashes))
+    candidates = hashes
+    if config['BLOOM_ENABLED']:
+        known = get_hash_filter()
+        known.sync()
+        candidates = [h for h, maybe in zip(hashes, known.might_contain(hashes)) if maybe]
+        VERIFY_LOOKUPS.inc(len(hashes) - len(candidates), result='bloom_rejected')
+
+    found = {}
+    chunk_size = config['IN_CHUNK_SIZE']
+    for start in range(0, len(candidates), chunk_size):
+        rows = (
+            Post.objects.filter(sha256_hash__in=candidates[start:start + chunk_size])
+            .values_list('sha256_hash', 'title', 'user__username', 'created_at', 'document')
+        )
+        for sha256_hash, title, username, created_at, document in rows:
+            # как и PostVerifyView, отдаём самый свежий пост с этим хэшем
+            if sha256_hash not in found or created_at > found[sha256_hash]['created_at']:
+                found[sha256_hash] = {"title": title, "user": username, "created_at": created_at, "document": document}
+    VERIFY_LOOKUPS.inc(len(found), result='found')
+    VERIFY_LOOKUPS.inc(len(candidates) - len(found), result='not_found')
+    return {h: found.get(h) for h in hashes}
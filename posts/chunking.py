@@ -0,0 +1,150 @@
+"""
+Сравнение длинных документов по фрагментам. Модель обрезает вход до нескольких
+сотен токенов, поэтому текст режется на перекрывающиеся фрагменты по словам,
+каждый кодируется отдельно, а сходство считается фрагмент против фрагмента
+через отдельный индекс (id элемента = id поста * CHUNK_ID_BASE + номер фрагмента).
+"""
+import re
+import threading
+from collections import defaultdict
+
+import numpy as np
+from django.conf import settings
+
+from .embedding_codec import unpack_embeddings
+from .embedding_index import EmbeddingIndex, index_from_settings, warm_index
+from .embedding_service import encode_texts
+
+CHUNK_ID_BASE = 1024
+
+DEFAULTS = {
+    'ENABLED': True,
+    'CHUNK_WORDS': 200,
+    'OVERLAP_WORDS': 50,
+    'MAX_CHUNKS': 64,
+    'TOP_K': 5,
+    'AGGREGATION': 'max',  # 'max' или 'topk' (среднее AGGREGATION_K лучших пар фрагментов)
+    'AGGREGATION_K': 3,
+    'MAX_MATCHES': 10,
+}
+
+WORD_RE = re.compile(r'\S+')
+
+
+def get_config():
+    config = {**DEFAULTS, **getattr(settings, 'CHUNKING', {})}
+    config['MAX_CHUNKS'] = min(config['MAX_CHUNKS'], CHUNK_ID_BASE)
+    return config
+
+
+def chunk_item_id(post_id, chunk):
+    """id фрагмента в индексе; номер фрагмента не должен залезать в id следующего поста."""
+    if not 0 <= chunk < CHUNK_ID_BASE:
+        raise ValueError(f"Номер фрагмента {chunk} вне [0, {CHUNK_ID_BASE})")
+    return post_id * CHUNK_ID_BASE + chunk
+
+
+def split_into_chunks(text, chunk_words=200, overlap_words=50, max_chunks=64):
+    """
+    Перекрывающиеся фрагменты по словам: список (start, end) в символах текста,
+    не больше max_chunks и не больше CHUNK_ID_BASE.
+    """
+    max_chunks = min(max_chunks, CHUNK_ID_BASE)
+    spans = [match.span() for match in WORD_RE.finditer(text)]
+    if len(spans) <= chunk_words:
+        return []
+    step = max(chunk_words - overlap_words, 1)
+    chunks = []
+    for first in range(0, len(spans), step):
+        last = min(first + chunk_words, len(spans)) - 1
+        chunks.append((spans[first][0], spans[last][1]))
+        if last == len(spans) - 1 or len(chunks) >= max_chunks:
+            break
+    return chunks
+
+
+class ChunkIndex(EmbeddingIndex):
+    fields = ('chunk_vectors',)
+
+    def _row_items(self, post_id, chunk_vectors):
+        vectors = unpack_embeddings(chunk_vectors)
+        if vectors is None:
+            return []
+        return [(chunk_item_id(post_id, i), vector) for i, vector in enumerate(vectors)]
+
+    def post_ids(self, item_ids):
+        return item_ids // CHUNK_ID_BASE
+
+    def remove_post(self, post_id):
+        with self._lock:
+            for i in range(CHUNK_ID_BASE):
+                if not self.remove(chunk_item_id(post_id, i)):
+                    break
+
+
+_chunk_index = None
+_chunk_index_lock = threading.Lock()
+
+
+def get_chunk_index():
+    global _chunk_index
+    if _chunk_index is None:
+        with _chunk_index_lock:
+            if _chunk_index is None:
+                _chunk_index = warm_index(index_from_settings(ChunkIndex, 'CHUNK_INDEX_PATH'))
+    return _chunk_index
+
+
+def reset_chunk_index():
+    global _chunk_index
+    with _chunk_index_lock:
+        _chunk_index = None
+
+
+def embed_chunks(text):
+    """Фрагменты текста и их эмбеддинги одним батчем; (None, None) для коротких текстов."""
+    config = get_config()
+    if not config['ENABLED']:
+        return None, None
+    spans = split_into_chunks(text, config['CHUNK_WORDS'], config['OVERLAP_WORDS'], config['MAX_CHUNKS'])
+    if not spans:
+        return None, None
+    vectors = encode_texts([text[start:end] for start, end in spans])
+    return spans, vectors
+
+
+def chunk_similarity(vectors, exclude_post_id=None, index=None):
+    """
+    Сходство документа с уже загруженными по фрагментам. Возвращает
+    (similarity, matches), где matches — лучшие пары фрагментов вида
+    {'post_id', 'chunk', 'matched_chunk', 'similarity'}.
+    """
+    config = get_config()
+    if index is None:
+        index = get_chunk_index()
+        index.sync()
+
+    pairs = []
+    for chunk, vector in enumerate(vectors):
+        for score, item_id in index.search(vector, k=config['TOP_K']):
+            post_id, matched_chunk = divmod(item_id, CHUNK_ID_BASE)
+            if post_id != exclude_post_id:
+                pairs.append((score, post_id, chunk, matched_chunk))
+    if not pairs:
+        return 0.0, []
+
+    per_post = defaultdict(list)
+    for score, post_id, _, _ in pairs:
+        per_post[post_id].append(score)
+    if config['AGGREGATION'] == 'topk':
+        k = config['AGGREGATION_K']
+        similarity = max(float(np.mean(sorted(scores, reverse=True)[:k])) for scores in per_post.values())
+    else:
+        similarity = max(score for score, _, _, _ in pairs)
+
+    pairs.sort(reverse=True)
+    matches = [
+        {'post_id': post_id, 'chunk': chunk, 'matched_chunk': matched_chunk, 'similarity': round(score, 4)}
+        for score, post_id, chunk, matched_chunk in pairs[:config['MAX_MATCHES']]
+    ]
+    return similarity, matches
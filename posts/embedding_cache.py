@@ -0,0 +1,110 @@
+import sqlite3
+import threading
+from collections import OrderedDict
+
+from django.conf import settings
+
+from .embedding_codec import pack_embedding, unpack_embedding
+from .embedding_service import encode_text
+
+DEFAULTS = {
+    'MAX_ITEMS': 10000,
+    'DISK_PATH': None,
+}
+
+
+def get_config():
+    return {**DEFAULTS, **getattr(settings, 'EMBEDDING_CACHE', {})}
+
+
+class EmbeddingCache:
+    """
+    Кэш эмбеддингов по SHA-256 содержимого: LRU в памяти и необязательный
+    второй уровень в sqlite-файле, общий для всех воркеров.
+    """
+
+    def __init__(self, max_items=10000, disk_path=None):
+        self.max_items = max_items
+        self.disk_path = disk_path
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self._items)
+
+    def _connection(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.disk_path, timeout=5)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("CREATE TABLE IF NOT EXISTS embedding_cache (hash TEXT PRIMARY KEY, vector BLOB NOT NULL)")
+            self._local.conn = conn
+        return conn
+
+    def _remember(self, content_hash, vector):
+        with self._lock:
+            self._items[content_hash] = vector
+            self._items.move_to_end(content_hash)
+            while len(self._items) > self.max_items:
+                self._items.popitem(last=False)
+
+    def get(self, content_hash):
+        with self._lock:
+            vector = self._items.get(content_hash)
+            if vector is not None:
+                self._items.move_to_end(content_hash)
+                self.hits += 1
+                return vector
+        if self.disk_path:
+            row = self._connection().execute(
+                "SELECT vector FROM embedding_cache WHERE hash = ?", (content_hash,)
+            ).fetchone()
+            if row is not None:
+                vector = unpack_embedding(row[0])
+                self._remember(content_hash, vector)
+                self.disk_hits += 1
+                return vector
+        self.misses += 1
+        return None
+
+    def put(self, content_hash, vector):
+        self._remember(content_hash, vector)
+        if self.disk_path:
+            conn = self._connection()
+            with conn:
+                conn.execute(
+                    "INSERT OR REPLACE INTO embedding_cache (hash, vector) VALUES (?, ?)",
+                    (content_hash, pack_embedding(vector)),
+                )
+
+    def clear(self):
+        with self._lock:
+            self._items.clear()
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_cache():
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                config = get_config()
+                _cache = EmbeddingCache(config['MAX_ITEMS'], config['DISK_PATH'])
+    return _cache
+
+
+def cached_encode(content_hash, text):
+    """Эмбеддинг текста; повторная загрузка того же содержимого не запускает модель."""
+    cache = get_cache()
+    vector = cache.get(content_hash)
+    if vector is None:
+        vector = encode_text(text)
+        cache.put(content_hash, vector)
+    return vector
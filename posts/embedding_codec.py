@@ -0,0 +1,70 @@
+import json
+import struct
+
+import numpy as np
+from django.conf import settings
+
+# Заголовок бинарного эмбеддинга: сигнатура, код типа, резерв, размерность.
+# 8 байт — данные после заголовка остаются выровненными для np.frombuffer.
+HEADER = struct.Struct('<4sBxH')
+MAGIC = b'EMB1'
+
+DTYPES = {
+    1: np.dtype('<f4'),
+    2: np.dtype('<f2'),
+}
+DTYPE_CODES = {dtype: code for code, dtype in DTYPES.items()}
+
+
+def pack_embedding(vector, dtype=None):
+    dtype = np.dtype(dtype or getattr(settings, 'EMBEDDING_STORAGE_DTYPE', 'float32')).newbyteorder('<')
+    if dtype not in DTYPE_CODES:
+        raise ValueError(f"Неподдерживаемый тип эмбеддинга: {dtype}")
+    vector = np.ascontiguousarray(vector, dtype=dtype).reshape(-1)
+    return HEADER.pack(MAGIC, DTYPE_CODES[dtype], vector.shape[0]) + vector.tobytes()
+
+
+def unpack_embedding(value):
+    """
+    Читает эмбеддинг в любом из форматов: бинарный блоб (без копирования,
+    через np.frombuffer) или старый JSON-текст. Возвращает None для пустых значений.
+    """
+    if value is None:
+        return None
+    if isinstance(value, str):
+        if not value:
+            return None
+        return np.asarray(json.loads(value), dtype=np.float32)
+    if len(value) < HEADER.size:
+        raise ValueError("Слишком короткий бинарный эмбеддинг")
+    magic, code, dim = HEADER.unpack_from(value)
+    if magic != MAGIC or code not in DTYPES:
+        raise ValueError("Неизвестный формат бинарного эмбеддинга")
+    return np.frombuffer(value, dtype=DTYPES[code], count=dim, offset=HEADER.size)
+
+
+# Матрица эмбеддингов (например, по фрагментам документа): сигнатура, код типа, размерность, число строк
+MATRIX_HEADER = struct.Struct('<4sBxHI')
+MATRIX_MAGIC = b'EMM1'
+
+
+def pack_embeddings(matrix, dtype=None):
+    dtype = np.dtype(dtype or getattr(settings, 'EMBEDDING_STORAGE_DTYPE', 'float32')).newbyteorder('<')
+    if dtype not in DTYPE_CODES:
+        raise ValueError(f"Неподдерживаемый тип эмбеддинга: {dtype}")
+    matrix = np.ascontiguousarray(matrix, dtype=dtype)
+    rows, dim = matrix.shape
+    return MATRIX_HEADER.pack(MATRIX_MAGIC, DTYPE_CODES[dtype], dim, rows) + matrix.tobytes()
+
+
+def unpack_embeddings(value):
+    """Матрица (rows, dim) из бинарного блоба без копирования; None для пустых значений."""
+    if value is None:
+        return None
+    if len(value) < MATRIX_HEADER.size:
+        raise ValueError("Слишком короткая бинарная матрица эмбеддингов")
+    magic, code, dim, rows = MATRIX_HEADER.unpack_from(value)
+    if magic != MATRIX_MAGIC or code not in DTYPES:
+        raise ValueError("Неизвестный формат бинарной матрицы эмбеддингов")
+    vectors = np.frombuffer(value, dtype=DTYPES[code], count=rows * dim, offset=MATRIX_HEADER.size)
+    return vectors.reshape(rows, dim)
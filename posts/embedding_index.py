@@ -0,0 +1,255 @@
+import logging
+import os
+import threading
+import time
+
+import numpy as np
+from django.conf import settings
+from django.db.models import Q
+from django.utils.module_loading import import_string
+
+from .embedding_codec import unpack_embedding
+from .models import Post
+from .search_engines import ENGINES, load_snapshot
+
+logger = logging.getLogger(__name__)
+
+DUPLICATE_THRESHOLD = 0.9
+SUSPICIOUS_THRESHOLD = 0.6
+
+
+def classify_similarity(similarity):
+    if similarity > DUPLICATE_THRESHOLD:
+        return "duplicate"
+    elif similarity > SUSPICIOUS_THRESHOLD:
+        return "suspicious"
+    return "original"
+
+
+def get_engine_class(name):
+    if name in ENGINES:
+        return ENGINES[name]
+    return import_string(name)
+
+
+class EmbeddingIndex:
+    """
+    Процессный индекс эмбеддингов постов поверх движка поиска (см. search_engines).
+    Загружается один раз, догружает новые посты по водяному знаку id и
+    сохраняет снимок на диск, чтобы рестарт не требовал полной перестройки.
+
+    Сигнал post_delete чистит индекс только своего процесса, поэтому sync()
+    не чаще раза в prune_check_seconds сверяет число постов с id не больше
+    водяного знака с ожидаемым (прошлая сверка плюс догруженные с тех пор):
+    если постов меньше, их удалили в другом процессе, и индекс прореживается
+    через prune().
+    """
+
+    def __init__(self, engine='brute', options=None, path=None, prune_check_seconds=5.0):
+        self._lock = threading.RLock()
+        self.engine_class = get_engine_class(engine)
+        self.options = options or {}
+        self.path = path
+        self.prune_check_seconds = prune_check_seconds
+        self.engine = None
+        self._last_id = 0
+        self._processing = set()
+        # число постов с id <= водяного знака при последней сверке и догруженных после неё
+        self._row_count = None
+        self._new_rows = 0
+        self._checked_at = None
+
+    def __len__(self):
+        return len(self.engine) if self.engine is not None else 0
+
+    @property
+    def last_id(self):
+        return self._last_id
+
+    def _ensure_engine(self, dim):
+        if self.engine is None:
+            self.engine = self.engine_class(dim, **self.options)
+
+    def add(self, post_id, vector):
+        vector = np.asarray(vector, dtype=np.float32).reshape(-1)
+        with self._lock:
+            self._ensure_engine(vector.shape[0])
+            if vector.shape[0] != self.engine.dim:
+                raise ValueError(f"Ожидалась размерность {self.engine.dim}, получено {vector.shape[0]}")
+            self.engine.add(post_id, vector)
+
+    def remove(self, post_id):
+        with self._lock:
+            return self.engine is not None and self.engine.remove(post_id)
+
+    def search(self, vector, k=1):
+        with self._lock:
+            if not len(self):
+                return []
+            return self.engine.search(np.asarray(vector, dtype=np.float32).reshape(-1), k)
+
+    def max_similarity(self, vector):
+        """Возвращает (similarity, post_id) ближайшего поста или (0.0, None)."""
+        results = self.search(vector, k=1)
+        if not results:
+            return 0.0, None
+        return results[0]
+
+    # поля поста, из которых берутся векторы индекса
+    fields = ('embedding_vector', 'embedding')
+
+    def _row_items(self, post_id, vector, legacy):
+        """Пары (item_id, vector) одной строки БД; в этом индексе item_id — id поста."""
+        # бинарный формат в приоритете, JSON читается только у ещё не сконвертированных строк
+        vector = unpack_embedding(vector if vector is not None else legacy)
+        return [(post_id, vector)] if vector is not None else []
+
+    def post_ids(self, item_ids):
+        return item_ids
+
+    def _decode_rows(self, rows):
+        for post_id, status, *values in rows:
+            if post_id > self._last_id:
+                self._new_rows += 1
+                self._last_id = post_id
+            if status == 'processing':
+                # эмбеддинг появится позже в фоновом воркере (см. ingestion_queue)
+                self._processing.add(post_id)
+                continue
+            self._processing.discard(post_id)
+            try:
+                yield from self._row_items(post_id, *values)
+            except (TypeError, ValueError):
+                continue
+
+    def _pending_rows(self):
+        return (
+            Post.objects.filter(Q(id__gt=self._last_id) | Q(id__in=list(self._processing)))
+            .order_by('id')
+            .values_list('id', 'status', *self.fields)
+            .iterator(chunk_size=2000)
+        )
+
+    def sync(self):
+        """
+        Догружает посты, созданные после последней синхронизации (в том числе
+        другими процессами), и убирает удалённые другими процессами.
+        """
+        added = 0
+        with self._lock:
+            self._prune_if_deleted()
+            for item_id, vector in self._decode_rows(self._pending_rows()):
+                self.add(item_id, vector)
+                added += 1
+        return added
+
+    def _prune_if_deleted(self):
+        now = time.monotonic()
+        if self._checked_at is not None and now - self._checked_at < self.prune_check_seconds:
+            return 0
+        self._checked_at = now
+        total = Post.objects.filter(id__lte=self._last_id).count()
+        pruned = 0
+        if self._row_count is not None and total < self._row_count + self._new_rows:
+            pruned = self.prune()
+        self._row_count, self._new_rows = total, 0
+        return pruned
+
+    def rebuild(self):
+        with self._lock:
+            self.engine = None
+            self._last_id = 0
+            self._processing = set()
+            self._row_count = None
+            ids, vectors = [], []
+            for item_id, vector in self._decode_rows(self._pending_rows()):
+                if not vectors or vector.shape == vectors[0].shape:
+                    ids.append(item_id)
+                    vectors.append(vector)
+            if vectors:
+                self._ensure_engine(vectors[0].shape[0])
+                self.engine.build(np.asarray(ids, dtype=np.int64), np.stack(vectors))
+            return len(ids)
+
+    def prune(self):
+        """Убирает из индекса посты, удалённые после сохранения снимка."""
+        with self._lock:
+            if self.engine is None:
+                return 0
+            alive = np.fromiter(Post.objects.values_list('id', flat=True).iterator(), dtype=np.int64)
+            self._processing.intersection_update(alive.tolist())
+            item_ids = self.engine.item_ids()
+            stale = item_ids[~np.isin(self.post_ids(item_ids), alive)]
+            for item_id in stale.tolist():
+                self.engine.remove(item_id)
+            return len(stale)
+
+    def save(self):
+        if not self.path:
+            return False
+        with self._lock:
+            if self.engine is None:
+                return False
+            self.engine.save(self.path, last_id=self._last_id, processing=sorted(self._processing))
+        return True
+
+    def load(self):
+        if not self.path or not os.path.exists(self.path):
+            return False
+        try:
+            meta, arrays = load_snapshot(self.path)
+        except (OSError, ValueError, KeyError) as exc:
+            logger.warning("Не удалось прочитать снимок индекса %s: %s", self.path, exc)
+            return False
+        with self._lock:
+            if meta.get('engine') == self.engine_class.name:
+                self.engine = self.engine_class.from_state(meta, arrays, **self.options)
+            else:
+                # движок сменили в настройках: переиспользуем векторы из снимка без разбора БД
+                self.engine = self.engine_class(meta['dim'], **self.options)
+                self.engine.build(arrays['ids'], arrays['vectors'])
+            self._last_id = meta.get('last_id', 0)
+            self._processing = set(meta.get('processing', []))
+            self._row_count = None
+        return True
+
+
+def index_from_settings(index_class=EmbeddingIndex, path_setting='INDEX_PATH'):
+    config = getattr(settings, 'SIMILARITY_SEARCH', {})
+    return index_class(
+        engine=config.get('ENGINE', 'brute'),
+        options=config.get('OPTIONS', {}),
+        path=config.get(path_setting),
+        prune_check_seconds=config.get('PRUNE_CHECK_SECONDS', 5.0),
+    )
+
+
+def warm_index(index):
+    config = getattr(settings, 'SIMILARITY_SEARCH', {})
+    if index.load():
+        index.prune()
+        if index.sync() >= config.get('RESAVE_AFTER', 1000):
+            index.save()
+    else:
+        index.rebuild()
+        index.save()
+    return index
+
+
+_index = None
+_index_lock = threading.Lock()
+
+
+def get_index():
+    global _index
+    if _index is None:
+        with _index_lock:
+            if _index is None:
+                _index = warm_index(index_from_settings())
+    return _index
+
+
+def reset_index():
+    global _index
+    with _index_lock:
+        _index = None
@@ -0,0 +1,127 @@
+import logging
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+import numpy as np
+from django.conf import settings
+
+from .model_registry import get_model
+
+logger = logging.getLogger(__name__)
+
+DEFAULTS = {
+    'ENABLED': True,
+    'MAX_BATCH_SIZE': 32,
+    'MAX_WAIT_MS': 5,
+}
+
+
+def get_config():
+    return {**DEFAULTS, **getattr(settings, 'EMBEDDING_BATCHING', {})}
+
+
+def encode_texts(texts):
+    """Кодирует список текстов одним батчем, возвращает float32-матрицу (len(texts), dim)."""
+    texts = list(texts)
+    vectors = get_model().encode(texts, convert_to_numpy=True, batch_size=max(len(texts), 1))
+    return np.asarray(vectors, dtype=np.float32)
+
+
+class EmbeddingBatcher:
+    """
+    Собирает тексты из параллельных запросов в батч (до max_batch_size штук
+    или max_wait_ms миллисекунд с первого текста) и кодирует их одним вызовом
+    модели в отдельном потоке. Каждый вызывающий получает свой Future.
+    """
+
+    def __init__(self, encode_batch=encode_texts, max_batch_size=32, max_wait_ms=5):
+        self.encode_batch = encode_batch
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._thread = None
+        self._pid = None
+        self.batches = 0
+        self.items = 0
+
+    def _ensure_thread(self):
+        # потоки не переживают fork (gunicorn --preload), поэтому следим за pid
+        if self._thread is not None and self._pid == os.getpid() and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._thread is None or self._pid != os.getpid() or not self._thread.is_alive():
+                if self._pid != os.getpid():
+                    self._queue = queue.Queue()
+                self._pid = os.getpid()
+                self._thread = threading.Thread(target=self._run, name='embedding-batcher', daemon=True)
+                self._thread.start()
+
+    def submit(self, text):
+        future = Future()
+        self._ensure_thread()
+        self._queue.put((text, future))
+        return future
+
+    def encode(self, text, timeout=None):
+        return self.submit(text).result(timeout)
+
+    def _collect(self):
+        batch = [self._queue.get()]
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect()
+            pending = [(text, future) for text, future in batch if future.set_running_or_notify_cancel()]
+            if not pending:
+                continue
+            texts = [text for text, _ in pending]
+            futures = [future for _, future in pending]
+            try:
+                vectors = self.encode_batch(texts)
+            except Exception as exc:
+                logger.exception("Ошибка батчевого кодирования %d текстов", len(texts))
+                for future in futures:
+                    future.set_exception(exc)
+                continue
+            self.batches += 1
+            self.items += len(texts)
+            for future, vector in zip(futures, vectors):
+                future.set_result(vector)
+
+
+_batcher = None
+_batcher_lock = threading.Lock()
+
+
+def get_batcher():
+    global _batcher
+    if _batcher is None:
+        with _batcher_lock:
+            if _batcher is None:
+                config = get_config()
+                _batcher = EmbeddingBatcher(
+                    max_batch_size=config['MAX_BATCH_SIZE'],
+                    max_wait_ms=config['MAX_WAIT_MS'],
+                )
+    return _batcher
+
+
+def encode_text(text):
+    """Эмбеддинг одного текста (float32-вектор); через батчер, если он включён."""
+    if get_config()['ENABLED']:
+        return get_batcher().encode(text)
+    return encode_texts([text])[0]
@@ -0,0 +1,96 @@
+"""
+Отдача неизменяемых файлов с ETag: If-None-Match отвечает 304 без тела,
+Range: bytes=... — 206 с запрошенным куском (поддерживается один диапазон,
+несколько диапазонов отдаются целым файлом).
+"""
+import os
+import re
+
+from django.http import FileResponse, HttpResponse, HttpResponseNotModified, StreamingHttpResponse
+from django.utils.http import parse_etags, quote_etag
+
+RANGE_RE = re.compile(r'^bytes=(\d*)-(\d*)$')
+READ_CHUNK_SIZE = 64 * 1024
+
+
+class RangeNotSatisfiable(Exception):
+    pass
+
+
+def _weak(etag):
+    return etag[2:] if etag.startswith('W/') else etag
+
+
+def etag_matches(header, etag):
+    """Слабое сравнение, как требует If-None-Match."""
+    if not header:
+        return False
+    if header.strip() == '*':
+        return True
+    return _weak(etag) in {_weak(tag) for tag in parse_etags(header)}
+
+
+def parse_range(header, size):
+    """(start, end) включительно, None — отдать файл целиком; RangeNotSatisfiable — 416."""
+    match = RANGE_RE.match(header.replace(' ', ''))
+    if not match or match.groups() == ('', ''):
+        return None
+    first, last = match.groups()
+    if not first:
+        # bytes=-N: последние N байт
+        length = int(last)
+        if not length:
+            raise RangeNotSatisfiable
+        return max(size - length, 0), size - 1
+    start = int(first)
+    end = min(int(last), size - 1) if last else size - 1
+    if start >= size or start > end:
+        raise RangeNotSatisfiable
+    return start, end
+
+
+def _read_range(path, start, length):
+    with open(path, 'rb') as f:
+        f.seek(start)
+        while length > 0:
+            chunk = f.read(min(READ_CHUNK_SIZE, length))
+            if not chunk:
+                break
+            length -= len(chunk)
+            yield chunk
+
+
+def serve_file(request, path, content_type, etag, filename=None):
+    """Ответ на GET файла path, содержимое которого однозначно задаётся etag."""
+    etag = quote_etag(etag)
+    meta = request.META
+
+    if etag_matches(meta.get('HTTP_IF_NONE_MATCH'), etag):
+        response = HttpResponseNotModified()
+    else:
+        size = os.path.getsize(path)
+        byte_range = None
+        range_header = meta.get('HTTP_RANGE')
+        # If-Range с другим ETag: файл сменился, отдаём целиком
+        if range_header and meta.get('HTTP_IF_RANGE', etag) == etag:
+            try:
+                byte_range = parse_range(range_header, size)
+            except RangeNotSatisfiable:
+                response = HttpResponse(status=416)
+                response['Content-Range'] = f'bytes */{size}'
+                return response
+
+        if byte_range is None:
+            response = FileResponse(open(path, 'rb'), content_type=content_type, filename=filename or '')
+        else:
+            start, end = byte_range
+            response = StreamingHttpResponse(
+                _read_range(path, start, end - start + 1), status=206, content_type=content_type)
+            response['Content-Length'] = str(end - start + 1)
+            response['Content-Range'] = f'bytes {start}-{end}/{size}'
+        response['Accept-Ranges'] = 'bytes'
+
+    response['ETag'] = etag
+    # кэш может хранить ответ, но должен перепроверять его по ETag
+    response['Cache-Control'] = 'private, no-cache'
+    return response
@@ -0,0 +1,263 @@
+"""
+Перцептивные хэши изображений (pHash/dHash, 64 бита) и мультииндексная
+хэш-таблица для поиска по расстоянию Хэмминга. Пережатая или уменьшенная
+копия картинки даёт хэш на малом расстоянии от оригинала, в отличие от
+SHA-256 байтов файла.
+"""
+import threading
+import time
+from collections import defaultdict
+from itertools import combinations
+
+import numpy as np
+from django.conf import settings
+from django.db.models import Q
+from PIL import Image
+
+from .models import Post
+
+DEFAULTS = {
+    'ALGORITHM': 'phash',
+    'DUPLICATE_DISTANCE': 4,
+    'SUSPICIOUS_DISTANCE': 10,
+    'PRUNE_CHECK_SECONDS': 5.0,
+}
+
+HASH_BITS = 64
+
+
+def get_config():
+    return {**DEFAULTS, **getattr(settings, 'IMAGE_HASH', {})}
+
+
+def _dct_matrix(n):
+    k = np.arange(n)[:, None]
+    i = np.arange(n)[None, :]
+    matrix = np.cos(np.pi * (2 * i + 1) * k / (2 * n)) * np.sqrt(2 / n)
+    matrix[0] /= np.sqrt(2)
+    return matrix
+
+
+DCT_32 = _dct_matrix(32)
+
+
+def _grayscale(image, size):
+    image = image.convert('L').resize(size, Image.Resampling.LANCZOS)
+    return np.asarray(image, dtype=np.float64)
+
+
+def _bits_to_int(bits):
+    return int(np.packbits(bits.astype(np.uint8).reshape(-1)).view('>u8')[0])
+
+
+def phash(image):
+    """DCT-хэш: знак низкочастотных коэффициентов 8x8 относительно их медианы."""
+    pixels = _grayscale(image, (32, 32))
+    low = (DCT_32 @ pixels @ DCT_32.T)[:8, :8]
+    median = np.median(low.reshape(-1)[1:])  # без DC-коэффициента
+    return _bits_to_int(low > median)
+
+
+def dhash(image):
+    """Градиентный хэш: сравнение соседних пикселей по горизонтали."""
+    pixels = _grayscale(image, (9, 8))
+    return _bits_to_int(pixels[:, 1:] > pixels[:, :-1])
+
+
+ALGORITHMS = {'phash': phash, 'dhash': dhash}
+
+
+def image_hash(file_obj):
+    with Image.open(file_obj) as image:
+        # JPEG декодируется сразу в уменьшенном масштабе: пиксели полного размера не нужны
+        image.draft('L', (256, 256))
+        return ALGORITHMS[get_config()['ALGORITHM']](image)
+
+
+def hamming(first, second):
+    return (first ^ second).bit_count()
+
+
+def to_hex(value):
+    return f'{value:016x}'
+
+
+def from_hex(value):
+    return int(value, 16)
+
+
+def classify_distance(distance):
+    config = get_config()
+    if distance is None:
+        return "original"
+    if distance <= config['DUPLICATE_DISTANCE']:
+        return "duplicate"
+    elif distance <= config['SUSPICIOUS_DISTANCE']:
+        return "suspicious"
+    return "original"
+
+
+class MultiIndexHash:
+    """
+    Мультииндексное хэширование по расстоянию Хэмминга: 64-битный хэш делится
+    на blocks частей, для каждой своя хэш-таблица. Если полное расстояние не
+    больше radius, хотя бы одна часть отличается не больше чем на radius // blocks
+    бит, поэтому достаточно перебрать такие варианты каждой части и проверить
+    найденных кандидатов.
+    """
+
+    def __init__(self, blocks=4):
+        self.blocks = blocks
+        self.width = HASH_BITS // blocks
+        self.tables = [defaultdict(list) for _ in range(blocks)]
+        self.values = {}
+        self._masks = {}
+
+    def __len__(self):
+        return len(self.values)
+
+    def _keys(self, value):
+        mask = (1 << self.width) - 1
+        return [(value >> (i * self.width)) & mask for i in range(self.blocks)]
+
+    def _probe_masks(self, radius):
+        if radius not in self._masks:
+            self._masks[radius] = [
+                sum(1 << bit for bit in bits)
+                for r in range(radius + 1)
+                for bits in combinations(range(self.width), r)
+            ]
+        return self._masks[radius]
+
+    def add(self, value, item_id):
+        if item_id in self.values:
+            self.remove(item_id)
+        self.values[item_id] = value
+        for table, key in zip(self.tables, self._keys(value)):
+            table[key].append(item_id)
+
+    def remove(self, item_id):
+        value = self.values.pop(item_id, None)
+        if value is None:
+            return False
+        for table, key in zip(self.tables, self._keys(value)):
+            bucket = table[key]
+            bucket.remove(item_id)
+            if not bucket:
+                del table[key]
+        return True
+
+    def search(self, value, radius):
+        """Все (distance, item_id) не дальше radius, по возрастанию расстояния."""
+        masks = self._probe_masks(radius // self.blocks)
+        candidates = set()
+        for table, key in zip(self.tables, self._keys(value)):
+            for mask in masks:
+                bucket = table.get(key ^ mask)
+                if bucket:
+                    candidates.update(bucket)
+        found = []
+        for item_id in candidates:
+            distance = hamming(value, self.values[item_id])
+            if distance <= radius:
+                found.append((distance, item_id))
+        return sorted(found)
+
+
+class ImageHashIndex:
+    """
+    Процессный индекс перцептивных хэшей постов с догрузкой новых по водяному знаку id.
+    Удалённые другими процессами посты убираются так же, как в EmbeddingIndex:
+    sync() сверяет число постов-изображений с id не больше водяного знака.
+    """
+
+    def __init__(self, prune_check_seconds=5.0):
+        self._lock = threading.RLock()
+        self.table = MultiIndexHash()
+        self.prune_check_seconds = prune_check_seconds
+        self._last_id = 0
+        self._processing = set()
+        # число постов с id <= водяного знака при последней сверке и догруженных после неё
+        self._row_count = None
+        self._new_rows = 0
+        self._checked_at = None
+
+    def __len__(self):
+        return len(self.table)
+
+    def add(self, post_id, value):
+        with self._lock:
+            self.table.add(value, post_id)
+
+    def remove(self, post_id):
+        with self._lock:
+            self.table.remove(post_id)
+
+    def _rows(self):
+        return Post.objects.filter(type='image')
+
+    def sync(self):
+        added = 0
+        with self._lock:
+            self._prune_if_deleted()
+            rows = (
+                self._rows().filter(Q(id__gt=self._last_id) | Q(id__in=list(self._processing)))
+                .order_by('id')
+                .values_list('id', 'status', 'image_hash')
+                .iterator(chunk_size=5000)
+            )
+            for post_id, status, value in rows:
+                if post_id > self._last_id:
+                    self._new_rows += 1
+                    self._last_id = post_id
+                if status == 'processing':
+                    self._processing.add(post_id)
+                    continue
+                self._processing.discard(post_id)
+                if value:
+                    self.table.add(from_hex(value), post_id)
+                    added += 1
+        return added
+
+    def _prune_if_deleted(self):
+        now = time.monotonic()
+        if self._checked_at is not None and now - self._checked_at < self.prune_check_seconds:
+            return 0
+        self._checked_at = now
+        total = self._rows().filter(id__lte=self._last_id).count()
+        pruned = 0
+        if self._row_count is not None and total < self._row_count + self._new_rows:
+            pruned = self.prune()
+        self._row_count, self._new_rows = total, 0
+        return pruned
+
+    def prune(self):
+        """Убирает из индекса посты, которых больше нет в БД."""
+        with self._lock:
+            alive = set(self._rows().values_list('id', flat=True).iterator())
+            self._processing.intersection_update(alive)
+            stale = [post_id for post_id in self.table.values if post_id not in alive]
+            for post_id in stale:
+                self.table.remove(post_id)
+            return len(stale)
+
+    def nearest(self, value, radius):
+        """(distance, post_id) ближайшего поста в пределах radius или (None, None)."""
+        with self._lock:
+            found = self.table.search(value, radius)
+        return found[0] if found else (None, None)
+
+
+_index = None
+_index_lock = threading.Lock()
+
+
+def get_image_index():
+    global _index
+    if _index is None:
+        with _index_lock:
+            if _index is None:
+                index = ImageHashIndex(prune_check_seconds=get_config()['PRUNE_CHECK_SECONDS'])
+                index.sync()
+                _index = index
+    return _index
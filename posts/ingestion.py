@@ -0,0 +1,241 @@
+"""
+Этапы обработки поста: извлечение текста, хэш и эмбеддинг, поиск похожих,
+запись в индекс и "блокчейн". Используются и синхронным PostCreateView, и
+фоновыми воркерами (см. ingestion_queue).
+"""
+import logging
+
+import numpy as np
+from PIL import Image
+
+from .blockchain_utils import save_to_blockchain
+from .bloom import remember_hash
+from .chunking import chunk_item_id, chunk_similarity, embed_chunks, get_chunk_index
+from .embedding_cache import cached_encode, get_cache
+from .embedding_codec import pack_embedding, pack_embeddings, unpack_embedding, unpack_embeddings
+from .embedding_index import get_index, classify_similarity
+from .image_hash import (
+    HASH_BITS, classify_distance, from_hex, get_config as get_image_hash_config, get_image_index,
+    image_hash, to_hex,
+)
+from .minhash import (
+    find_candidates, get_config as get_lsh_config, index_signature, is_near_duplicate, minhash_signature,
+    pack_signature, record_check, unpack_signature,
+)
+from .metrics import stage
+from .models import Post
+from .pdf_utils import ensure_report, get_config as get_reports_config, report_context
+from .search_engines import normalize
+from .uploads import file_sha256, text_sha256
+from .utils import extract_text_and_hash, extract_text_from_file
+
+logger = logging.getLogger(__name__)
+
+
+def read_post_content(post_type, data, files):
+    """
+    Содержимое поста из запроса и его SHA-256: текст (str) или сам загруженный
+    файл изображения, который не читается в память целиком.
+    """
+    if post_type == 'document':
+        file = files['document']
+        return extract_text_and_hash(file, file.name)
+    elif post_type == 'text':
+        content = data.get('content', '')
+        return content, text_sha256(content)
+    elif post_type == 'image':
+        file = files['image']
+        return file, file_sha256(file)
+    return "", text_sha256("")
+
+
+def _stored_embedding(vector, legacy):
+    stored = vector if vector is not None else legacy
+    return unpack_embedding(stored) if stored else None
+
+
+def _vector_similarity(new_embedding, candidates):
+    """Максимальное косинусное сходство: по всему индексу или только по LSH-кандидатам."""
+    if candidates and get_lsh_config()['NARROW_VECTOR_SEARCH']:
+        rows = Post.objects.filter(id__in=[post_id for _, post_id in candidates])
+        vectors = [_stored_embedding(*row) for row in rows.values_list('embedding_vector', 'embedding')]
+        vectors = [v for v in vectors if v is not None]
+        if vectors:
+            return float(np.max(normalize(np.stack(vectors)) @ normalize(new_embedding)))
+    index = get_index()
+    index.sync()
+    max_sim, _ = index.max_similarity(new_embedding)
+    return max_sim
+
+
+def analyze_content(post_type, text_data, exclude_pk=None, sha256_hash=None):
+    """
+    Считает эмбеддинг и статус; возвращает словарь полей поста и вектор.
+    text_data — текст или файл изображения; sha256_hash считается, если не передан.
+    """
+    if sha256_hash is None:
+        sha256_hash = text_sha256(text_data) if isinstance(text_data, str) else file_sha256(text_data)
+
+    new_embedding = None
+    similarity = 0.0
+    status = "original"
+    chunk_spans = chunk_vectors = chunk_matches = None
+    signature = None
+    perceptual_hash = None
+
+    existing = Post.objects.filter(sha256_hash=sha256_hash)
+    if exclude_pk is not None:
+        existing = existing.exclude(pk=exclude_pk)
+    with stage('lookup'):
+        existing = existing.values_list(
+            'embedding_vector', 'embedding', 'chunk_vectors', 'chunk_spans', 'minhash', 'image_hash'
+        ).first()
+
+    if existing is not None:
+        # точная копия уже загруженного содержимого: модель и поиск не нужны
+        status = "duplicate"
+        similarity = 1.0
+        new_embedding = _stored_embedding(existing[0], existing[1])
+        if new_embedding is not None:
+            get_cache().put(sha256_hash, new_embedding)
+        if existing[2] is not None:
+            chunk_vectors, chunk_spans = unpack_embeddings(existing[2]), existing[3]
+        signature = unpack_signature(existing[4])
+        perceptual_hash = existing[5]
+    elif post_type == 'image':
+        try:
+            text_data.seek(0)
+            with stage('image_hash'):
+                value = image_hash(text_data)
+        except (OSError, ValueError, Image.DecompressionBombError):
+            value = None
+        if value is not None:
+            perceptual_hash = to_hex(value)
+            with stage('similarity'):
+                image_index = get_image_index()
+                image_index.sync()
+                distance, _ = image_index.nearest(value, get_image_hash_config()['SUSPICIOUS_DISTANCE'])
+            if distance is not None:
+                similarity = round(1 - distance / HASH_BITS, 4)
+            status = classify_distance(distance)
+    elif post_type in ['text', 'document'] and text_data.strip():
+        lsh_config = get_lsh_config()
+        candidates = []
+        if lsh_config['ENABLED']:
+            with stage('similarity'):
+                signature = minhash_signature(text_data)
+                if signature is not None:
+                    candidates = find_candidates(signature, exclude_pk=exclude_pk)
+
+        if candidates and is_near_duplicate(candidates[0][0], lsh_config['DUPLICATE_JACCARD']):
+            # почти дословная копия: классифицируем по Жаккару и берём эмбеддинг оригинала
+            jaccard, source_id = candidates[0]
+            status = "duplicate"
+            similarity = round(jaccard, 4)
+            source = Post.objects.filter(pk=source_id).values_list('embedding_vector', 'embedding').first()
+            if source is not None:
+                new_embedding = _stored_embedding(*source)
+            record_check(skipped_inference=True)
+        else:
+            if lsh_config['ENABLED']:
+                record_check(skipped_inference=False)
+            with stage('encode'):
+                new_embedding = cached_encode(sha256_hash, text_data)
+            with stage('similarity'):
+                max_sim = _vector_similarity(new_embedding, candidates)
+
+            # длинный текст дополнительно сравнивается по фрагментам: модель видит только его начало
+            with stage('encode'):
+                chunk_spans, chunk_vectors = embed_chunks(text_data)
+            if chunk_vectors is not None:
+                with stage('similarity'):
+                    chunk_sim, chunk_matches = chunk_similarity(chunk_vectors, exclude_post_id=exclude_pk)
+                max_sim = max(max_sim, chunk_sim)
+
+            similarity = round(max(max_sim, 0.0), 4)
+            status = classify_similarity(similarity)
+
+    return {
+        'fields': {
+            'content': text_data if isinstance(text_data, str) else '',
+            'sha256_hash': sha256_hash,
+            'status': status,
+            'similarity_score': similarity,
+            'embedding_vector': pack_embedding(new_embedding) if new_embedding is not None else None,
+            'chunk_vectors': pack_embeddings(chunk_vectors) if chunk_vectors is not None else None,
+            'chunk_spans': [list(span) for span in chunk_spans] if chunk_spans is not None else None,
+            'chunk_matches': chunk_matches,
+            'minhash': pack_signature(signature) if signature is not None else None,
+            'image_hash': perceptual_hash,
+        },
+        'vector': new_embedding,
+        'chunk_vectors': chunk_vectors,
+    }
+
+
+def finalize_post(post, vector, chunk_vectors=None):
+    with stage('index'):
+        if vector is not None:
+            get_index().add(post.id, vector)
+        if chunk_vectors is not None:
+            chunk_index = get_chunk_index()
+            for i, chunk_vector in enumerate(chunk_vectors):
+                chunk_index.add(chunk_item_id(post.id, i), chunk_vector)
+        if post.minhash is not None:
+            index_signature(post.id, unpack_signature(post.minhash))
+        if post.image_hash:
+            get_image_index().add(post.id, from_hex(post.image_hash))
+        remember_hash(post.sha256_hash)
+    with stage('ledger'):
+        save_to_blockchain(post.sha256_hash, post.user.username, post.title)
+
+
+# Этапы фоновой обработки: каждый идемпотентен и повторяется отдельно при сбое
+
+def stage_extract(post):
+    if post.type == 'document' and post.document:
+        with post.document.open('rb') as f, stage('extract'):
+            post.content = extract_text_from_file(f, post.document.name)
+        with stage('save'):
+            post.save(update_fields=['content'])
+
+
+def stage_analyze(post):
+    if post.type == 'image':
+        with post.image.open('rb') as f:
+            result = analyze_content(post.type, f, exclude_pk=post.pk)
+    else:
+        result = analyze_content(post.type, post.content, exclude_pk=post.pk)
+    fields = result['fields']
+    if post.type == 'document':
+        # текст уже сохранён на этапе extract
+        fields.pop('content')
+    for name, value in fields.items():
+        setattr(post, name, value)
+    with stage('save'):
+        post.save(update_fields=list(fields))
+
+
+def stage_record(post):
+    vector = unpack_embedding(post.embedding_vector) if post.embedding_vector is not None else None
+    chunk_vectors = unpack_embeddings(post.chunk_vectors) if post.chunk_vectors is not None else None
+    finalize_post(post, vector, chunk_vectors)
+
+
+def stage_report(post):
+    if not get_reports_config()['PREGENERATE']:
+        return
+    try:
+        with stage('report'):
+            ensure_report(report_context(post))
+    except Exception:
+        # отчёт необязателен: при сбое он сгенерируется при первом запросе
+        logger.exception("Не удалось заранее сгенерировать отчёт поста %s", post.pk)
+
+
+STAGES = [
+    ('extract', stage_extract),
+    ('analyze', stage_analyze),
+    ('record', stage_record),
+    ('report', stage_report),
+]
@@ -0,0 +1,196 @@
+"""
+Очередь фоновой обработки постов на таблице IngestionJob, без внешнего брокера.
+Воркеры — потоки в процессе веб-сервера или отдельный процесс
+(python manage.py run_ingestion_worker). Задачи захватываются атомарным
+UPDATE, поэтому несколько процессов могут разбирать одну очередь.
+
+С START_LOCAL_WORKERS пул потоков запускается в каждом процессе веб-сервера
+с первым запросом (PostsConfig.ready), так что задачи, оставшиеся в очереди
+после перезапуска, и задачи с истёкшей арендой разбираются без новых
+загрузок. Без START_LOCAL_WORKERS нужен run_ingestion_worker.
+"""
+import logging
+import os
+import threading
+import traceback
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from .ingestion import STAGES
+from .metrics import track_stages
+from .models import IngestionJob, Post
+from .utils import ExtractionError
+
+logger = logging.getLogger(__name__)
+
+DEFAULTS = {
+    'ASYNC': False,
+    'WORKERS': 2,
+    'START_LOCAL_WORKERS': True,
+    'MAX_ATTEMPTS': 3,
+    'RETRY_BACKOFF_SECONDS': 5,
+    'POLL_INTERVAL_SECONDS': 2,
+    'LEASE_SECONDS': 300,
+}
+
+STAGE_NAMES = [name for name, _ in STAGES]
+
+# повтор не поможет: тот же файл упадёт так же
+PERMANENT_ERRORS = (ExtractionError,)
+
+
+def get_config():
+    return {**DEFAULTS, **getattr(settings, 'POST_INGESTION', {})}
+
+
+def is_async_enabled():
+    return get_config()['ASYNC']
+
+
+def enqueue_post(post):
+    job = IngestionJob.objects.create(post=post)
+    if get_config()['START_LOCAL_WORKERS']:
+        transaction.on_commit(lambda: get_worker_pool().notify())
+    return job
+
+
+def _claimable(now):
+    lease_expired = now - timedelta(seconds=get_config()['LEASE_SECONDS'])
+    # зависшие в running задачи (процесс упал) забираются повторно после истечения аренды
+    return Q(state='pending', next_attempt_at__lte=now) | Q(state='running', locked_at__lt=lease_expired)
+
+
+def claim_job():
+    now = timezone.now()
+    candidates = (
+        IngestionJob.objects.filter(_claimable(now))
+        .order_by('next_attempt_at')
+        .values_list('id', flat=True)[:10]
+    )
+    for job_id in list(candidates):
+        claimed = (
+            IngestionJob.objects.filter(_claimable(now), id=job_id)
+            .update(state='running', locked_at=now, updated_at=now)
+        )
+        if claimed:
+            return IngestionJob.objects.select_related('post', 'post__user').get(id=job_id)
+    return None
+
+
+def run_job(job):
+    """
+    Выполняет оставшиеся этапы задачи; при сбое планирует повтор с экспоненциальной
+    задержкой, а документ, из которого не извлекается текст, сразу помечает failed.
+    """
+    with track_stages(job.post.type, mode='async'):
+        return _run_stages(job)
+
+
+def _run_stages(job):
+    config = get_config()
+    post = job.post
+    for name, stage in STAGES[STAGE_NAMES.index(job.stage):]:
+        job.stage = name
+        try:
+            stage(post)
+        except Exception as exc:
+            job.attempts += 1
+            job.last_error = traceback.format_exc(limit=5)
+            job.locked_at = None
+            if job.attempts >= config['MAX_ATTEMPTS'] or isinstance(exc, PERMANENT_ERRORS):
+                job.state = 'failed'
+                Post.objects.filter(pk=post.pk).update(status='failed')
+                logger.error("Обработка поста %s провалилась на этапе %s", post.pk, name)
+            else:
+                job.state = 'pending'
+                delay = config['RETRY_BACKOFF_SECONDS'] * 2 ** (job.attempts - 1)
+                job.next_attempt_at = timezone.now() + timedelta(seconds=delay)
+                logger.warning("Этап %s поста %s упал, повтор через %s с", name, post.pk, delay)
+            job.save()
+            return False
+        job.attempts = 0
+        job.last_error = ''
+        job.save(update_fields=['stage', 'attempts', 'last_error', 'updated_at'])
+    job.state = 'done'
+    job.locked_at = None
+    job.save(update_fields=['state', 'locked_at', 'updated_at'])
+    return True
+
+
+def process_next_job():
+    job = claim_job()
+    if job is None:
+        return False
+    try:
+        run_job(job)
+    except Exception:
+        logger.exception("Сбой воркера на задаче %s", job.pk)
+    return True
+
+
+class WorkerPool:
+    def __init__(self, workers, poll_interval):
+        self.workers = workers
+        self.poll_interval = poll_interval
+        self._wakeup = threading.Event()
+        self._stop = threading.Event()
+        self._threads = []
+
+    def start(self):
+        for i in range(self.workers):
+            thread = threading.Thread(target=self._run, name=f'ingestion-worker-{i}', daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        return self
+
+    def notify(self):
+        self._wakeup.set()
+
+    def stop(self, timeout=None):
+        self._stop.set()
+        self._wakeup.set()
+        for thread in self._threads:
+            thread.join(timeout)
+
+    def join(self):
+        for thread in self._threads:
+            thread.join()
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                busy = process_next_job()
+            except Exception:
+                logger.exception("Ошибка при захвате задачи обработки")
+                busy = False
+            finally:
+                close_old_connections()
+            if not busy:
+                self._wakeup.wait(self.poll_interval)
+                self._wakeup.clear()
+
+
+_pool = None
+_pool_pid = None
+_pool_lock = threading.Lock()
+
+
+def start_local_workers(sender, **kwargs):
+    """Обработчик request_started: пул запускается в процессе, который обслуживает запросы."""
+    get_worker_pool()
+
+
+def get_worker_pool():
+    global _pool, _pool_pid
+    # потоки не переживают fork, поэтому пул создаётся заново в каждом воркере
+    if _pool is None or _pool_pid != os.getpid():
+        with _pool_lock:
+            if _pool is None or _pool_pid != os.getpid():
+                config = get_config()
+                _pool = WorkerPool(config['WORKERS'], config['POLL_INTERVAL_SECONDS']).start()
+                _pool_pid = os.getpid()
+    return _pool
@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand
+
+from posts.minhash import index_signature, minhash_signature, pack_signature
+from posts.models import Post
+
+
+class Command(BaseCommand):
+    help = "Считает MinHash-сигнатуры и LSH-корзины для текстовых постов, у которых их ещё нет"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--all', action='store_true', help="пересчитать и уже проиндексированные посты")
+
+    def handle(self, *args, **options):
+        posts = Post.objects.filter(type__in=['text', 'document']).exclude(content='')
+        if not options['all']:
+            posts = posts.filter(minhash__isnull=True)
+        count = 0
+        for post in posts.only('id', 'content').iterator(chunk_size=500):
+            signature = minhash_signature(post.content)
+            if signature is None:
+                continue
+            Post.objects.filter(pk=post.pk).update(minhash=pack_signature(signature))
+            index_signature(post.pk, signature)
+            count += 1
+        self.stdout.write(self.style.SUCCESS(f"Проиндексировано постов: {count}"))
@@ -0,0 +1,39 @@
+import json
+import os
+
+from django.core.management.base import BaseCommand, CommandError
+
+from posts.blockchain_utils import BLOCKCHAIN_FILE, get_ledger
+
+BATCH_SIZE = 10000
+
+
+class Command(BaseCommand):
+    help = "Переносит записи из старого blockchain_log.json в журнал LEDGER (один раз)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--source', default=BLOCKCHAIN_FILE, help="путь к blockchain_log.json")
+        parser.add_argument('--keep', action='store_true', help="не переименовывать исходный файл после переноса")
+
+    def handle(self, *args, **options):
+        source = options['source']
+        if not os.path.exists(source):
+            raise CommandError(f"Файл {source} не найден")
+        with open(source, encoding='utf-8') as f:
+            try:
+                records = json.load(f)
+            except json.JSONDecodeError as e:
+                raise CommandError(f"Не удалось разобрать {source}: {e}")
+
+        ledger = get_ledger()
+        for start in range(0, len(records), BATCH_SIZE):
+            ledger.append_many([
+                {key: record.get(key) for key in ('timestamp', 'hash', 'user', 'title')}
+                for record in records[start:start + BATCH_SIZE]
+            ])
+        ledger.flush()
+
+        if not options['keep']:
+            # повторный запуск не продублирует записи
+            os.replace(source, source + '.imported')
+        self.stdout.write(self.style.SUCCESS(f"Перенесено записей: {len(records)}"))
@@ -0,0 +1,21 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from posts.embedding_index import index_from_settings
+
+
+class Command(BaseCommand):
+    help = "Перестраивает индекс эмбеддингов постов из базы данных и сохраняет снимок на диск"
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        index = index_from_settings()
+        count = index.rebuild()
+        saved = index.save()
+        elapsed = time.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(
+            f"Индекс ({index.engine_class.name}) перестроен: {count} эмбеддингов за {elapsed:.2f} с"
+        ))
+        if saved:
+            self.stdout.write(f"Снимок сохранён в {index.path}")
@@ -0,0 +1,42 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count, F, OuterRef, Q, Subquery, Value
+from django.db.models.functions import Coalesce
+
+from posts.models import Comment, Post, Vote
+
+
+class Command(BaseCommand):
+    help = "Пересчитывает vote_count и comment_count постов по таблицам голосов и комментариев"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=10000, help="постов на одну транзакцию")
+        parser.add_argument('--dry-run', action='store_true', help="только посчитать расхождения")
+
+    def handle(self, *args, **options):
+        votes = Coalesce(Subquery(
+            Vote.objects.filter(post=OuterRef('pk')).values('post').annotate(n=Count('id')).values('n')
+        ), Value(0))
+        comments = Coalesce(Subquery(
+            Comment.objects.filter(post=OuterRef('pk')).values('post').annotate(n=Count('id')).values('n')
+        ), Value(0))
+
+        batch_size = options['batch_size']
+        last_id = Post.objects.order_by('-id').values_list('id', flat=True).first() or 0
+        fixed = 0
+        # диапазонами id, чтобы не держать блокировку записи на всю таблицу
+        for start in range(0, last_id, batch_size):
+            with transaction.atomic():
+                drifted = (
+                    Post.objects.filter(id__gt=start, id__lte=start + batch_size)
+                    .annotate(actual_votes=votes, actual_comments=comments)
+                    .filter(~Q(vote_count=F('actual_votes')) | ~Q(comment_count=F('actual_comments')))
+                    .values_list('id', flat=True)
+                )
+                ids = list(drifted)
+                if ids and not options['dry_run']:
+                    Post.objects.filter(id__in=ids).update(vote_count=votes, comment_count=comments)
+                fixed += len(ids)
+
+        verb = "Расходится" if options['dry_run'] else "Исправлено"
+        self.stdout.write(self.style.SUCCESS(f"{verb} счётчиков у постов: {fixed}"))
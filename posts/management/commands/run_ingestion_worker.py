@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+
+from posts.ingestion_queue import WorkerPool, get_config
+
+
+class Command(BaseCommand):
+    help = "Запускает воркеры фоновой обработки постов (асинхронный режим POST_INGESTION)"
+
+    def add_arguments(self, parser):
+        config = get_config()
+        parser.add_argument('--workers', type=int, default=config['WORKERS'])
+        parser.add_argument('--poll-interval', type=float, default=config['POLL_INTERVAL_SECONDS'])
+
+    def handle(self, *args, **options):
+        pool = WorkerPool(options['workers'], options['poll_interval']).start()
+        self.stdout.write(self.style.SUCCESS(f"Запущено воркеров: {options['workers']}"))
+        try:
+            pool.join()
+        except KeyboardInterrupt:
+            self.stdout.write("Остановка...")
+            pool.stop(timeout=30)
@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from posts.blockchain_utils import get_ledger, verify_chain
+
+
+class Command(BaseCommand):
+    help = "Проверяет цепочку блоков журнала: хэши блоков, связи и корни Меркла"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--seal', action='store_true', help="сначала запечатать все незапечатанные записи")
+
+    def handle(self, *args, **options):
+        ledger = get_ledger()
+        if options['seal']:
+            self.stdout.write(f"Запечатано блоков: {ledger.seal()}")
+        checked, error = verify_chain(ledger)
+        if error:
+            raise CommandError(f"Проверено блоков: {checked}; {error}")
+        self.stdout.write(self.style.SUCCESS(f"Цепочка цела, проверено блоков: {checked}"))
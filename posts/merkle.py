@@ -0,0 +1,53 @@
+"""
+Дерево Меркла над записями блока журнала. Лист — sha256(0x00 + строка записи),
+узел — sha256(0x01 + левый + правый); непарный узел уровня поднимается выше
+без изменений. Доказательство включения — log2(n) соседних хэшей.
+"""
+import hashlib
+
+EMPTY_ROOT = hashlib.sha256(b'').hexdigest()
+
+
+def leaf_hash(data):
+    return hashlib.sha256(b'\x00' + data).digest()
+
+
+def node_hash(left, right):
+    return hashlib.sha256(b'\x01' + left + right).digest()
+
+
+def build_levels(leaves):
+    """Все уровни дерева от листьев до корня."""
+    levels = [list(leaves)]
+    while len(levels[-1]) > 1:
+        level = levels[-1]
+        parents = [node_hash(level[i], level[i + 1]) for i in range(0, len(level) - 1, 2)]
+        if len(level) % 2:
+            parents.append(level[-1])
+        levels.append(parents)
+    return levels
+
+
+def merkle_root(leaves):
+    if not leaves:
+        return EMPTY_ROOT
+    return build_levels(leaves)[-1][0].hex()
+
+
+def inclusion_proof(levels, index):
+    """Соседи листа index снизу вверх: [{'hash': ..., 'position': 'left' | 'right'}]."""
+    proof = []
+    for level in levels[:-1]:
+        sibling = index ^ 1
+        if sibling < len(level):
+            proof.append({'hash': level[sibling].hex(), 'position': 'left' if sibling < index else 'right'})
+        index //= 2
+    return proof
+
+
+def verify_proof(data, proof, root):
+    current = leaf_hash(data)
+    for step in proof:
+        sibling = bytes.fromhex(step['hash'])
+        current = node_hash(sibling, current) if step['position'] == 'left' else node_hash(current, sibling)
+    return current.hex() == root
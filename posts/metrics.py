@@ -0,0 +1,255 @@
+"""
+Счётчики и гистограммы времени этапов обработки постов, отчётов и проверки
+хэшей в текстовом формате Prometheus (GET /metrics/). Метрики хранятся в
+памяти процесса: каждый воркер веб-сервера отдаёт свои, суммирует их
+Prometheus. Выключаются настройкой METRICS['ENABLED'].
+
+Время этапов создания поста копится в трекере запроса (track_stages), а
+не пишется сразу: этап, выполненный несколько раз за запрос (например,
+encode для текста и для фрагментов), попадает в гистограмму одним значением.
+"""
+import contextvars
+import inspect
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager, nullcontext
+from functools import wraps
+
+from django.conf import settings
+from django.http import Http404, HttpResponse
+
+DEFAULTS = {
+    'ENABLED': True,
+    'TOKEN': None,
+    'BUCKETS': (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0),
+}
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+
+def get_config():
+    return {**DEFAULTS, **getattr(settings, 'METRICS', {})}
+
+
+def is_enabled():
+    return get_config()['ENABLED']
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(names, values, extra=()):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in (*zip(names, values), *extra)]
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def _number(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Metric:
+    kind = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+        REGISTRY.append(self)
+
+    def _key(self, labels):
+        return tuple(str(labels.get(name, '')) for name in self.labelnames)
+
+    def samples(self):
+        raise NotImplementedError
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} {self.kind}']
+        lines.extend(f'{name}{labels} {_number(value)}' for name, labels, value in self.samples())
+        return '\n'.join(lines)
+
+
+class Counter(Metric):
+    kind = 'counter'
+
+    def inc(self, amount=1, **labels):
+        if not amount or not is_enabled():
+            return
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels):
+        return self._values.get(self._key(labels), 0)
+
+    def samples(self):
+        with self._lock:
+            items = sorted(self._values.items())
+        for key, value in items:
+            yield self.name, _labels(self.labelnames, key), value
+
+
+class Histogram(Metric):
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=None):
+        super().__init__(name, documentation, labelnames)
+        self._buckets = tuple(buckets) if buckets else None
+
+    @property
+    def buckets(self):
+        # настройки читаются при первом наблюдении: модуль импортируют и процессы без django.setup()
+        if self._buckets is None:
+            self._buckets = tuple(get_config()['BUCKETS'])
+        return self._buckets
+
+    def observe(self, value, **labels):
+        if not is_enabled():
+            return
+        key = self._key(labels)
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            counts = self._values.get(key)
+            if counts is None:
+                # счётчики по корзинам (последняя — +Inf), сумма, количество
+                counts = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            counts[0][index] += 1
+            counts[1] += value
+            counts[2] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def count(self, **labels):
+        counts = self._values.get(self._key(labels))
+        return counts[2] if counts else 0
+
+    def samples(self):
+        with self._lock:
+            items = sorted((key, ([*buckets], total, count)) for key, (buckets, total, count) in self._values.items())
+        bounds = [*map(_number, self.buckets), '+Inf']
+        for key, (buckets, total, count) in items:
+            cumulative = 0
+            for bound, bucket in zip(bounds, buckets):
+                cumulative += bucket
+                yield f'{self.name}_bucket', _labels(self.labelnames, key, [('le', bound)]), cumulative
+            yield f'{self.name}_sum', _labels(self.labelnames, key), total
+            yield f'{self.name}_count', _labels(self.labelnames, key), count
+
+
+REGISTRY = []
+
+POST_STAGE_SECONDS = Histogram(
+    'post_ingestion_stage_seconds', "Время этапа обработки поста", ['stage', 'type'])
+POST_INGESTION_SECONDS = Histogram(
+    'post_ingestion_seconds', "Время обработки поста целиком", ['type', 'mode'])
+POSTS_CREATED = Counter(
+    'posts_created_total', "Созданные посты по типу и статусу", ['type', 'status'])
+REPORT_REQUEST_SECONDS = Histogram(
+    'report_request_seconds', "Время ответа на запрос отчёта", ['status'])
+REPORT_RENDER_SECONDS = Histogram(
+    'report_render_seconds', "Время рендеринга PDF-отчёта")
+VERIFY_REQUEST_SECONDS = Histogram(
+    'hash_verify_request_seconds', "Время ответа на проверку хэша", ['endpoint'])
+VERIFY_LOOKUPS = Counter(
+    'hash_verify_lookups_total', "Проверенные хэши: отсечены фильтром Блума, найдены, не найдены", ['result'])
+
+
+_stages = contextvars.ContextVar('post_ingestion_stages', default=None)
+
+
+@contextmanager
+def track_stages(post_type, mode='sync'):
+    """Копит время этапов внутри блока и записывает его в гистограммы при выходе."""
+    if not is_enabled():
+        yield
+        return
+    durations = {}
+    token = _stages.set(durations)
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - started
+        _stages.reset(token)
+        for name, seconds in durations.items():
+            POST_STAGE_SECONDS.observe(seconds, stage=name, type=post_type)
+        POST_INGESTION_SECONDS.observe(elapsed, type=post_type, mode=mode)
+
+
+class _Stage:
+    __slots__ = ('durations', 'name', 'started')
+
+    def __init__(self, durations, name):
+        self.durations = durations
+        self.name = name
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+
+    def __exit__(self, *exc_info):
+        elapsed = time.perf_counter() - self.started
+        self.durations[self.name] = self.durations.get(self.name, 0.0) + elapsed
+
+
+_NOOP = nullcontext()
+
+
+def stage(name):
+    """Таймер этапа; вне track_stages ничего не делает."""
+    durations = _stages.get()
+    return _NOOP if durations is None else _Stage(durations, name)
+
+
+def timed_response(histogram, **labels):
+    """
+    Декоратор представления (метода APIView или async-функции): время ответа;
+    метка status, если она есть, — код ответа.
+    """
+    def observe(started, response):
+        observed = {**labels, 'status': response.status_code} if 'status' in histogram.labelnames else labels
+        histogram.observe(time.perf_counter() - started, **observed)
+
+    def decorator(method):
+        if inspect.iscoroutinefunction(method):
+            @wraps(method)
+            async def async_wrapper(*args, **kwargs):
+                started = time.perf_counter()
+                response = await method(*args, **kwargs)
+                observe(started, response)
+                return response
+            return async_wrapper
+
+        @wraps(method)
+        def wrapper(*args, **kwargs):
+            started = time.perf_counter()
+            response = method(*args, **kwargs)
+            observe(started, response)
+            return response
+        return wrapper
+    return decorator
+
+
+def render_metrics():
+    return '\n'.join(metric.render() for metric in REGISTRY) + '\n'
+
+
+def metrics_view(request):
+    config = get_config()
+    if not config['ENABLED']:
+        raise Http404
+    if config['TOKEN']:
+        if request.headers.get('Authorization') != f"Bearer {config['TOKEN']}":
+            return HttpResponse(status=401, headers={'WWW-Authenticate': 'Bearer'})
+    elif not settings.DEBUG and request.META.get('REMOTE_ADDR') not in settings.INTERNAL_IPS:
+        # без токена метрики отдаются только в DEBUG или адресам из INTERNAL_IPS
+        return HttpResponse(status=403)
+    return HttpResponse(render_metrics(), content_type=CONTENT_TYPE)
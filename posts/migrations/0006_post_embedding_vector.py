@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-18 07:32
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0005_alter_post_document_alter_post_image_comment_vote'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='post',
+            name='embedding_vector',
+            field=models.BinaryField(blank=True, null=True),
+        ),
+    ]
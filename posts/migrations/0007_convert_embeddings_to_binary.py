@@ -0,0 +1,62 @@
+import json
+import struct
+
+import numpy as np
+from django.db import migrations
+
+# Копия формата из posts/embedding_codec.py на момент миграции (float32)
+HEADER = struct.Struct('<4sBxH')
+MAGIC = b'EMB1'
+FLOAT32 = 1
+BATCH_SIZE = 500
+
+
+def json_to_binary(apps, schema_editor):
+    Post = apps.get_model('posts', 'Post')
+    rows = Post.objects.filter(embedding__isnull=False, embedding_vector__isnull=True).only('id', 'embedding')
+    batch = []
+    for post in rows.iterator(chunk_size=BATCH_SIZE):
+        try:
+            vector = np.asarray(json.loads(post.embedding), dtype='<f4').reshape(-1)
+        except (TypeError, ValueError):
+            continue
+        post.embedding_vector = HEADER.pack(MAGIC, FLOAT32, vector.shape[0]) + vector.tobytes()
+        post.embedding = None
+        batch.append(post)
+        if len(batch) >= BATCH_SIZE:
+            Post.objects.bulk_update(batch, ['embedding_vector', 'embedding'])
+            batch = []
+    if batch:
+        Post.objects.bulk_update(batch, ['embedding_vector', 'embedding'])
+
+
+def binary_to_json(apps, schema_editor):
+    Post = apps.get_model('posts', 'Post')
+    dtypes = {1: '<f4', 2: '<f2'}
+    rows = Post.objects.filter(embedding_vector__isnull=False).only('id', 'embedding_vector')
+    batch = []
+    for post in rows.iterator(chunk_size=BATCH_SIZE):
+        value = bytes(post.embedding_vector)
+        magic, code, dim = HEADER.unpack_from(value)
+        if magic != MAGIC or code not in dtypes:
+            continue
+        vector = np.frombuffer(value, dtype=dtypes[code], count=dim, offset=HEADER.size)
+        post.embedding = json.dumps(vector.astype(np.float32).tolist())
+        post.embedding_vector = None
+        batch.append(post)
+        if len(batch) >= BATCH_SIZE:
+            Post.objects.bulk_update(batch, ['embedding_vector', 'embedding'])
+            batch = []
+    if batch:
+        Post.objects.bulk_update(batch, ['embedding_vector', 'embedding'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0006_post_embedding_vector'),
+    ]
+
+    operations = [
+        migrations.RunPython(json_to_binary, binary_to_json),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 5.2.18 on 2026-10-18 07:43
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0008_ingestion_job'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='post',
+            name='chunk_matches',
+            field=models.JSONField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='post',
+            name='chunk_spans',
+            field=models.JSONField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='post',
+            name='chunk_vectors',
+            field=models.BinaryField(blank=True, null=True),
+        ),
+    ]
@@ -0,0 +1,36 @@
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+
+
+def count_existing(apps, schema_editor):
+    Post = apps.get_model('posts', 'Post')
+    Vote = apps.get_model('posts', 'Vote')
+    Comment = apps.get_model('posts', 'Comment')
+    votes = Vote.objects.filter(post=OuterRef('pk')).values('post').annotate(n=Count('id')).values('n')
+    comments = Comment.objects.filter(post=OuterRef('pk')).values('post').annotate(n=Count('id')).values('n')
+    Post.objects.update(
+        vote_count=Coalesce(Subquery(votes), Value(0)),
+        comment_count=Coalesce(Subquery(comments), Value(0)),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0012_lookup_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='post',
+            name='comment_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='post',
+            name='vote_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunPython(count_existing, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,154 @@
+"""
+MinHash-сигнатуры по словесным шинглам и LSH-индекс по полосам сигнатуры
+(таблица LSHBucket). Почти дословные копии находятся без запуска модели.
+"""
+import hashlib
+import re
+import threading
+import zlib
+
+import numpy as np
+from django.conf import settings
+from django.db.models import Count
+
+from .models import LSHBucket, Post
+
+DEFAULTS = {
+    'ENABLED': True,
+    'NUM_PERM': 128,
+    'BANDS': 32,
+    'SHINGLE_WORDS': 5,
+    'DUPLICATE_JACCARD': 0.9,
+    'MAX_CANDIDATES': 50,
+    'NARROW_VECTOR_SEARCH': False,
+}
+
+MERSENNE_PRIME = np.uint64((1 << 61) - 1)
+MAX_HASH = np.uint64(0xFFFFFFFF)
+WORD_RE = re.compile(r'\w+')
+BLOCK_SIZE = 4096
+
+
+def get_config():
+    return {**DEFAULTS, **getattr(settings, 'LSH', {})}
+
+
+_permutations = {}
+
+
+def _get_permutations(num_perm):
+    if num_perm not in _permutations:
+        # фиксированное зерно: сигнатуры должны совпадать между процессами и перезапусками
+        rng = np.random.default_rng(20250601)
+        a = rng.integers(1, 1 << 32, num_perm, dtype=np.uint64)
+        b = rng.integers(0, 1 << 32, num_perm, dtype=np.uint64)
+        _permutations[num_perm] = (a, b)
+    return _permutations[num_perm]
+
+
+def shingle_hashes(text, shingle_words=5):
+    words = WORD_RE.findall(text.lower())
+    if not words:
+        return np.empty(0, dtype=np.uint64)
+    if len(words) < shingle_words:
+        shingles = [' '.join(words)]
+    else:
+        shingles = (' '.join(words[i:i + shingle_words]) for i in range(len(words) - shingle_words + 1))
+    hashes = np.fromiter((zlib.crc32(s.encode('utf-8')) for s in shingles), dtype=np.uint64)
+    return np.unique(hashes)
+
+
+def minhash_signature(text, num_perm=None, shingle_words=None):
+    """Сигнатура uint32[num_perm] или None, если в тексте нет слов."""
+    config = get_config()
+    num_perm = num_perm or config['NUM_PERM']
+    hashes = shingle_hashes(text, shingle_words or config['SHINGLE_WORDS'])
+    if not len(hashes):
+        return None
+    a, b = _get_permutations(num_perm)
+    signature = np.full(num_perm, MAX_HASH, dtype=np.uint64)
+    # блоками, чтобы матрица (шинглы x перестановки) не разрасталась на длинных документах
+    for start in range(0, len(hashes), BLOCK_SIZE):
+        block = hashes[start:start + BLOCK_SIZE, None]
+        permuted = ((block * a + b) % MERSENNE_PRIME) & MAX_HASH
+        np.minimum(signature, permuted.min(axis=0), out=signature)
+    return signature.astype(np.uint32)
+
+
+def pack_signature(signature):
+    return np.ascontiguousarray(signature, dtype='<u4').tobytes()
+
+
+def unpack_signature(value):
+    if value is None:
+        return None
+    return np.frombuffer(value, dtype='<u4')
+
+
+def estimate_jaccard(first, second):
+    if first is None or second is None or len(first) != len(second):
+        return 0.0
+    return float(np.mean(first == second))
+
+
+def band_buckets(signature, bands=None):
+    """Ключи LSH-корзин: по одному на полосу, номер полосы входит в ключ."""
+    bands = bands or get_config()['BANDS']
+    rows = len(signature) // bands
+    keys = []
+    for band in range(bands):
+        chunk = signature[band * rows:(band + 1) * rows].astype('<u4').tobytes()
+        digest = hashlib.blake2b(band.to_bytes(2, 'little') + chunk, digest_size=8).digest()
+        keys.append(int.from_bytes(digest, 'little', signed=True))
+    return keys
+
+
+def is_near_duplicate(jaccard, threshold=None):
+    """Та же граница, что у classify_similarity: дубликат — строго выше порога."""
+    if threshold is None:
+        threshold = get_config()['DUPLICATE_JACCARD']
+    return jaccard > threshold
+
+
+def find_candidates(signature, exclude_pk=None):
+    """
+    Посты, попавшие хотя бы в одну общую корзину, с оценкой Жаккара: [(jaccard, post_id)].
+    Если таких постов больше MAX_CANDIDATES, берутся совпавшие по наибольшему числу полос.
+    """
+    config = get_config()
+    candidates = LSHBucket.objects.filter(bucket__in=band_buckets(signature, config['BANDS']))
+    if exclude_pk is not None:
+        candidates = candidates.exclude(post_id=exclude_pk)
+    post_ids = list(
+        candidates.values('post_id').annotate(bands=Count('id')).order_by('-bands', 'post_id')
+        .values_list('post_id', flat=True)[:config['MAX_CANDIDATES']]
+    )
+    if not post_ids:
+        return []
+    scored = [
+        (estimate_jaccard(signature, unpack_signature(value)), post_id)
+        for post_id, value in Post.objects.filter(id__in=post_ids).values_list('id', 'minhash')
+    ]
+    return sorted(scored, reverse=True)
+
+
+def index_signature(post_id, signature):
+    LSHBucket.objects.filter(post_id=post_id).delete()
+    LSHBucket.objects.bulk_create([LSHBucket(post_id=post_id, bucket=key) for key in band_buckets(signature)])
+
+
+_stats = {'checked': 0, 'skipped_inference': 0}
+_stats_lock = threading.Lock()
+
+
+def record_check(skipped_inference):
+    with _stats_lock:
+        _stats['checked'] += 1
+        if skipped_inference:
+            _stats['skipped_inference'] += 1
+
+
+def stats():
+    with _stats_lock:
+        checked, skipped = _stats['checked'], _stats['skipped_inference']
+    return {'checked': checked, 'skipped_inference': skipped, 'skip_ratio': skipped / checked if checked else 0.0}
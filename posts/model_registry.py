@@ -0,0 +1,114 @@
+import gc
+import logging
+import os
+import sys
+import threading
+import time
+
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+logger = logging.getLogger(__name__)
+
+DEFAULTS = {
+    'NAME': 'all-MiniLM-L6-v2',
+    'LOADER': 'posts.model_registry.load_sentence_transformer',
+    'PRELOAD': False,
+}
+
+
+def get_config():
+    return {**DEFAULTS, **getattr(settings, 'EMBEDDING_MODEL', {})}
+
+
+def load_sentence_transformer(name):
+    # импорт здесь, чтобы manage.py (migrate и т.п.) не тянул torch
+    from sentence_transformers import SentenceTransformer
+    return SentenceTransformer(name)
+
+
+def current_rss():
+    """Текущий RSS процесса в байтах (на Linux из /proc, иначе пиковый из getrusage, иначе None)."""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, IndexError, AttributeError):
+        pass
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss в килобайтах на Linux и в байтах на macOS
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+
+class ModelRegistry:
+    """
+    Загружает модели эмбеддингов при первом обращении, один раз на процесс.
+    Модель, загруженная в мастере gunicorn до fork, разделяется воркерами
+    через copy-on-write.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._models = {}
+        self._stats = {}
+
+    def get(self, name=None):
+        config = get_config()
+        name = name or config['NAME']
+        model = self._models.get(name)
+        if model is not None:
+            return model
+        with self._lock:
+            if name not in self._models:
+                loader = import_string(config['LOADER'])
+                rss_before = current_rss()
+                started = time.perf_counter()
+                self._models[name] = loader(name)
+                rss_after = current_rss()
+                self._stats[name] = {
+                    'load_seconds': round(time.perf_counter() - started, 3),
+                    'rss_delta_bytes': rss_after - rss_before if rss_before is not None else None,
+                    'loaded_at': time.time(),
+                    'loaded_in_pid': os.getpid(),
+                }
+                logger.info("Модель %s загружена за %.2f с", name, self._stats[name]['load_seconds'])
+            return self._models[name]
+
+    def preload(self, name=None):
+        model = self.get(name)
+        # объекты модели больше не трогает сборщик мусора — страницы не копируются после fork
+        gc.freeze()
+        return model
+
+    def is_loaded(self, name=None):
+        return (name or get_config()['NAME']) in self._models
+
+    def stats(self):
+        pid = os.getpid()
+        return {
+            'pid': pid,
+            'rss_bytes': current_rss(),
+            'models': {
+                name: {**info, 'shared_from_parent': info['loaded_in_pid'] != pid}
+                for name, info in self._stats.items()
+            },
+        }
+
+    def clear(self):
+        with self._lock:
+            self._models.clear()
+            self._stats.clear()
+
+
+registry = ModelRegistry()
+
+
+def get_model(name=None):
+    return registry.get(name)
+
+
+def preload_model(name=None):
+    return registry.preload(name)
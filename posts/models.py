@@ -1,5 +1,6 @@
 from django.db import models
 from django.conf import settings
+from django.utils import timezone
 
 class Post(models.Model):
     TYPE_CHOICES = [
@@ -12,6 +13,8 @@ class Post(models.Model):
         ('original', 'Original'),
         ('duplicate', 'Duplicate'),
         ('suspicious', 'Suspicious'),
+        ('processing', 'Processing'),
+        ('failed', 'Failed'),
     ]
 
     user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='posts')
@@ -24,10 +27,27 @@ class Post(models.Model):
     sha256_hash = models.CharField(max_length=128)
     status = models.CharField(max_length=20, choices=STATUS_CHOICES)
     similarity_score = models.FloatField(null=True, blank=True)
-    embedding = models.TextField(blank=True, null=True)
+    embedding = models.TextField(blank=True, null=True)  # устаревший JSON, читается только при переходе
+    embedding_vector = models.BinaryField(blank=True, null=True)  # см. embedding_codec
+    chunk_vectors = models.BinaryField(blank=True, null=True)  # эмбеддинги фрагментов длинного текста
+    chunk_spans = models.JSONField(blank=True, null=True)  # [[start, end], ...] фрагментов в content
+    chunk_matches = models.JSONField(blank=True, null=True)  # совпавшие пары фрагментов, см. chunking
+    minhash = models.BinaryField(blank=True, null=True)  # MinHash-сигнатура текста, см. minhash
+    image_hash = models.CharField(max_length=16, blank=True, null=True)  # перцептивный хэш, см. image_hash
+    # счётчики обновляются F-выражениями во вьюхах; сверка — manage.py reconcile_post_counters
+    vote_count = models.PositiveIntegerField(default=0)
+    comment_count = models.PositiveIntegerField(default=0)
 
     created_at = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        indexes = [
+            # проверка и отчёт: поиск по хэшу с выбором самого свежего поста
+            models.Index(fields=['sha256_hash', 'created_at'], name='post_hash_created_idx'),
+            # лента постов по дате
+            models.Index(fields=['created_at'], name='post_created_idx'),
+        ]
+
     def __str__(self):
         return f"{self.title} ({self.user.username})"
 
@@ -39,6 +59,11 @@ class Comment(models.Model):
     text = models.TextField()
     created_at = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['post', 'created_at'], name='comment_post_created_idx'),
+        ]
+
     def __str__(self):
         return f"Comment by {self.user.username} on {self.post.title}"
 
@@ -50,3 +75,40 @@ class Vote(models.Model):
 
     class Meta:
         unique_together = ('user', 'post')  # чтобы нельзя было голосовать дважды
+
+
+class LSHBucket(models.Model):
+    """Корзина LSH-индекса MinHash: одна запись на полосу сигнатуры поста."""
+
+    post = models.ForeignKey(Post, on_delete=models.CASCADE, related_name='lsh_buckets')
+    bucket = models.BigIntegerField(db_index=True)
+
+    def __str__(self):
+        return f"Bucket {self.bucket} of post {self.post_id}"
+
+
+class IngestionJob(models.Model):
+    """Фоновая обработка поста в асинхронном режиме (см. ingestion_queue)."""
+
+    STATE_CHOICES = [
+        ('pending', 'Pending'),
+        ('running', 'Running'),
+        ('done', 'Done'),
+        ('failed', 'Failed'),
+    ]
+
+    post = models.OneToOneField(Post, on_delete=models.CASCADE, related_name='ingestion_job')
+    state = models.CharField(max_length=10, choices=STATE_CHOICES, default='pending')
+    stage = models.CharField(max_length=20, default='extract')
+    attempts = models.PositiveIntegerField(default=0)
+    last_error = models.TextField(blank=True)
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    locked_at = models.DateTimeField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [models.Index(fields=['state', 'next_attempt_at'])]
+
+    def __str__(self):
+        return f"Job {self.pk} for post {self.post_id} ({self.state}, {self.stage})"
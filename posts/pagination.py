@@ -0,0 +1,82 @@
+"""
+Keyset-пагинация ленты по (created_at, id): курсор хранит ключ последней
+отданной строки, следующая страница начинается строго после него. Стоимость
+страницы не зависит от её глубины, в отличие от OFFSET.
+"""
+import base64
+from datetime import datetime
+
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+
+class KeysetPagination(BasePagination):
+    """Сортировка по убыванию (created_at, id); queryset должен быть так и упорядочен."""
+
+    page_size = 20
+    max_page_size = 100
+    cursor_query_param = 'cursor'
+    page_size_query_param = 'page_size'
+    invalid_cursor_message = "Invalid cursor"
+
+    def encode_cursor(self, post):
+        key = f"{post.created_at.isoformat()}|{post.id}"
+        return base64.urlsafe_b64encode(key.encode('ascii')).decode('ascii')
+
+    def decode_cursor(self, value):
+        try:
+            created_at, pk = base64.urlsafe_b64decode(value.encode('ascii')).decode('ascii').rsplit('|', 1)
+            return datetime.fromisoformat(created_at), int(pk)
+        except (ValueError, UnicodeError):
+            raise NotFound(self.invalid_cursor_message)
+
+    def get_page_size(self, request):
+        try:
+            size = int(request.query_params.get(self.page_size_query_param, self.page_size))
+        except ValueError:
+            return self.page_size
+        return min(max(size, 1), self.max_page_size)
+
+    def _page_queryset(self, queryset, request):
+        self.request = request
+        self.limit = self.get_page_size(request)
+        cursor = request.query_params.get(self.cursor_query_param)
+        if cursor:
+            created_at, pk = self.decode_cursor(cursor)
+            # первое условие — диапазон по индексу created_at, второе отсекает уже отданные строки
+            queryset = queryset.filter(Q(created_at__lte=created_at), Q(created_at__lt=created_at) | Q(id__lt=pk))
+        return queryset[:self.limit + 1]
+
+    def _set_page(self, rows):
+        self.has_next = len(rows) > self.limit
+        self.page = rows[:self.limit]
+        return self.page
+
+    def paginate_queryset(self, queryset, request, view=None):
+        return self._set_page(list(self._page_queryset(queryset, request)))
+
+    async def apaginate_queryset(self, queryset, request):
+        """paginate_queryset() для асинхронных представлений (async ORM)."""
+        return self._set_page([row async for row in self._page_queryset(queryset, request)])
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        url = self.request.build_absolute_uri()
+        return replace_query_param(url, self.cursor_query_param, self.encode_cursor(self.page[-1]))
+
+    def get_paginated_response(self, data):
+        return Response({'next': self.get_next_link(), 'results': data})
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'required': ['results'],
+            'properties': {
+                'next': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'results': schema,
+            },
+        }
@@ -1,16 +1,76 @@
+"""
+PDF-отчёты о постах. Отчёт адресуется содержимым: имя файла — хэш поста и
+отпечаток входных данных отчёта (заголовок, автор, статус, похожесть, версия
+макета), поэтому после смены статуса отдаётся новый файл, а не устаревший.
+Файл пишется во временный и переименовывается, а одновременные запросы одного
+отчёта ждут на блокировке, пока его сгенерирует первый.
+"""
+import hashlib
+import json
 import os
+import tempfile
+import threading
+from contextlib import contextmanager
+
 from django.conf import settings
 from reportlab.lib.pagesizes import A4
 from reportlab.pdfgen import canvas
 from reportlab.lib import colors
 
-def generate_report_pdf(post):
-    reports_dir = os.path.join(settings.MEDIA_ROOT, 'reports')
-    os.makedirs(reports_dir, exist_ok=True)
+from .file_locks import lock_file, unlock_file
+from .metrics import REPORT_RENDER_SECONDS
+
+DEFAULTS = {
+    'DIR': None,
+    'PREGENERATE': False,
+    'LOCK_STRIPES': 64,
+    'EXPORT_WORKERS': 2,
+    'EXPORT_BATCH_SIZE': 25,
+    'EXPORT_MAX_HASHES': 5000,
+}
+
+# меняется вместе с макетом render_report_pdf, чтобы старые файлы не отдавались
+LAYOUT_VERSION = 1
+REPORT_FIELDS = ('title', 'status', 'similarity_score', 'sha256_hash', 'user__username')
+
+_thread_locks = {}
+_thread_locks_guard = threading.Lock()
+
+
+def get_config():
+    return {**DEFAULTS, **getattr(settings, 'REPORTS', {})}
+
+
+def reports_dir():
+    return get_config()['DIR'] or os.path.join(settings.MEDIA_ROOT, 'reports')
+
+
+def report_context(post):
+    """Всё, что попадает в отчёт; post.user должен быть загружен select_related."""
+    return {
+        'title': post.title,
+        'username': post.user.username,
+        'status': post.status,
+        'similarity_score': post.similarity_score or 0.0,
+        'sha256_hash': post.sha256_hash,
+    }
+
 
-    file_path = os.path.join(reports_dir, f"report_{post.sha256_hash}.pdf")
-    c = canvas.Canvas(file_path, pagesize=A4)
+def report_fingerprint(context):
+    payload = json.dumps({**context, 'layout': LAYOUT_VERSION}, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()[:16]
+
+
+def report_path(context, fingerprint=None):
+    fingerprint = fingerprint or report_fingerprint(context)
+    return os.path.join(reports_dir(), f"report_{context['sha256_hash']}_{fingerprint}.pdf")
+
+
+def render_report_pdf(context, target):
+    """Рисует отчёт в target (путь или файловый объект)."""
+    c = canvas.Canvas(target, pagesize=A4)
     width, height = A4
+    similarity = context['similarity_score']
 
     # Заголовок
     c.setFont("Helvetica-Bold", 18)
@@ -20,17 +80,17 @@ def generate_report_pdf(post):
     # Данные
     c.setFont("Helvetica", 12)
     c.setFillColor(colors.black)
-    c.drawString(50, height - 110, f"Title: {post.title}")
-    c.drawString(50, height - 140, f"User: {post.user.username}")
-    c.drawString(50, height - 170, f"Status: {post.status.capitalize()}")
-    c.drawString(50, height - 200, f"Similarity: {round(post.similarity_score * 100, 2)}%")
+    c.drawString(50, height - 110, f"Title: {context['title']}")
+    c.drawString(50, height - 140, f"User: {context['username']}")
+    c.drawString(50, height - 170, f"Status: {context['status'].capitalize()}")
+    c.drawString(50, height - 200, f"Similarity: {round(similarity * 100, 2)}%")
     c.drawString(50, height - 230, "SHA256 Hash:")
     c.setFont("Courier", 10)
-    c.drawString(50, height - 250, post.sha256_hash)
+    c.drawString(50, height - 250, context['sha256_hash'])
 
     # График похожести
     bar_width = 300
-    similarity_bar = post.similarity_score * bar_width
+    similarity_bar = similarity * bar_width
     c.setFillColor(colors.grey)
     c.rect(50, height - 290, bar_width, 15, fill=0)
     c.setFillColor(colors.green)
@@ -42,3 +102,53 @@ def generate_report_pdf(post):
     c.drawString(50, 30, "Generated automatically by the system")
 
     c.save()
+
+
+@contextmanager
+def _single_flight(directory, fingerprint):
+    """Блокировка на отчёт: поток процесса и файл-полоса для других процессов."""
+    stripe = int(fingerprint[:8], 16) % get_config()['LOCK_STRIPES']
+    with _thread_locks_guard:
+        thread_lock = _thread_locks.setdefault(stripe, threading.Lock())
+    locks_dir = os.path.join(directory, '.locks')
+    os.makedirs(locks_dir, exist_ok=True)
+    with thread_lock:
+        fd = os.open(os.path.join(locks_dir, f'{stripe}.lock'), os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            lock_file(fd)
+            try:
+                yield
+            finally:
+                unlock_file(fd)
+        finally:
+            os.close(fd)
+
+
+def ensure_report(context):
+    """Путь к готовому отчёту и его отпечаток; отчёт генерируется, если его ещё нет."""
+    fingerprint = report_fingerprint(context)
+    path = report_path(context, fingerprint)
+    if os.path.exists(path):
+        return path, fingerprint
+
+    directory = os.path.dirname(path)
+    os.makedirs(directory, exist_ok=True)
+    with _single_flight(directory, fingerprint):
+        # пока ждали блокировку, отчёт мог сгенерировать другой запрос
+        if os.path.exists(path):
+            return path, fingerprint
+        fd, tmp_path = tempfile.mkstemp(dir=directory, prefix='.report_', suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f, REPORT_RENDER_SECONDS.time():
+                render_report_pdf(context, f)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, path)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+    return path, fingerprint
+
+
+def generate_report_pdf(post):
+    return ensure_report(report_context(post))[0]
@@ -0,0 +1,244 @@
+"""
+Выборочное профилирование отдельных запросов. Профилируются запросы с
+заголовком X-Profile (PROFILING['HEADER']) или случайная доля SAMPLE_RATE.
+Поток-сэмплер раз в INTERVAL_SECONDS снимает стек потока запроса через
+sys._current_frames() — без хуков на каждый вызов функции, так что код
+запроса почти не замедляется, а время внутри C-расширений (модель, PDF)
+видно по стеку вызвавшей их Python-функции.
+
+Результат — collapsed stacks ("кадр;кадр;кадр число", формат
+flamegraph.pl и speedscope) в каталоге PROFILING['DIR']: кольцевой буфер
+из MAX_CAPTURES последних снимков, старые удаляются.
+"""
+import json
+import os
+import random
+import re
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+
+DEFAULTS = {
+    'ENABLED': False,
+    'HEADER': 'X-Profile',
+    'TOKEN': None,
+    'SAMPLE_RATE': 0.0,
+    'PATH_PREFIXES': ['/api/'],
+    'INTERVAL_SECONDS': 0.005,
+    'MIN_DURATION_SECONDS': 0.0,
+    'DIR': os.path.join(settings.BASE_DIR, 'profiles'),
+    'MAX_CAPTURES': 200,
+}
+
+CAPTURE_ID_RE = re.compile(r'^\d+-\d+$')
+
+
+def get_config():
+    return {**DEFAULTS, **getattr(settings, 'PROFILING', {})}
+
+
+class StackSampler:
+    """Считает, сколько раз каждый стек потока thread_id попал в выборку."""
+
+    def __init__(self, thread_id, interval):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = Counter()
+        self.samples = 0
+        self._labels = {}
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='stack-sampler', daemon=True)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+        return self.stacks
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is None:
+                continue
+            self.stacks[self._collapse(frame)] += 1
+            self.samples += 1
+
+    def _label(self, code):
+        label = self._labels.get(code)
+        if label is None:
+            label = self._labels[code] = f'{code.co_name} ({_short_path(code.co_filename)}:{code.co_firstlineno})'
+        return label
+
+    def _collapse(self, frame):
+        labels = []
+        while frame is not None:
+            labels.append(self._label(frame.f_code))
+            frame = frame.f_back
+        return ';'.join(reversed(labels))
+
+
+def _short_path(path):
+    base_dir = str(settings.BASE_DIR)
+    if path.startswith(base_dir):
+        return os.path.relpath(path, base_dir)
+    marker = path.rfind('site-packages' + os.sep)
+    if marker != -1:
+        return path[marker + len('site-packages') + 1:]
+    return os.path.basename(path)
+
+
+def render_collapsed(stacks):
+    ordered = sorted(stacks.items(), key=lambda item: item[1], reverse=True)
+    return ''.join(f'{stack} {count}\n' for stack, count in ordered)
+
+
+def should_profile(request, config):
+    if not any(request.path.startswith(prefix) for prefix in config['PATH_PREFIXES']):
+        return False
+    header = request.headers.get(config['HEADER'])
+    if header:
+        if config['TOKEN'] is not None:
+            if header == config['TOKEN']:
+                return True
+        elif settings.DEBUG or request.META.get('REMOTE_ADDR') in settings.INTERNAL_IPS:
+            # как /metrics/: без токена заголовок действует только в DEBUG или с адресов из INTERNAL_IPS
+            return True
+    return config['SAMPLE_RATE'] > 0 and random.random() < config['SAMPLE_RATE']
+
+
+def _write_atomic(directory, name, data):
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix='.capture_', suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            f.write(data)
+        os.replace(tmp_path, os.path.join(directory, name))
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+
+
+def save_capture(stacks, meta, config=None):
+    """Сохраняет снимок в кольцевой буфер и возвращает его id."""
+    config = config or get_config()
+    directory = config['DIR']
+    os.makedirs(directory, exist_ok=True)
+    # время в наносекундах упорядочивает снимки, pid разводит процессы
+    capture_id = f'{time.time_ns()}-{os.getpid()}'
+    _write_atomic(directory, f'{capture_id}.folded', render_collapsed(stacks))
+    # метаданные пишутся последними: снимок без .json в список не попадает
+    _write_atomic(directory, f'{capture_id}.json', json.dumps({'id': capture_id, **meta}))
+    _trim(directory, config['MAX_CAPTURES'])
+    return capture_id
+
+
+def _capture_ids(directory):
+    try:
+        names = os.listdir(directory)
+    except FileNotFoundError:
+        return []
+    ids = [name[:-5] for name in names if name.endswith('.json') and CAPTURE_ID_RE.match(name[:-5])]
+    return sorted(ids, key=lambda capture_id: int(capture_id.split('-')[0]), reverse=True)
+
+
+def _trim(directory, max_captures):
+    for capture_id in _capture_ids(directory)[max_captures:]:
+        for suffix in ('.json', '.folded'):
+            try:
+                os.unlink(os.path.join(directory, capture_id + suffix))
+            except FileNotFoundError:
+                pass  # удалил другой процесс
+
+
+def list_captures():
+    directory = get_config()['DIR']
+    captures = []
+    for capture_id in _capture_ids(directory):
+        try:
+            with open(os.path.join(directory, f'{capture_id}.json'), encoding='utf-8') as f:
+                captures.append(json.load(f))
+        except (FileNotFoundError, ValueError):
+            continue
+    return captures
+
+
+def capture_path(capture_id):
+    """Путь к collapsed stacks снимка или None, если такого нет."""
+    if not CAPTURE_ID_RE.match(capture_id):
+        return None
+    path = os.path.join(get_config()['DIR'], f'{capture_id}.folded')
+    return path if os.path.exists(path) else None
+
+
+class SamplingProfilerMiddleware:
+    """
+    Профилирует выбранные запросы; id снимка возвращается в заголовке X-Profile-Id.
+    Подключается только при PROFILING['ENABLED']. Под ASGI работает без перехода в
+    синхронный режим и снимает стек потока цикла событий: в снимок попадают и
+    другие запросы, выполнявшиеся в это время, а синхронный код в пулах потоков
+    виден только по ожиданию в цикле.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not get_config()['ENABLED']:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        config = get_config()
+        if not config['ENABLED'] or not should_profile(request, config):
+            return self.get_response(request)
+
+        sampler = StackSampler(threading.get_ident(), config['INTERVAL_SECONDS']).start()
+        started = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            stacks = sampler.stop()
+        self._save(request, response, sampler, stacks, time.perf_counter() - started, config)
+        return response
+
+    async def __acall__(self, request):
+        config = get_config()
+        if not config['ENABLED'] or not should_profile(request, config):
+            return await self.get_response(request)
+
+        sampler = StackSampler(threading.get_ident(), config['INTERVAL_SECONDS']).start()
+        started = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            stacks = sampler.stop()
+        # запись снимка на диск — не в цикле событий
+        await sync_to_async(self._save)(request, response, sampler, stacks, time.perf_counter() - started, config)
+        return response
+
+    def _save(self, request, response, sampler, stacks, duration, config):
+        if duration >= config['MIN_DURATION_SECONDS'] and stacks:
+            user = getattr(request, 'user', None)
+            response['X-Profile-Id'] = save_capture(stacks, {
+                'method': request.method,
+                'path': request.path,
+                'status': response.status_code,
+                'duration_ms': round(duration * 1000, 1),
+                'samples': sampler.samples,
+                'interval_ms': config['INTERVAL_SECONDS'] * 1000,
+                'user': user.get_username() if user is not None and user.is_authenticated else None,
+                'created_at': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+            }, config)
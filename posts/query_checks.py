@@ -0,0 +1,85 @@
+"""
+Проверки запросов для тестов: сколько SQL-запросов выполнил код и не ушёл ли
+план (EXPLAIN QUERY PLAN) в полный просмотр таблицы или сортировку без индекса.
+Планы разбираются в формате SQLite; на других СУБД проверки планов пропускаются.
+"""
+import re
+from contextlib import contextmanager
+
+from django.db import connections
+from django.test.utils import CaptureQueriesContext
+
+FULL_SCAN_RE = re.compile(r'\bSCAN (?:TABLE )?(\w+)(?!.*\bUSING\b.*\bINDEX\b)')
+TEMP_SORT_RE = re.compile(r'USE TEMP B-TREE FOR (ORDER BY|GROUP BY|DISTINCT)')
+
+
+def explain_sql(sql, using='default'):
+    """План выполнения уже подставленного SQL (как в captured_queries)."""
+    connection = connections[using]
+    connection.ensure_connection()
+    # курсор драйвера, а не Django: EXPLAIN не должен попадать в подсчёт запросов
+    cursor = connection.connection.cursor()
+    try:
+        cursor.execute('EXPLAIN QUERY PLAN ' + sql)
+        return '\n'.join(row[-1] for row in cursor.fetchall())
+    finally:
+        cursor.close()
+
+
+def plan_problems(plan, tables=None):
+    """Полные просмотры таблиц (из tables, если задано) и сортировки во временном B-дереве."""
+    problems = []
+    for line in plan.splitlines():
+        match = FULL_SCAN_RE.search(line)
+        if match and (tables is None or match.group(1) in tables):
+            problems.append(line.strip())
+        elif TEMP_SORT_RE.search(line):
+            problems.append(line.strip())
+    return problems
+
+
+class QueryAssertionsMixin:
+    """Примесь к django.test.TestCase."""
+
+    def _skip_unless_sqlite(self, using='default'):
+        if connections[using].vendor != 'sqlite':
+            self.skipTest("разбор планов реализован для SQLite")
+
+    @contextmanager
+    def assertMaxQueries(self, limit, using='default'):
+        with CaptureQueriesContext(connections[using]) as context:
+            yield context
+        executed = len(context.captured_queries)
+        if executed > limit:
+            queries = '\n'.join(f"{i}. {query['sql']}" for i, query in enumerate(context.captured_queries, 1))
+            self.fail(f"Выполнено {executed} запросов, ожидалось не больше {limit}:\n{queries}")
+
+    def assertUsesIndex(self, queryset, index_name):
+        self._skip_unless_sqlite(queryset.db)
+        plan = queryset.explain()
+        if index_name not in plan:
+            self.fail(f"Запрос не использует индекс {index_name}:\n{queryset.query}\n{plan}")
+
+    def assertEfficientPlan(self, queryset, tables=None):
+        self._skip_unless_sqlite(queryset.db)
+        plan = queryset.explain()
+        problems = plan_problems(plan, tables)
+        if problems:
+            self.fail(f"Неэффективный план:\n{queryset.query}\n" + '\n'.join(problems))
+
+    @contextmanager
+    def assertEfficientQueries(self, tables, using='default'):
+        """Все SELECT внутри блока обходятся без полного просмотра tables и сортировки без индекса."""
+        self._skip_unless_sqlite(using)
+        with CaptureQueriesContext(connections[using]) as context:
+            yield context
+        failures = []
+        for query in context.captured_queries:
+            sql = query['sql']
+            if not sql.lstrip().upper().startswith('SELECT'):
+                continue
+            problems = plan_problems(explain_sql(sql, using), tables)
+            if problems:
+                failures.append(f"{sql}\n  " + '\n  '.join(problems))
+        if failures:
+            self.fail("Неэффективные планы:\n" + '\n'.join(failures))
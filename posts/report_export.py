@@ -0,0 +1,266 @@
+"""
+Выгрузка отчётов по списку хэшей одним ответом: многостраничный PDF или ZIP
+с отчётом на каждый пост. Отчёты рендерятся пачками в пуле процессов, а ответ
+собирается по мере готовности пачек, поэтому память не растёт с числом отчётов.
+Под ASGI генератор ответа оборачивается в aiter_export: синхронный итератор
+StreamingHttpResponse Django сначала целиком собрал бы в список.
+
+Модуль импортируется процессами пула (spawn, без django.setup()), поэтому
+модели загружаются только внутри export_contexts.
+"""
+import io
+import multiprocessing
+import os
+import threading
+import zipfile
+import zlib
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+import PyPDF2
+from asgiref.sync import sync_to_async
+from PyPDF2.generic import ArrayObject, DictionaryObject, NameObject
+
+from .pdf_utils import REPORT_FIELDS, get_config, render_report_pdf, report_context, report_path
+
+FORMATS = ('pdf', 'zip')
+
+
+def export_contexts(hashes, chunk_size=500):
+    """Контексты отчётов самых свежих постов с этими хэшами (в порядке hashes) и список ненайденных."""
+    from .models import Post
+
+    hashes = list(dict.fromkeys(hashes))
+    newest = {}
+    for start in range(0, len(hashes), chunk_size):
+        posts = (
+            Post.objects.filter(sha256_hash__in=hashes[start:start + chunk_size])
+            .select_related('user').only('created_at', *REPORT_FIELDS)
+        )
+        for post in posts:
+            current = newest.get(post.sha256_hash)
+            if current is None or post.created_at > current.created_at:
+                newest[post.sha256_hash] = post
+    contexts = [report_context(newest[h]) for h in hashes if h in newest]
+    missing = [h for h in hashes if h not in newest]
+    return contexts, missing
+
+
+# Рендеринг (выполняется в процессах пула)
+
+def _report_bytes(context, cached_path):
+    if cached_path:
+        try:
+            with open(cached_path, 'rb') as f:
+                return f.read()
+        except FileNotFoundError:
+            pass
+    buffer = io.BytesIO()
+    render_report_pdf(context, buffer)
+    return buffer.getvalue()
+
+
+def _direct(obj):
+    """Копия объекта PDF без косвенных ссылок на исходный файл."""
+    obj = obj.get_object()
+    if isinstance(obj, DictionaryObject):
+        return DictionaryObject({NameObject(key): _direct(value) for key, value in obj.items()})
+    if isinstance(obj, ArrayObject):
+        return ArrayObject(_direct(value) for value in obj)
+    return obj
+
+
+def _serialize(obj):
+    """Объект PDF в синтаксисе PDF (как его пишет PyPDF2), а не repr Python."""
+    stream = io.BytesIO()
+    _direct(obj).write_to_stream(stream, None)
+    return stream.getvalue()
+
+
+def _page_parts(data):
+    """Сжатый поток содержимого первой страницы, её шрифты (BaseFont и Encoding в байтах PDF) и MediaBox."""
+    page = PyPDF2.PdfReader(io.BytesIO(data)).pages[0]
+    fonts = {}
+    for name, font in page['/Resources']['/Font'].items():
+        font = font.get_object()
+        encoding = font.get('/Encoding')
+        fonts[name] = (_serialize(font['/BaseFont']), _serialize(encoding) if encoding is not None else None)
+    content = zlib.compress(page.get_contents().get_data())
+    return content, fonts, [float(value) for value in page.mediabox]
+
+
+def _render_batch(tasks, fmt):
+    results = []
+    for context, cached_path in tasks:
+        data = _report_bytes(context, cached_path)
+        results.append(_page_parts(data) if fmt == 'pdf' else data)
+    return results
+
+
+_pool = None
+_pool_pid = None
+_pool_lock = threading.Lock()
+
+
+def _get_pool(workers):
+    global _pool, _pool_pid
+    with _pool_lock:
+        if _pool is None or _pool_pid != os.getpid():
+            _pool = ProcessPoolExecutor(workers, mp_context=multiprocessing.get_context('spawn'))
+            _pool_pid = os.getpid()
+        return _pool
+
+
+def _cached(context):
+    path = report_path(context)
+    return path if os.path.exists(path) else None
+
+
+def _iter_rendered(contexts, fmt):
+    """Результаты рендеринга в порядке contexts; в работе не больше 2 * WORKERS пачек."""
+    config = get_config()
+    batch_size = config['EXPORT_BATCH_SIZE']
+    batches = (
+        [(context, _cached(context)) for context in contexts[start:start + batch_size]]
+        for start in range(0, len(contexts), batch_size)
+    )
+    workers = config['EXPORT_WORKERS']
+    if not workers:
+        for batch in batches:
+            yield from _render_batch(batch, fmt)
+        return
+
+    pool = _get_pool(workers)
+    window = deque()
+    try:
+        for batch in batches:
+            window.append(pool.submit(_render_batch, batch, fmt))
+            if len(window) >= workers * 2:
+                yield from window.popleft().result()
+        while window:
+            yield from window.popleft().result()
+    finally:
+        # клиент оборвал загрузку: ещё не начатые пачки не рендерим
+        for future in window:
+            future.cancel()
+
+
+class PdfStreamWriter:
+    """
+    Многостраничный PDF, байты которого отдаются по мере добавления страниц:
+    страницы и шрифты пишутся сразу, дерево страниц, каталог и таблица xref —
+    в конце. В памяти остаются только смещения объектов и номера страниц.
+    """
+
+    CATALOG = 1
+    PAGES = 2
+
+    def __init__(self):
+        self.offsets = [0, 0, 0]
+        self.position = 0
+        self.fonts = {}
+        self.pages = []
+
+    def _write(self, data):
+        self.position += len(data)
+        return data
+
+    def _object(self, body, number=None):
+        if number is None:
+            number = len(self.offsets)
+            self.offsets.append(0)
+        self.offsets[number] = self.position
+        return self._write(b'%d 0 obj\n%s\nendobj\n' % (number, body))
+
+    def start(self):
+        return self._write(b'%PDF-1.4\n%\xe2\xe3\xcf\xd3\n')
+
+    def add_page(self, content, fonts, mediabox):
+        chunks = []
+        font_refs = []
+        for name, (base_font, encoding) in sorted(fonts.items()):
+            number = self.fonts.get((base_font, encoding))
+            if number is None:
+                body = b'<< /Type /Font /Subtype /Type1 /BaseFont ' + base_font
+                if encoding:
+                    body += b' /Encoding ' + encoding
+                chunks.append(self._object(body + b' >>'))
+                number = self.fonts[(base_font, encoding)] = len(self.offsets) - 1
+            font_refs.append(f'{name} {number} 0 R')
+
+        chunks.append(self._object(
+            b'<< /Length %d /Filter /FlateDecode >>\nstream\n%s\nendstream' % (len(content), content)))
+        contents = len(self.offsets) - 1
+        box = ' '.join(f'{value:g}' for value in mediabox)
+        chunks.append(self._object(
+            f'<< /Type /Page /Parent {self.PAGES} 0 R /MediaBox [{box}] '
+            f'/Resources << /Font << {" ".join(font_refs)} >> /ProcSet [/PDF /Text] >> '
+            f'/Contents {contents} 0 R >>'.encode('ascii')))
+        self.pages.append(len(self.offsets) - 1)
+        return b''.join(chunks)
+
+    def finish(self):
+        kids = ' '.join(f'{number} 0 R' for number in self.pages)
+        chunks = [
+            self._object(f'<< /Type /Pages /Kids [{kids}] /Count {len(self.pages)} >>'.encode('ascii'), self.PAGES),
+            self._object(f'<< /Type /Catalog /Pages {self.PAGES} 0 R >>'.encode('ascii'), self.CATALOG),
+        ]
+        xref_position = self.position
+        xref = [f'xref\n0 {len(self.offsets)}\n', '0000000000 65535 f \n']
+        xref.extend(f'{offset:010d} 00000 n \n' for offset in self.offsets[1:])
+        xref.append(f'trailer\n<< /Size {len(self.offsets)} /Root {self.CATALOG} 0 R >>\n')
+        xref.append(f'startxref\n{xref_position}\n%%EOF\n')
+        chunks.append(self._write(''.join(xref).encode('ascii')))
+        return b''.join(chunks)
+
+
+def iter_export_pdf(contexts):
+    writer = PdfStreamWriter()
+    yield writer.start()
+    for content, fonts, mediabox in _iter_rendered(contexts, 'pdf'):
+        yield writer.add_page(content, fonts, mediabox)
+    yield writer.finish()
+
+
+class _StreamSink:
+    """Файл для zipfile без seek: накапливает записанное до следующего drain()."""
+
+    def __init__(self):
+        self.chunks = []
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        data = b''.join(self.chunks)
+        self.chunks = []
+        return data
+
+
+def iter_export_zip(contexts, missing=()):
+    sink = _StreamSink()
+    with zipfile.ZipFile(sink, 'w', compression=zipfile.ZIP_DEFLATED) as archive:
+        for context, data in zip(contexts, _iter_rendered(contexts, 'zip')):
+            archive.writestr(f"report_{context['sha256_hash']}.pdf", data)
+            yield sink.drain()
+        if missing:
+            archive.writestr('missing.txt', '\n'.join(missing) + '\n')
+    yield sink.drain()
+
+
+async def aiter_export(chunks):
+    """Асинхронный итератор поверх генератора выгрузки: каждый кусок готовится в потоке и сразу уходит клиенту."""
+    chunks = iter(chunks)
+    try:
+        while True:
+            chunk = await sync_to_async(next, thread_sensitive=False)(chunks, None)
+            if chunk is None:
+                return
+            yield chunk
+    finally:
+        # клиент оборвал загрузку: закрываем генератор, чтобы отменить ещё не начатые пачки
+        await sync_to_async(chunks.close, thread_sensitive=False)()
@@ -0,0 +1,332 @@
+import json
+import os
+import tempfile
+
+import numpy as np
+
+
+def normalize(vectors):
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
+
+
+class VectorStore:
+    """Растущая непрерывная матрица векторов с массивом id и удалением за O(1)."""
+
+    def __init__(self, dim, capacity=1024):
+        self.dim = dim
+        self.size = 0
+        self.matrix = np.empty((capacity, dim), dtype=np.float32)
+        self.ids = np.empty(capacity, dtype=np.int64)
+        self.rows = {}
+
+    def __len__(self):
+        return self.size
+
+    def __contains__(self, item_id):
+        return item_id in self.rows
+
+    def _reserve(self, capacity):
+        if capacity <= self.matrix.shape[0]:
+            return
+        new_capacity = max(capacity, 2 * self.matrix.shape[0])
+        matrix = np.empty((new_capacity, self.dim), dtype=np.float32)
+        ids = np.empty(new_capacity, dtype=np.int64)
+        matrix[:self.size] = self.matrix[:self.size]
+        ids[:self.size] = self.ids[:self.size]
+        self.matrix, self.ids = matrix, ids
+
+    def add(self, item_id, vector):
+        row = self.rows.get(item_id)
+        if row is None:
+            self._reserve(self.size + 1)
+            row = self.size
+            self.size += 1
+            self.rows[item_id] = row
+            self.ids[row] = item_id
+        self.matrix[row] = vector
+
+    def extend(self, ids, vectors):
+        for item_id, vector in zip(ids.tolist(), vectors):
+            self.add(item_id, vector)
+
+    def remove(self, item_id):
+        row = self.rows.pop(item_id, None)
+        if row is None:
+            return False
+        last = self.size - 1
+        if row != last:
+            # переносим последнюю строку на место удалённой, чтобы матрица осталась непрерывной
+            moved_id = int(self.ids[last])
+            self.matrix[row] = self.matrix[last]
+            self.ids[row] = moved_id
+            self.rows[moved_id] = row
+        self.size = last
+        return True
+
+    def vectors(self):
+        return self.matrix[:self.size]
+
+    def item_ids(self):
+        return self.ids[:self.size]
+
+    def top_k(self, vector, k):
+        if not self.size:
+            return []
+        scores = self.vectors() @ vector
+        if k < self.size:
+            best = np.argpartition(-scores, k - 1)[:k]
+        else:
+            best = np.arange(self.size)
+        return [(float(scores[i]), int(self.ids[i])) for i in best]
+
+
+class SearchEngine:
+    """
+    Интерфейс движка поиска похожих эмбеддингов. Векторы хранятся
+    L2-нормированными, поэтому скалярное произведение равно косинусному сходству.
+    """
+
+    name = None
+
+    def __init__(self, dim):
+        self.dim = dim
+
+    def __len__(self):
+        raise NotImplementedError
+
+    def add(self, item_id, vector):
+        raise NotImplementedError
+
+    def remove(self, item_id):
+        raise NotImplementedError
+
+    def search(self, vector, k=1):
+        """Возвращает до k пар (similarity, item_id), отсортированных по убыванию сходства."""
+        raise NotImplementedError
+
+    def build(self, ids, vectors):
+        for item_id, vector in zip(np.asarray(ids).tolist(), normalize(vectors)):
+            self.add(item_id, vector)
+
+    def item_ids(self):
+        raise NotImplementedError
+
+    def state(self):
+        """Массивы и параметры для сохранения на диск."""
+        raise NotImplementedError
+
+    @classmethod
+    def from_state(cls, meta, arrays, **options):
+        raise NotImplementedError
+
+    def save(self, path, **extra_meta):
+        meta, arrays = self.state()
+        meta = dict(meta, engine=self.name, dim=self.dim, **extra_meta)
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=directory, suffix='.npz')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                np.savez(f, meta=np.array(json.dumps(meta)), **arrays)
+            os.replace(tmp_path, path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+
+def load_snapshot(path):
+    with np.load(path, allow_pickle=False) as data:
+        meta = json.loads(str(data['meta']))
+        arrays = {key: data[key] for key in data.files if key != 'meta'}
+    return meta, arrays
+
+
+class BruteForceEngine(SearchEngine):
+    """Точный поиск: одно умножение матрицы на вектор по всем постам."""
+
+    name = 'brute'
+
+    def __init__(self, dim, capacity=1024):
+        super().__init__(dim)
+        self.store = VectorStore(dim, capacity)
+
+    def __len__(self):
+        return len(self.store)
+
+    def add(self, item_id, vector):
+        self.store.add(item_id, normalize(vector))
+
+    def remove(self, item_id):
+        return self.store.remove(item_id)
+
+    def search(self, vector, k=1):
+        return sorted(self.store.top_k(normalize(vector), k), reverse=True)
+
+    def build(self, ids, vectors):
+        self.store = VectorStore(self.dim, max(len(ids), 1024))
+        self.store.extend(np.asarray(ids, dtype=np.int64), normalize(vectors))
+
+    def item_ids(self):
+        return self.store.item_ids()
+
+    def state(self):
+        return {}, {'ids': self.store.item_ids(), 'vectors': self.store.vectors()}
+
+    @classmethod
+    def from_state(cls, meta, arrays, **options):
+        engine = cls(meta['dim'])
+        engine.store = VectorStore(meta['dim'], max(len(arrays['ids']), 1024))
+        engine.store.extend(arrays['ids'], arrays['vectors'])
+        return engine
+
+
+class IVFEngine(SearchEngine):
+    """
+    Приближённый поиск (IVF): векторы разбиты сферическим k-means на nlist
+    кластеров, запрос сравнивается только со списками nprobe ближайших центроидов.
+    До обучения (меньше train_size векторов) работает как точный перебор.
+    """
+
+    name = 'ivf'
+
+    def __init__(self, dim, nlist=256, nprobe=16, train_size=10000, iterations=10, seed=0):
+        super().__init__(dim)
+        self.nlist = nlist
+        self.nprobe = nprobe
+        self.train_size = max(train_size, nlist)
+        self.iterations = iterations
+        self.seed = seed
+        self.centroids = None
+        self.lists = [VectorStore(dim)]
+        self.locate = {}
+
+    def __len__(self):
+        return len(self.locate)
+
+    @property
+    def trained(self):
+        return self.centroids is not None
+
+    def _assign(self, vectors, batch_size=65536):
+        labels = np.empty(len(vectors), dtype=np.int64)
+        for start in range(0, len(vectors), batch_size):
+            chunk = vectors[start:start + batch_size]
+            labels[start:start + batch_size] = np.argmax(chunk @ self.centroids.T, axis=1)
+        return labels
+
+    def _kmeans(self, vectors):
+        rng = np.random.default_rng(self.seed)
+        sample_size = min(len(vectors), self.nlist * 64)
+        sample = vectors[rng.choice(len(vectors), sample_size, replace=False)]
+        centroids = sample[rng.choice(sample_size, self.nlist, replace=False)].copy()
+        for _ in range(self.iterations):
+            labels = np.argmax(sample @ centroids.T, axis=1)
+            sums = np.zeros_like(centroids)
+            np.add.at(sums, labels, sample)
+            empty = np.bincount(labels, minlength=self.nlist) == 0
+            # пустые кластеры пересеиваем случайными точками выборки
+            sums[empty] = sample[rng.choice(sample_size, int(empty.sum()))]
+            centroids = normalize(sums)
+        return centroids
+
+    def _partition(self, ids, vectors):
+        labels = self._assign(vectors)
+        self.lists = []
+        self.locate = {}
+        counts = np.bincount(labels, minlength=self.nlist)
+        for cluster in range(self.nlist):
+            mask = labels == cluster
+            store = VectorStore(self.dim, max(int(counts[cluster]) * 2, 16))
+            store.extend(ids[mask], vectors[mask])
+            self.lists.append(store)
+        self.locate = dict(zip(ids.tolist(), labels.tolist()))
+
+    def train(self):
+        ids = self.item_ids()
+        vectors = np.concatenate([store.vectors() for store in self.lists]) if self.lists else np.empty((0, self.dim), np.float32)
+        if len(vectors) < self.nlist:
+            return False
+        self.centroids = self._kmeans(vectors)
+        self._partition(ids, vectors)
+        return True
+
+    def build(self, ids, vectors):
+        ids = np.asarray(ids, dtype=np.int64)
+        vectors = normalize(vectors).reshape(-1, self.dim)
+        self.centroids = None
+        self.lists = [VectorStore(self.dim, max(len(ids), 1024))]
+        self.lists[0].extend(ids, vectors)
+        self.locate = dict.fromkeys(ids.tolist(), 0)
+        if len(ids) >= self.train_size:
+            self.train()
+
+    def add(self, item_id, vector):
+        vector = normalize(vector)
+        if item_id in self.locate:
+            self.remove(item_id)
+        cluster = int(np.argmax(self.centroids @ vector)) if self.trained else 0
+        self.lists[cluster].add(item_id, vector)
+        self.locate[item_id] = cluster
+        if not self.trained and len(self.locate) >= self.train_size:
+            self.train()
+
+    def remove(self, item_id):
+        cluster = self.locate.pop(item_id, None)
+        if cluster is None:
+            return False
+        return self.lists[cluster].remove(item_id)
+
+    def search(self, vector, k=1):
+        vector = normalize(vector)
+        if not self.trained:
+            return sorted(self.lists[0].top_k(vector, k), reverse=True)
+        nprobe = min(self.nprobe, self.nlist)
+        probes = np.argpartition(-(self.centroids @ vector), nprobe - 1)[:nprobe]
+        results = []
+        for cluster in probes:
+            results.extend(self.lists[cluster].top_k(vector, k))
+        results.sort(reverse=True)
+        return results[:k]
+
+    def item_ids(self):
+        if not self.lists:
+            return np.empty(0, dtype=np.int64)
+        return np.concatenate([store.item_ids() for store in self.lists])
+
+    def state(self):
+        meta = {'nlist': self.nlist, 'nprobe': self.nprobe, 'train_size': self.train_size}
+        arrays = {
+            'ids': self.item_ids(),
+            'vectors': np.concatenate([store.vectors() for store in self.lists]),
+            'labels': np.concatenate([np.full(len(store), i, dtype=np.int64) for i, store in enumerate(self.lists)]),
+        }
+        if self.trained:
+            arrays['centroids'] = self.centroids
+        return meta, arrays
+
+    @classmethod
+    def from_state(cls, meta, arrays, **options):
+        params = {'nlist': meta['nlist'], 'nprobe': meta['nprobe'], 'train_size': meta['train_size']}
+        params.update(options)
+        engine = cls(meta['dim'], **params)
+        ids, vectors, labels = arrays['ids'], arrays['vectors'], arrays['labels']
+        if 'centroids' in arrays and engine.nlist == len(arrays['centroids']):
+            engine.centroids = arrays['centroids']
+            engine.lists = [VectorStore(engine.dim, max(int((labels == c).sum()) * 2, 16)) for c in range(engine.nlist)]
+            for cluster in range(engine.nlist):
+                mask = labels == cluster
+                engine.lists[cluster].extend(ids[mask], vectors[mask])
+            engine.locate = dict(zip(ids.tolist(), labels.tolist()))
+        else:
+            engine.build(ids, vectors)
+        return engine
+
+
+ENGINES = {
+    BruteForceEngine.name: BruteForceEngine,
+    IVFEngine.name: IVFEngine,
+}
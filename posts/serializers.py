@@ -6,9 +6,13 @@ class PostCreateSerializer(serializers.ModelSerializer):
         model = Post
         fields = [
             'id', 'title', 'type', 'content', 'image', 'document',
-            'status', 'similarity_score', 'sha256_hash'
+            'status', 'similarity_score', 'sha256_hash', 'chunk_matches',
+            'vote_count', 'comment_count'
+        ]
+        read_only_fields = [
+            'status', 'similarity_score', 'sha256_hash', 'chunk_matches',
+            'vote_count', 'comment_count'
         ]
-        read_only_fields = ['status', 'similarity_score', 'sha256_hash']
 
     def validate(self, data):
         post_type = data.get('type')
@@ -23,6 +27,19 @@ class PostCreateSerializer(serializers.ModelSerializer):
             raise serializers.ValidationError("Недопустимый тип поста.")
         return data
 
+class PostListSerializer(serializers.ModelSerializer):
+    """Строка ленты: без content и эмбеддингов (см. PostListView.LIST_FIELDS)."""
+
+    user = serializers.CharField(source='user.username', read_only=True)
+
+    class Meta:
+        model = Post
+        fields = [
+            'id', 'user', 'title', 'type', 'image', 'document',
+            'status', 'similarity_score', 'sha256_hash', 'vote_count', 'comment_count', 'created_at'
+        ]
+        read_only_fields = fields
+
 # serializers.py
 
 from .models import Vote, Comment
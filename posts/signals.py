@@ -0,0 +1,17 @@
+from django.db.models.signals import post_delete
+from django.dispatch import receiver
+
+from .models import Post
+
+
+@receiver(post_delete, sender=Post)
+def remove_post_from_indexes(sender, instance, **kwargs):
+    from . import chunking, embedding_index, image_hash
+
+    # индексы строятся лениво; если их ещё нет, то и удалять нечего
+    if embedding_index._index is not None:
+        embedding_index._index.remove(instance.pk)
+    if chunking._chunk_index is not None:
+        chunking._chunk_index.remove_post(instance.pk)
+    if image_hash._index is not None:
+        image_hash._index.remove(instance.pk)
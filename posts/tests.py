@@ -1,3 +1,1693 @@
-from django.test import TestCase
+import hashlib
+import json
+import multiprocessing
+import os
+import shutil
+import signal
+import tempfile
+import threading
+import time
+import zipfile
+from datetime import timedelta
+from io import BytesIO, StringIO
 
-# Create your tests here.
+from unittest import mock
+from urllib.parse import parse_qs, urlsplit
+
+from asgiref.sync import AsyncToSync, async_to_sync
+from django.apps import apps
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.exceptions import MiddlewareNotUsed
+from django.core.management import CommandError, call_command
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import InMemoryUploadedFile, SimpleUploadedFile, TemporaryUploadedFile
+from django.core.signals import request_started
+from django.http import HttpResponse
+import PyPDF2
+from PyPDF2.generic import ArrayObject, DictionaryObject, NameObject, NumberObject
+from django.db import connection
+from django.db.migrations.executor import MigrationExecutor
+from django.urls import path, reverse
+from django.test import AsyncClient, Client, RequestFactory, TestCase, TransactionTestCase, override_settings
+from django.utils import timezone
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import AccessToken
+
+import numpy as np
+from PIL import Image, ImageDraw
+from reportlab.pdfgen import canvas
+
+from . import blockchain_utils, bloom, ingestion_queue, utils
+from .chunking import CHUNK_ID_BASE, ChunkIndex, chunk_item_id, get_config as get_chunking_config, split_into_chunks
+from .embedding_cache import EmbeddingCache
+from .embedding_codec import HEADER, pack_embedding, pack_embeddings, unpack_embedding, unpack_embeddings
+from .embedding_index import EmbeddingIndex
+from .embedding_service import EmbeddingBatcher
+from .model_registry import ModelRegistry
+from .search_engines import BruteForceEngine, IVFEngine, load_snapshot, normalize
+from .async_views import offloaded, post_comments, post_list, post_verify
+
+from .blockchain_utils import (
+    Ledger, get_config as get_ledger_config, get_ledger, is_hash_recorded, save_to_blockchain, verify_chain,
+)
+from .bloom import get_config as get_verification_config
+from .merkle import build_levels, inclusion_proof, leaf_hash, merkle_root, verify_proof
+from .metrics import POST_STAGE_SECONDS, Histogram, REGISTRY, stage, track_stages
+from .image_hash import (
+    ALGORITHMS, HASH_BITS, ImageHashIndex, MultiIndexHash, classify_distance, hamming, image_hash, to_hex,
+)
+from .ingestion import STAGES, analyze_content, finalize_post
+from .minhash import (
+    band_buckets, find_candidates, index_signature, is_near_duplicate, minhash_signature, pack_signature,
+    stats as lsh_stats,
+)
+from .models import Comment, IngestionJob, LSHBucket, Post
+from .profiling import (
+    SamplingProfilerMiddleware, StackSampler, capture_path, get_config as get_profiling_config, save_capture,
+)
+from .pdf_utils import ensure_report, get_config as get_reports_config, report_context
+from .report_export import _render_batch
+from .query_checks import QueryAssertionsMixin, plan_problems
+from .uploads import file_sha256, text_sha256
+
+
+def no_bloom():
+    return override_settings(HASH_VERIFICATION={**get_verification_config(), 'BLOOM_ENABLED': False})
+
+
+class PlanParsingTests(TestCase):
+    def test_full_scan_and_temp_sort_are_reported(self):
+        plan = "SCAN posts_post\nUSE TEMP B-TREE FOR ORDER BY"
+        self.assertEqual(len(plan_problems(plan)), 2)
+
+    def test_index_scan_is_not_reported(self):
+        plan = "SCAN posts_post USING INDEX post_created_idx\nSEARCH auth_user USING INTEGER PRIMARY KEY (rowid=?)"
+        self.assertEqual(plan_problems(plan), [])
+
+    def test_only_listed_tables_are_checked(self):
+        self.assertEqual(plan_problems("SCAN django_migrations", tables={'posts_post'}), [])
+
+
+class HotLookupQueryTests(QueryAssertionsMixin, TestCase):
+    """Поиск по хэшу, лента и комментарии должны идти по индексам из 0012_lookup_indexes."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = get_user_model().objects.create_user('reader', password='pass')
+        cls.posts = Post.objects.bulk_create([
+            Post(user=cls.user, title=f'post {i}', type='text', content=f'text {i}',
+                 sha256_hash=f'{i:064x}', status='original')
+            for i in range(30)
+        ])
+        cls.post = cls.posts[0]
+        Comment.objects.bulk_create([
+            Comment(post=post, user=cls.user, text=f'comment {i}')
+            for post in cls.posts[:3] for i in range(10)
+        ])
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_hash_lookup_uses_index(self):
+        queryset = Post.objects.filter(sha256_hash=self.post.sha256_hash).order_by('-created_at')[:1]
+        self.assertUsesIndex(queryset, 'post_hash_created_idx')
+        self.assertEfficientPlan(queryset)
+
+    def test_feed_ordering_uses_index(self):
+        queryset = Post.objects.order_by('-created_at')[:20]
+        self.assertUsesIndex(queryset, 'post_created_idx')
+        self.assertEfficientPlan(queryset)
+
+    def test_comment_listing_uses_index(self):
+        queryset = Comment.objects.filter(post_id=self.post.pk).order_by('created_at')
+        self.assertUsesIndex(queryset, 'comment_post_created_idx')
+        self.assertEfficientPlan(queryset)
+
+    def test_verify_view(self):
+        with no_bloom(), self.assertMaxQueries(1), self.assertEfficientQueries({'posts_post'}):
+            response = self.client.get('/api/posts/verify/', {'hash': self.post.sha256_hash})
+        self.assertTrue(response.data['exists'])
+
+    def test_batch_verify_runs_one_query_per_chunk(self):
+        hashes = [post.sha256_hash for post in self.posts[:25]] + ['f' * 64]
+        config = {**get_verification_config(), 'BLOOM_ENABLED': False, 'IN_CHUNK_SIZE': 10}
+        with override_settings(HASH_VERIFICATION=config), self.assertMaxQueries(3), \
+                self.assertEfficientQueries({'posts_post'}):
+            response = self.client.post('/api/posts/verify/batch/', {'hashes': hashes}, format='json')
+        self.assertEqual(response.data['found'], 25)
+
+    def test_comment_list_query_count_does_not_grow(self):
+        with self.assertMaxQueries(1), self.assertEfficientQueries({'posts_comment'}):
+            response = self.client.get(f'/api/posts/{self.post.pk}/comments/')
+        self.assertEqual(len(response.data), 10)
+
+
+class PostListTests(QueryAssertionsMixin, TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        user = get_user_model().objects.create_user('author', password='pass')
+        Post.objects.bulk_create([
+            Post(user=user, title=f'post {i}', type='text', content='x' * 1000,
+                 sha256_hash=f'{i:064x}', status='original')
+            for i in range(25)
+        ])
+        # одинаковое время у части постов: порядок внутри задаёт id
+        Post.objects.filter(id__in=list(Post.objects.values_list('id', flat=True)[5:15])).update(
+            created_at=Post.objects.order_by('id').values_list('created_at', flat=True)[5]
+        )
+
+    def test_cursor_walks_every_post_once(self):
+        expected = list(Post.objects.order_by('-created_at', '-id').values_list('id', flat=True))
+        seen = []
+        url = '/api/posts/?page_size=7'
+        while url:
+            response = self.client.get(url)
+            seen.extend(post['id'] for post in response.data['results'])
+            url = response.data['next']
+        self.assertEqual(seen, expected)
+
+    def test_page_is_one_lean_indexed_query(self):
+        first = self.client.get('/api/posts/?page_size=5')
+        with self.assertMaxQueries(1) as context, self.assertEfficientQueries({'posts_post'}):
+            response = self.client.get(first.data['next'])
+        self.assertEqual(len(response.data['results']), 5)
+        self.assertNotIn('content', response.data['results'][0])
+        self.assertNotIn('"posts_post"."content"', context.captured_queries[0]['sql'])
+
+    def test_invalid_cursor(self):
+        self.assertEqual(self.client.get('/api/posts/', {'cursor': 'bogus'}).status_code, 404)
+
+
+class PostCounterTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        User = get_user_model()
+        cls.author = User.objects.create_user('author', password='pass')
+        cls.reader = User.objects.create_user('reader', password='pass')
+        cls.post = Post.objects.create(user=cls.author, title='post', type='text', content='text',
+                                       sha256_hash='a' * 64, status='original')
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.reader)
+
+    def test_repeated_vote_counts_once(self):
+        first = self.client.post(f'/api/posts/{self.post.pk}/vote/')
+        second = self.client.post(f'/api/posts/{self.post.pk}/vote/')
+        self.assertEqual((first.data['vote_count'], second.data['vote_count']), (1, 1))
+        self.assertEqual(second.data['message'], "Already voted")
+
+    def test_comment_create_and_delete_update_count(self):
+        response = self.client.post(f'/api/posts/{self.post.pk}/comments/add/', {'text': 'hi'}, format='json')
+        self.client.post(f'/api/posts/{self.post.pk}/comments/add/', {'text': 'again'}, format='json')
+        self.client.delete(f"/api/posts/comments/{response.data['id']}/delete/")
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.comment_count, 1)
+        self.assertEqual(self.client.get('/api/posts/').data['results'][0]['comment_count'], 1)
+
+    def test_post_endpoint_only_deletes(self):
+        url = reverse('post-delete', args=[self.post.pk])
+        anonymous = APIClient().get(url)
+        self.assertEqual(anonymous.status_code, 401)
+        self.assertNotIn(b'"content"', anonymous.content)
+        self.assertEqual(self.client.get(url).status_code, 405)
+        self.assertEqual(self.client.delete(url).status_code, 403)
+
+        author = APIClient()
+        author.force_authenticate(self.author)
+        self.assertEqual(author.delete(url).status_code, 204)
+        self.assertFalse(Post.objects.filter(pk=self.post.pk).exists())
+
+    def test_reconcile_fixes_drift(self):
+        Comment.objects.create(post=self.post, user=self.reader, text='added behind the API')
+        Post.objects.filter(pk=self.post.pk).update(vote_count=5)
+        call_command('reconcile_post_counters', stdout=StringIO())
+        self.post.refresh_from_db()
+        self.assertEqual((self.post.vote_count, self.post.comment_count), (0, 1))
+
+
+class PostReportTests(QueryAssertionsMixin, TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = get_user_model().objects.create_user('author', password='pass')
+        cls.post = Post.objects.create(user=cls.user, title='post', type='text', content='text',
+                                       sha256_hash='c' * 64, status='original', similarity_score=0.1)
+
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+        settings_override = override_settings(MEDIA_ROOT=media_root)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.url = f'/api/posts/report/?hash={self.post.sha256_hash}'
+
+    def test_report_is_one_query_and_revalidates_with_etag(self):
+        with self.assertMaxQueries(1):
+            response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        body = b''.join(response.streaming_content)
+        self.assertTrue(body.startswith(b'%PDF'))
+
+        repeat = self.client.get(self.url, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(repeat.status_code, 304)
+
+        partial = self.client.get(self.url, HTTP_RANGE='bytes=0-3')
+        self.assertEqual(partial.status_code, 206)
+        self.assertEqual(b''.join(partial.streaming_content), b'%PDF')
+        self.assertEqual(partial['Content-Range'], f'bytes 0-3/{len(body)}')
+        self.assertEqual(self.client.get(self.url, HTTP_RANGE=f'bytes={len(body)}-').status_code, 416)
+
+    def test_status_change_produces_new_report(self):
+        first = self.client.get(self.url)
+        Post.objects.filter(pk=self.post.pk).update(status='copy')
+        second = self.client.get(self.url, HTTP_IF_NONE_MATCH=first['ETag'])
+        self.assertEqual(second.status_code, 200)
+        self.assertNotEqual(first['ETag'], second['ETag'])
+
+    def test_report_is_written_once(self):
+        post = Post.objects.select_related('user').get(pk=self.post.pk)
+        path, _ = ensure_report(report_context(post))
+        mtime = os.stat(path).st_mtime_ns
+        self.assertEqual(ensure_report(report_context(post))[0], path)
+        self.assertEqual(os.stat(path).st_mtime_ns, mtime)
+
+    def test_bulk_export_streams_pdf_and_zip(self):
+        other = Post.objects.create(user=self.user, title='other', type='text', content='text',
+                                    sha256_hash='d' * 64, status='copy', similarity_score=0.9)
+        hashes = [self.post.sha256_hash, other.sha256_hash, 'e' * 64]
+        with override_settings(REPORTS={**get_reports_config(), 'EXPORT_WORKERS': 0}):
+            pdf = self.client.post('/api/posts/report/export/', {'hashes': hashes, 'format': 'pdf'}, format='json')
+            archive = self.client.post('/api/posts/report/export/', {'hashes': hashes}, format='json')
+
+        self.assertTrue(pdf.streaming)
+        pages = PyPDF2.PdfReader(BytesIO(b''.join(pdf.streaming_content)), strict=True).pages
+        self.assertEqual([page.extract_text().splitlines()[1] for page in pages], ['Title: post', 'Title: other'])
+        self.assertEqual(pdf['X-Missing-Count'], '1')
+
+        names = zipfile.ZipFile(BytesIO(b''.join(archive.streaming_content))).namelist()
+        self.assertEqual(names, [f'report_{"c" * 64}.pdf', f'report_{"d" * 64}.pdf', 'missing.txt'])
+
+    def test_bulk_export_keeps_dictionary_font_encoding(self):
+        # отчёт из кэша со шрифтом, у которого Encoding — косвенный словарь с /Differences
+        path, _ = ensure_report(report_context(self.post))
+        source = PyPDF2.PdfReader(path)
+        writer = PyPDF2.PdfWriter()
+        writer.add_page(source.pages[0])
+        font = writer.pages[0]['/Resources']['/Font']['/F1'].get_object()
+        font[NameObject('/Encoding')] = writer._add_object(DictionaryObject({
+            NameObject('/Type'): NameObject('/Encoding'),
+            NameObject('/BaseEncoding'): NameObject('/WinAnsiEncoding'),
+            NameObject('/Differences'): ArrayObject([NumberObject(128), NameObject('/Euro'), NameObject('/bullet')]),
+        }))
+        with open(path, 'wb') as f:
+            writer.write(f)
+
+        with override_settings(REPORTS={**get_reports_config(), 'EXPORT_WORKERS': 0}):
+            response = self.client.post('/api/posts/report/export/',
+                                        {'hashes': [self.post.sha256_hash], 'format': 'pdf'}, format='json')
+        page = PyPDF2.PdfReader(BytesIO(b''.join(response.streaming_content)), strict=True).pages[0]
+        encoding = page['/Resources']['/Font']['/F1'].get_object()['/Encoding'].get_object()
+        self.assertEqual(encoding['/BaseEncoding'], '/WinAnsiEncoding')
+        self.assertEqual(list(encoding['/Differences']), [128, '/Euro', '/bullet'])
+        self.assertEqual(page.extract_text().splitlines()[1], 'Title: post')
+
+    async def test_bulk_export_streams_under_asgi(self):
+        others = [
+            await Post.objects.acreate(user=self.user, title=f'other {i}', type='text', content='text',
+                                       sha256_hash=f'{i:064x}', status='copy', similarity_score=0.9)
+            for i in range(3)
+        ]
+        hashes = [post.sha256_hash for post in [self.post, *others]]
+        rendered = []
+
+        def render_batch(batch, fmt):
+            rendered.extend(batch)
+            return _render_batch(batch, fmt)
+
+        with override_settings(REPORTS={**get_reports_config(), 'EXPORT_WORKERS': 0, 'EXPORT_BATCH_SIZE': 1}), \
+                mock.patch('posts.report_export._render_batch', render_batch):
+            response = await AsyncClient().post(
+                '/api/posts/report/export/', {'hashes': hashes, 'format': 'pdf'}, content_type='application/json',
+                headers={'Authorization': f'Bearer {AccessToken.for_user(self.user)}'})
+            self.assertTrue(response.is_async)
+            chunks = aiter(response.streaming_content)
+            first = await anext(chunks)
+            # первый кусок ушёл раньше, чем отрендерены все отчёты
+            self.assertTrue(first.startswith(b'%PDF'))
+            self.assertLess(len(rendered), len(hashes))
+            body = first + b''.join([chunk async for chunk in chunks])
+        self.assertEqual(len(rendered), len(hashes))
+        self.assertEqual(len(PyPDF2.PdfReader(BytesIO(body), strict=True).pages), len(hashes))
+
+
+class MetricsTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = get_user_model().objects.create_user('author', password='pass')
+        Post.objects.create(user=cls.user, title='post', type='text', content='text',
+                            sha256_hash='f' * 64, status='original')
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_histogram_exposition(self):
+        histogram = Histogram('test_seconds', "Тест", ['stage'], buckets=[0.1, 1.0])
+        self.addCleanup(REGISTRY.remove, histogram)
+        for value in (0.05, 0.5, 5):
+            histogram.observe(value, stage='a"b')
+        self.assertEqual(histogram.render().splitlines()[2:], [
+            'test_seconds_bucket{stage="a\\"b",le="0.1"} 1',
+            'test_seconds_bucket{stage="a\\"b",le="1.0"} 2',
+            'test_seconds_bucket{stage="a\\"b",le="+Inf"} 3',
+            'test_seconds_sum{stage="a\\"b"} 5.55',
+            'test_seconds_count{stage="a\\"b"} 3',
+        ])
+
+    def test_repeated_stage_is_observed_once_per_post(self):
+        before = POST_STAGE_SECONDS.count(stage='encode', type='document')
+        with track_stages('document'):
+            with stage('encode'):
+                pass
+            with stage('encode'):
+                pass
+        self.assertEqual(POST_STAGE_SECONDS.count(stage='encode', type='document'), before + 1)
+
+    @override_settings(INTERNAL_IPS=['127.0.0.1'])
+    def test_endpoint_reports_verify_lookups(self):
+        self.client.get(f'/api/posts/verify/?hash={"f" * 64}')
+        body = self.client.get('/metrics/').content.decode()
+        self.assertIn('hash_verify_request_seconds_count{endpoint="single"}', body)
+        self.assertRegex(body, r'hash_verify_lookups_total\{result="found"\} [1-9]')
+
+    def test_disabled_and_token(self):
+        with override_settings(METRICS={'ENABLED': False}):
+            self.assertEqual(self.client.get('/metrics/').status_code, 404)
+        with override_settings(METRICS={'TOKEN': 'secret'}, INTERNAL_IPS=['127.0.0.1']):
+            self.assertEqual(self.client.get('/metrics/').status_code, 401)
+            self.assertEqual(self.client.get('/metrics/', HTTP_AUTHORIZATION='Bearer secret').status_code, 200)
+
+    def test_without_token_only_debug_or_internal_ips(self):
+        with override_settings(METRICS={'TOKEN': None}, INTERNAL_IPS=[]):
+            self.assertEqual(self.client.get('/metrics/').status_code, 403)
+            self.assertEqual(self.client.get('/metrics/', HTTP_AUTHORIZATION='Bearer anything').status_code, 403)
+            with override_settings(DEBUG=True):
+                self.assertEqual(self.client.get('/metrics/').status_code, 200)
+        with override_settings(METRICS={'TOKEN': None}, INTERNAL_IPS=['10.0.0.5']):
+            self.assertEqual(self.client.get('/metrics/', REMOTE_ADDR='10.0.0.5').status_code, 200)
+            self.assertEqual(self.client.get('/metrics/', REMOTE_ADDR='203.0.113.7').status_code, 403)
+
+
+def sync_probe(request):
+    time.sleep(0.05)
+    return HttpResponse(b'sync')
+
+
+async def async_probe(request):
+    # блокирует цикл событий, чтобы сэмплер застал этот кадр
+    time.sleep(0.05)
+    return HttpResponse(b'async')
+
+
+urlpatterns = [
+    path('api/probe/sync/', sync_probe),
+    path('api/probe/async/', async_probe),
+    path('api/probe/feed/', post_list),
+]
+
+
+def profiled_settings():
+    return override_settings(
+        ROOT_URLCONF='posts.tests',
+        PROFILING={**get_profiling_config(), 'ENABLED': True},
+        MIDDLEWARE=[*settings.MIDDLEWARE, 'posts.profiling.SamplingProfilerMiddleware'],
+        INTERNAL_IPS=['127.0.0.1'],
+    )
+
+
+class ProfilingTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        User = get_user_model()
+        cls.staff = User.objects.create_user('staff', password='pass', is_staff=True)
+        cls.user = User.objects.create_user('user', password='pass')
+
+    def setUp(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        settings_override = override_settings(PROFILING={'DIR': directory, 'MAX_CAPTURES': 2})
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.client = APIClient()
+
+    def test_sampler_sees_request_thread_stack(self):
+        sampler = StackSampler(threading.get_ident(), 0.001).start()
+        time.sleep(0.05)
+        stacks = sampler.stop()
+        self.assertTrue(any('test_sampler_sees_request_thread_stack' in stack for stack in stacks))
+
+    def test_ring_buffer_and_staff_only_views(self):
+        ids = [save_capture({f'view;step{i}': 3}, {'path': f'/api/{i}/'}) for i in range(3)]
+
+        self.client.force_authenticate(self.user)
+        self.assertEqual(self.client.get('/api/posts/profiles/').status_code, 403)
+
+        self.client.force_authenticate(self.staff)
+        listed = self.client.get('/api/posts/profiles/').data
+        self.assertEqual([capture['id'] for capture in listed], ids[:0:-1])
+        response = self.client.get(f'/api/posts/profiles/{ids[2]}/')
+        self.assertEqual(b''.join(response.streaming_content), b'view;step2 3\n')
+        self.assertEqual(self.client.get(f'/api/posts/profiles/{ids[0]}/').status_code, 404)
+
+    def test_header_without_token_works_only_for_internal_ips(self):
+        def profiled(**extra):
+            return 'X-Profile-Id' in Client().get('/api/probe/sync/', **extra)
+
+        outside = {'REMOTE_ADDR': '203.0.113.5'}
+        with profiled_settings():
+            self.assertTrue(profiled(HTTP_X_PROFILE='1'))
+            self.assertFalse(profiled(HTTP_X_PROFILE='1', **outside))
+            with override_settings(DEBUG=True):
+                self.assertTrue(profiled(HTTP_X_PROFILE='1', **outside))
+            # с токеном решает только его значение
+            with override_settings(PROFILING={**get_profiling_config(), 'TOKEN': 'secret'}):
+                self.assertFalse(profiled(HTTP_X_PROFILE='1'))
+                self.assertTrue(profiled(HTTP_X_PROFILE='secret', **outside))
+
+    def test_middleware_is_not_used_when_disabled(self):
+        with self.assertRaises(MiddlewareNotUsed):
+            SamplingProfilerMiddleware(sync_probe)
+
+    def test_sync_and_async_requests_are_profiled(self):
+        with profiled_settings():
+            sync_response = Client().get('/api/probe/sync/', HTTP_X_PROFILE='1')
+            async_response = async_to_sync(AsyncClient().get)('/api/probe/async/', headers={'X-Profile': '1'})
+            plain = Client().get('/api/probe/sync/')
+        self.assertNotIn('X-Profile-Id', plain)
+        for response, frame in ((sync_response, 'sync_probe'), (async_response, 'async_probe')):
+            with open(capture_path(response['X-Profile-Id']), encoding='utf-8') as f:
+                self.assertIn(frame, f.read())
+
+
+class AsyncViewsTests(TestCase):
+    """Async-представления отвечают так же, как DRF-представления по тем же путям."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = get_user_model().objects.create_user('reader', password='pass')
+        cls.posts = Post.objects.bulk_create([
+            Post(user=cls.user, title=f'пост {i}', type='text', content=f'text {i}',
+                 sha256_hash=f'{i:064x}', status='original')
+            for i in range(7)
+        ])
+        Comment.objects.bulk_create([Comment(post=cls.posts[0], user=cls.user, text=f'c {i}') for i in range(3)])
+
+    def setUp(self):
+        # фильтр Блума строится заново по данным этого теста
+        patcher = mock.patch.object(bloom, '_filter', None)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.auth = f'Bearer {AccessToken.for_user(self.user)}'
+        self.client = APIClient()
+        self.factory = RequestFactory()
+
+    def assertSameResponse(self, view, path, params=None, auth=None, **kwargs):
+        expected = self.client.get(path, params, HTTP_AUTHORIZATION=auth) if auth else self.client.get(path, params)
+        headers = {'HTTP_AUTHORIZATION': auth} if auth else {}
+        response = async_to_sync(view)(self.factory.get(path, params, **headers), **kwargs)
+        self.assertEqual(response.status_code, expected.status_code)
+        self.assertEqual(response.content, expected.content)
+        return response
+
+    def test_verify(self):
+        self.assertSameResponse(post_verify, '/api/posts/verify/', {'hash': self.posts[3].sha256_hash}, self.auth)
+        self.assertSameResponse(post_verify, '/api/posts/verify/', {'hash': 'f' * 64}, self.auth)
+        self.assertSameResponse(post_verify, '/api/posts/verify/', {}, self.auth)
+        self.assertSameResponse(post_verify, '/api/posts/verify/', {'hash': 'f' * 64}, 'Bearer broken')
+        response = self.assertSameResponse(post_verify, '/api/posts/verify/', {'hash': 'f' * 64})
+        self.assertEqual(response.status_code, 401)
+        self.assertEqual(response['WWW-Authenticate'], 'Bearer realm="api"')
+
+    def test_verify_sees_posts_created_after_filter(self):
+        async_to_sync(post_verify)(self.factory.get('/api/posts/verify/', {'hash': 'f' * 64}, HTTP_AUTHORIZATION=self.auth))
+        Post.objects.create(user=self.user, title='new', type='text', sha256_hash='e' * 64, status='original')
+        response = self.assertSameResponse(post_verify, '/api/posts/verify/', {'hash': 'e' * 64}, self.auth)
+        self.assertIn(b'"exists":true', response.content)
+
+    def test_list_pages_and_comments(self):
+        first = json.loads(self.assertSameResponse(post_list, '/api/posts/', {'page_size': 3}).content)
+        cursor = parse_qs(urlsplit(first['next']).query)['cursor'][0]
+        self.assertSameResponse(post_list, '/api/posts/', {'page_size': 3, 'cursor': cursor})
+        self.assertSameResponse(post_list, '/api/posts/', {'cursor': 'bogus'})
+        pk = self.posts[0].pk
+        self.assertSameResponse(post_comments, f'/api/posts/{pk}/comments/', auth=self.auth, pk=pk)
+
+    def test_offloaded_view_runs_in_pool(self):
+        def view(request):
+            return HttpResponse(threading.current_thread().name)
+
+        response = async_to_sync(offloaded(view))(self.factory.get('/'))
+        self.assertTrue(response.content.startswith(b'offload'))
+
+    async def test_async_view_runs_without_async_to_sync(self):
+        # вся цепочка middleware вместе с профилировщиком должна быть async-совместимой,
+        # иначе Django оборачивает её в async_to_sync и запрос занимает поток
+        calls = []
+        call = AsyncToSync.__call__
+
+        def recording_call(adapter, *args, **kwargs):
+            calls.append(adapter.awaitable)
+            return call(adapter, *args, **kwargs)
+
+        with profiled_settings(), mock.patch.object(AsyncToSync, '__call__', recording_call):
+            response = await AsyncClient().get('/api/probe/feed/', headers={'X-Profile': '1'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(json.loads(response.content)['results']), 7)
+        self.assertEqual(calls, [])
+
+
+def exact_top_k(ids, vectors, query, k):
+    """Эталон: косинусное сходство со всеми векторами и сортировка."""
+    scores = normalize(vectors) @ normalize(query)
+    order = np.argsort(-scores, kind='stable')[:k]
+    return [int(ids[i]) for i in order], scores[order]
+
+
+class SearchEngineTests(TestCase):
+    def setUp(self):
+        rng = np.random.default_rng(0)
+        self.ids = np.arange(1, 301, dtype=np.int64)
+        self.vectors = rng.normal(size=(300, 16)).astype(np.float32)
+        self.queries = rng.normal(size=(20, 16)).astype(np.float32)
+
+    def assertMatchesReference(self, engine, ids, vectors, k=5):
+        for query in self.queries:
+            expected_ids, expected_scores = exact_top_k(ids, vectors, query, k)
+            results = engine.search(query, k)
+            self.assertEqual([item_id for _, item_id in results], expected_ids)
+            np.testing.assert_allclose([score for score, _ in results], expected_scores, rtol=1e-5)
+
+    def test_brute_force_matches_reference(self):
+        engine = BruteForceEngine(16)
+        engine.build(self.ids, self.vectors)
+        self.assertMatchesReference(engine, self.ids, self.vectors)
+
+        for item_id in self.ids[::3].tolist():
+            engine.remove(item_id)
+        keep = np.ones(len(self.ids), dtype=bool)
+        keep[::3] = False
+        self.assertEqual(len(engine), int(keep.sum()))
+        self.assertMatchesReference(engine, self.ids[keep], self.vectors[keep])
+
+    def test_ivf_probing_every_list_is_exact(self):
+        engine = IVFEngine(16, nlist=8, nprobe=8, train_size=100)
+        engine.build(self.ids, self.vectors)
+        self.assertTrue(engine.trained)
+        self.assertMatchesReference(engine, self.ids, self.vectors)
+
+    def test_ivf_recall_at_configured_nprobe(self):
+        # параметры движка — как в настройках (OPTIONS поверх значений по умолчанию)
+        options = {'train_size': 0, **settings.SIMILARITY_SEARCH.get('OPTIONS', {})}
+        rng = np.random.default_rng(1)
+        centers = rng.standard_normal((500, 64), dtype=np.float32)
+        vectors = normalize(centers[rng.integers(0, 500, 20000)] + rng.standard_normal((20000, 64), dtype=np.float32))
+        ids = np.arange(1, 20001, dtype=np.int64)
+        picked = rng.choice(20000, 100, replace=False)
+        # запросы — зашумлённые копии постов, как у дубликатов
+        queries = normalize(vectors[picked] + rng.standard_normal((100, 64), dtype=np.float32) * 0.02)
+
+        exact = BruteForceEngine(64)
+        exact.build(ids, vectors)
+        engine = IVFEngine(64, **options)
+        engine.build(ids, vectors)
+        self.assertTrue(engine.trained)
+        hits = [engine.search(query, 1)[0][1] == exact.search(query, 1)[0][1] for query in queries]
+        self.assertGreaterEqual(np.mean(hits), 0.95)
+
+    def test_snapshot_round_trip_returns_identical_results(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        for engine in (BruteForceEngine(16), IVFEngine(16, nlist=8, nprobe=2, train_size=100)):
+            engine.build(self.ids, self.vectors)
+            engine.remove(int(self.ids[0]))
+            path = os.path.join(directory, f'{engine.name}.npz')
+            engine.save(path, last_id=300)
+            meta, arrays = load_snapshot(path)
+            restored = type(engine).from_state(meta, arrays)
+            self.assertEqual(meta['last_id'], 300)
+            self.assertEqual(len(restored), len(engine))
+            for query in self.queries:
+                self.assertEqual(restored.search(query, 5), engine.search(query, 5))
+
+
+@override_settings(EMBEDDING_STORAGE_DTYPE='float32')
+class EmbeddingIndexSyncTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = get_user_model().objects.create_user('author', password='pass')
+
+    def create_post(self, vector):
+        return Post.objects.create(user=self.user, title='post', type='text', content='text', sha256_hash='0' * 64,
+                                   status='original', embedding_vector=pack_embedding(vector))
+
+    def test_deletes_from_other_process_are_pruned_on_sync(self):
+        vectors = np.eye(4, dtype=np.float32)
+        posts = [self.create_post(vector) for vector in vectors]
+        # индекс «другого воркера»: сигнал post_delete его не видит
+        index = EmbeddingIndex(prune_check_seconds=0)
+        index.sync()
+        self.assertEqual(index.max_similarity(vectors[1])[1], posts[1].pk)
+
+        Post.objects.filter(pk=posts[1].pk).delete()
+        fresh = self.create_post(vectors[2])
+        Post.objects.filter(pk=fresh.pk).delete()  # догружен не будет, но и сверку не сбивает
+        newest = self.create_post(vectors[3])
+        index.sync()
+
+        self.assertEqual(sorted(index.engine.item_ids().tolist()), [posts[0].pk, posts[2].pk, posts[3].pk, newest.pk])
+        self.assertNotEqual(index.max_similarity(vectors[1])[1], posts[1].pk)
+
+    def test_deleted_after_sync_before_next_check(self):
+        posts = [self.create_post(vector) for vector in np.eye(3, dtype=np.float32)]
+        index = EmbeddingIndex(prune_check_seconds=0)
+        index.sync()
+        late = self.create_post(np.ones(3, dtype=np.float32))
+        index.sync()
+        Post.objects.filter(pk=late.pk).delete()
+        index.sync()
+        self.assertEqual(sorted(index.engine.item_ids().tolist()), [post.pk for post in posts])
+
+    def test_prune_check_is_throttled(self):
+        posts = [self.create_post(vector) for vector in np.eye(2, dtype=np.float32)]
+        index = EmbeddingIndex(prune_check_seconds=3600)
+        index.sync()
+        Post.objects.filter(pk=posts[0].pk).delete()
+        with self.assertNumQueries(1):
+            index.sync()
+        self.assertEqual(len(index), 2)
+
+
+class EmbeddingCodecTests(TestCase):
+    def test_vector_round_trip(self):
+        vector = np.array([0.25, -1.5, 3.0], dtype=np.float32)
+        for dtype in ('float32', 'float16'):
+            blob = pack_embedding(vector, dtype)
+            self.assertEqual(blob[:4], b'EMB1')
+            self.assertEqual(len(blob), HEADER.size + 3 * np.dtype(dtype).itemsize)
+            np.testing.assert_array_equal(unpack_embedding(blob), vector)
+        # старые строки хранят JSON-текст
+        np.testing.assert_array_equal(unpack_embedding('[0.25, -1.5, 3.0]'), vector)
+        self.assertIsNone(unpack_embedding(None))
+        self.assertIsNone(unpack_embedding(''))
+
+    def test_matrix_round_trip(self):
+        matrix = np.arange(12, dtype=np.float32).reshape(4, 3)
+        blob = pack_embeddings(matrix)
+        self.assertEqual(blob[:4], b'EMM1')
+        np.testing.assert_array_equal(unpack_embeddings(blob), matrix)
+        self.assertIsNone(unpack_embeddings(None))
+
+    def test_corrupt_headers_are_rejected(self):
+        vector_blob = pack_embedding(np.ones(3, dtype=np.float32), 'float32')
+        matrix_blob = pack_embeddings(np.ones((2, 3), dtype=np.float32), 'float32')
+        for bad in (b'XXXX' + vector_blob[4:], vector_blob[:4] + b'\x09' + vector_blob[5:], vector_blob[:5], matrix_blob):
+            with self.assertRaises(ValueError):
+                unpack_embedding(bad)
+        for bad in (b'XXXX' + matrix_blob[4:], matrix_blob[:6], vector_blob):
+            with self.assertRaises(ValueError):
+                unpack_embeddings(bad)
+        with self.assertRaises(ValueError):
+            pack_embedding(np.ones(3), 'float64')
+
+
+class EmbeddingMigrationTests(TransactionTestCase):
+    """0007: JSON-эмбеддинги конвертируются в бинарные и обратно."""
+
+    before = [('posts', '0006_post_embedding_vector')]
+    after = [('posts', '0007_convert_embeddings_to_binary')]
+
+    def migrate(self, targets):
+        executor = MigrationExecutor(connection)
+        executor.migrate(targets)
+        return executor.loader.project_state(targets).apps
+
+    def tearDown(self):
+        executor = MigrationExecutor(connection)
+        executor.migrate(executor.loader.graph.leaf_nodes())
+
+    def test_forward_and_reverse(self):
+        apps = self.migrate(self.before)
+        user = apps.get_model('accounts', 'User').objects.create(username='legacy')
+        Post = apps.get_model('posts', 'Post')
+        fields = {'user': user, 'title': 'post', 'type': 'text', 'content': 'text', 'sha256_hash': '0' * 64,
+                  'status': 'original'}
+        legacy = Post.objects.create(embedding=json.dumps([0.5, -1.0, 2.0]), **fields)
+        broken = Post.objects.create(embedding='not json', **fields)
+
+        Post = self.migrate(self.after).get_model('posts', 'Post')
+        converted = Post.objects.get(pk=legacy.pk)
+        self.assertIsNone(converted.embedding)
+        np.testing.assert_array_equal(unpack_embedding(bytes(converted.embedding_vector)), [0.5, -1.0, 2.0])
+        # нечитаемые строки остаются как есть
+        self.assertEqual(Post.objects.get(pk=broken.pk).embedding, 'not json')
+        self.assertIsNone(Post.objects.get(pk=broken.pk).embedding_vector)
+
+        Post = self.migrate(self.before).get_model('posts', 'Post')
+        restored = Post.objects.get(pk=legacy.pk)
+        self.assertEqual(json.loads(restored.embedding), [0.5, -1.0, 2.0])
+        self.assertIsNone(restored.embedding_vector)
+
+
+LOADED_MODELS = []
+
+
+def load_stub_model(name):
+    """Загрузчик для тестов реестра (как benchmarks.stub_model, но считает вызовы)."""
+    time.sleep(0.01)
+    LOADED_MODELS.append(name)
+    return {'name': name}
+
+
+@override_settings(EMBEDDING_MODEL={'NAME': 'stub', 'LOADER': 'posts.tests.load_stub_model'})
+class ModelRegistryTests(TestCase):
+    def setUp(self):
+        LOADED_MODELS.clear()
+        self.registry = ModelRegistry()
+
+    def test_loads_lazily_once_per_name(self):
+        self.assertFalse(self.registry.is_loaded())
+        self.assertEqual(LOADED_MODELS, [])
+
+        threads = [threading.Thread(target=self.registry.get) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(LOADED_MODELS, ['stub'])
+        self.assertIs(self.registry.get(), self.registry.get('stub'))
+        self.assertTrue(self.registry.is_loaded())
+
+        self.registry.get('other')
+        self.assertEqual(LOADED_MODELS, ['stub', 'other'])
+
+    def test_preload_loads_and_freezes_gc(self):
+        with mock.patch('posts.model_registry.gc.freeze') as freeze:
+            model = self.registry.preload()
+        freeze.assert_called_once_with()
+        self.assertEqual(model, {'name': 'stub'})
+        self.assertTrue(self.registry.is_loaded('stub'))
+
+    def test_stats(self):
+        self.assertEqual(self.registry.stats()['models'], {})
+        self.registry.get()
+        stats = self.registry.stats()
+        info = stats['models']['stub']
+        self.assertEqual(stats['pid'], os.getpid())
+        self.assertGreaterEqual(info['load_seconds'], 0.01)
+        self.assertEqual(info['loaded_in_pid'], os.getpid())
+        self.assertFalse(info['shared_from_parent'])
+        # в воркере после fork модель числится загруженной родителем
+        with mock.patch('posts.model_registry.os.getpid', return_value=os.getpid() + 1):
+            self.assertTrue(self.registry.stats()['models']['stub']['shared_from_parent'])
+
+        self.registry.clear()
+        self.assertFalse(self.registry.is_loaded())
+        self.assertEqual(self.registry.stats()['models'], {})
+
+
+class EmbeddingBatcherTests(TestCase):
+    def setUp(self):
+        self.batches = []
+
+    def encode_batch(self, texts):
+        self.batches.append(list(texts))
+        return np.array([[len(text)] for text in texts], dtype=np.float32)
+
+    def test_full_batch_is_flushed_without_waiting(self):
+        batcher = EmbeddingBatcher(self.encode_batch, max_batch_size=4, max_wait_ms=60_000)
+        futures = [batcher.submit('x' * i) for i in range(1, 5)]
+        self.assertEqual([future.result(timeout=5)[0] for future in futures], [1, 2, 3, 4])
+        self.assertEqual(self.batches, [['x', 'xx', 'xxx', 'xxxx']])
+        self.assertEqual((batcher.batches, batcher.items), (1, 4))
+
+    def test_partial_batch_is_flushed_after_max_wait(self):
+        batcher = EmbeddingBatcher(self.encode_batch, max_batch_size=100, max_wait_ms=50)
+        started = time.monotonic()
+        futures = [batcher.submit('a'), batcher.submit('bb')]
+        self.assertEqual([future.result(timeout=5)[0] for future in futures], [1, 2])
+        self.assertGreaterEqual(time.monotonic() - started, 0.05)
+        self.assertEqual(self.batches, [['a', 'bb']])
+
+    def test_failure_reaches_every_future_of_the_batch(self):
+        error = RuntimeError("model failed")
+
+        def failing(texts):
+            self.batches.append(list(texts))
+            raise error
+
+        batcher = EmbeddingBatcher(failing, max_batch_size=3, max_wait_ms=60_000)
+        with self.assertLogs('posts.embedding_service', 'ERROR'):
+            futures = [batcher.submit(text) for text in ('a', 'b', 'c')]
+            for future in futures:
+                self.assertIs(future.exception(timeout=5), error)
+        self.assertEqual(len(self.batches), 1)
+        # поток батчера жив и обрабатывает следующие тексты
+        batcher.encode_batch, batcher.max_wait = self.encode_batch, 0
+        self.assertEqual(batcher.encode('dd', timeout=5)[0], 2)
+
+
+class EmbeddingCacheTests(TestCase):
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmp)
+
+    def vector(self, value):
+        return np.full(4, value, dtype=np.float32)
+
+    def test_lru_evicts_least_recently_used(self):
+        cache = EmbeddingCache(max_items=2)
+        cache.put('a', self.vector(1))
+        cache.put('b', self.vector(2))
+        cache.get('a')
+        cache.put('c', self.vector(3))
+        self.assertEqual(len(cache), 2)
+        self.assertIsNone(cache.get('b'))
+        self.assertEqual(cache.get('a')[0], 1)
+        self.assertEqual(cache.get('c')[0], 3)
+        self.assertEqual((cache.hits, cache.disk_hits, cache.misses), (3, 0, 1))
+
+    def test_disk_hit_after_memory_eviction(self):
+        path = os.path.join(self.tmp, 'cache.sqlite3')
+        cache = EmbeddingCache(max_items=1, disk_path=path)
+        cache.put('a', self.vector(1))
+        cache.put('b', self.vector(2))
+        self.assertEqual(len(cache), 1)
+
+        np.testing.assert_array_equal(cache.get('a'), self.vector(1))
+        self.assertEqual((cache.hits, cache.disk_hits, cache.misses), (0, 1, 0))
+        # прочитанное с диска снова в памяти
+        cache.get('a')
+        self.assertEqual(cache.hits, 1)
+
+        # второй уровень общий: его видит и кэш другого воркера
+        other = EmbeddingCache(max_items=1, disk_path=path)
+        np.testing.assert_array_equal(other.get('b'), self.vector(2))
+        self.assertEqual(other.disk_hits, 1)
+
+    def test_without_disk_path_eviction_is_a_miss(self):
+        cache = EmbeddingCache(max_items=1, disk_path=None)
+        cache.put('a', self.vector(1))
+        cache.put('b', self.vector(2))
+        self.assertIsNone(cache.get('a'))
+        self.assertEqual((cache.disk_hits, cache.misses), (0, 1))
+        with mock.patch('posts.embedding_cache.sqlite3.connect') as connect:
+            cache.get('c')
+        connect.assert_not_called()
+
+
+@override_settings(POST_INGESTION={'ASYNC': True, 'START_LOCAL_WORKERS': False, 'MAX_ATTEMPTS': 3,
+                                   'RETRY_BACKOFF_SECONDS': 5, 'LEASE_SECONDS': 300})
+class IngestionQueueTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = get_user_model().objects.create_user('author', password='pass')
+
+    def make_job(self, **fields):
+        post = Post.objects.create(user=self.author, title='post', type='text', content='text',
+                                   sha256_hash=f'{Post.objects.count():064x}', status='processing')
+        return IngestionJob.objects.create(post=post, **fields)
+
+    def test_claim_is_atomic(self):
+        job = self.make_job()
+        claimable = ingestion_queue._claimable
+        claimed_by_other = []
+
+        def racing(now):
+            calls.append(now)
+            # другой воркер захватывает ту же задачу между выборкой кандидатов и UPDATE
+            if len(calls) == 2:
+                claimed_by_other.append(ingestion_queue.claim_job())
+            return claimable(now)
+
+        calls = []
+        with mock.patch('posts.ingestion_queue._claimable', racing):
+            self.assertIsNone(ingestion_queue.claim_job())
+        self.assertEqual(claimed_by_other[0].pk, job.pk)
+        job.refresh_from_db()
+        self.assertEqual(job.state, 'running')
+        self.assertIsNone(ingestion_queue.claim_job())
+
+    def test_failed_stage_is_retried_with_backoff_then_failed(self):
+        job = self.make_job()
+        failing = mock.Mock(side_effect=RuntimeError("extract failed"))
+        stages = [('extract', failing)] + STAGES[1:]
+        delays = []
+        with mock.patch('posts.ingestion_queue.STAGES', stages), self.assertLogs('posts.ingestion_queue'):
+            for attempt in range(1, 4):
+                claimed = ingestion_queue.claim_job()
+                self.assertEqual(claimed.pk, job.pk)
+                before = timezone.now()
+                self.assertFalse(ingestion_queue.run_job(claimed))
+                job.refresh_from_db()
+                self.assertEqual(job.attempts, attempt)
+                self.assertIn("extract failed", job.last_error)
+                if attempt < 3:
+                    self.assertEqual(job.state, 'pending')
+                    delays.append(round((job.next_attempt_at - before).total_seconds()))
+                    # до истечения задержки задача не захватывается
+                    self.assertIsNone(ingestion_queue.claim_job())
+                    IngestionJob.objects.filter(pk=job.pk).update(next_attempt_at=timezone.now())
+        self.assertEqual(delays, [5, 10])
+        self.assertEqual(job.state, 'failed')
+        self.assertEqual(Post.objects.get(pk=job.post_id).status, 'failed')
+        self.assertIsNone(ingestion_queue.claim_job())
+
+    def test_expired_lease_is_reclaimed(self):
+        now = timezone.now()
+        stale = self.make_job(state='running', stage='record', locked_at=now - timedelta(seconds=301))
+        self.make_job(state='running', locked_at=now - timedelta(seconds=10))
+        claimed = ingestion_queue.claim_job()
+        self.assertEqual(claimed.pk, stale.pk)
+        self.assertEqual(claimed.stage, 'record')
+        self.assertGreaterEqual(claimed.locked_at, now)
+        self.assertIsNone(ingestion_queue.claim_job())
+
+    def test_local_workers_start_with_first_request(self):
+        with mock.patch('posts.ingestion_queue.get_worker_pool') as get_worker_pool:
+            request_started.send(sender=self.__class__)
+        get_worker_pool.assert_not_called()
+
+        with override_settings(POST_INGESTION={'ASYNC': True, 'START_LOCAL_WORKERS': True}):
+            apps.get_app_config('posts').ready()
+        self.addCleanup(request_started.disconnect, dispatch_uid='posts.start_local_workers')
+        with mock.patch('posts.ingestion_queue.get_worker_pool') as get_worker_pool:
+            request_started.send(sender=self.__class__)
+        get_worker_pool.assert_called_once_with()
+
+
+def make_pdf(pages):
+    buffer = BytesIO()
+    pdf = canvas.Canvas(buffer)
+    for page in range(pages):
+        pdf.drawString(40, 800, f"page {page}")
+        pdf.showPage()
+    pdf.save()
+    buffer.seek(0)
+    return buffer
+
+
+class SlowPage:
+    def __init__(self, seconds):
+        self.seconds = seconds
+
+    def extract_text(self):
+        time.sleep(self.seconds)
+        return f"slept {self.seconds}"
+
+
+@override_settings(PDF_EXTRACTION={'WORKERS': 2, 'PARALLEL_MIN_PAGES': 4, 'MAX_PAGES': 2000,
+                                   'MAX_BYTES': 1024, 'PAGE_TIMEOUT_SECONDS': 10})
+class PdfExtractionTests(TestCase):
+    def test_pages_are_yielded_in_order_by_the_pool(self):
+        pages = list(utils.iter_pdf_pages(make_pdf(9)))
+        self.assertEqual([text.strip() for text in pages], [f"page {i}" for i in range(9)])
+
+    def test_page_and_byte_caps(self):
+        self.assertEqual(len(list(utils.iter_pdf_pages(make_pdf(9), max_pages=3))), 3)
+        self.assertEqual(len(list(utils.iter_pdf_pages(make_pdf(9), max_pages=5, workers=1))), 5)
+        # обрезка по байтам и в пуле, и без него
+        for workers in (1, 2):
+            text = ''.join(utils.iter_pdf_pages(make_pdf(9), max_bytes=15, workers=workers))
+            self.assertEqual(text, "page 0\npage 1\np")
+
+    def test_page_timeout_is_counted_per_page(self):
+        previous = signal.signal(signal.SIGALRM, utils._on_page_timeout)
+        self.addCleanup(signal.signal, signal.SIGALRM, previous)
+        reader = mock.Mock(pages=[SlowPage(0.15), SlowPage(0.15), SlowPage(5)])
+        with mock.patch('posts.utils.PyPDF2.PdfReader', return_value=reader), \
+                mock.patch('posts.utils._worker_reader', (None, None)):
+            started = time.monotonic()
+            # каждая страница укладывается в свой таймаут, хотя вместе они дольше него
+            self.assertEqual(utils._extract_page('doc.pdf', 0, 0.2), "slept 0.15")
+            self.assertEqual(utils._extract_page('doc.pdf', 1, 0.2), "slept 0.15")
+            self.assertIsNone(utils._extract_page('doc.pdf', 2, 0.2))
+        self.assertLess(time.monotonic() - started, 1)
+
+    def test_small_document_page_timeout(self):
+        reader = mock.Mock(pages=[SlowPage(0.05), SlowPage(5)])
+        started = time.monotonic()
+        with mock.patch('posts.utils.PyPDF2.PdfReader', return_value=reader):
+            pages = list(utils.iter_pdf_pages(BytesIO(b'%PDF'), page_timeout=0.2, workers=1))
+        self.assertEqual(pages, ["slept 0.05", ''])
+        self.assertLess(time.monotonic() - started, 1)
+
+        # в потоке запроса SIGALRM недоступен: страницы уходят в пул, где таймаут есть
+        results = []
+        with mock.patch('posts.utils._iter_parallel', wraps=utils._iter_parallel) as parallel:
+            thread = threading.Thread(target=lambda: results.extend(utils.iter_pdf_pages(make_pdf(2), workers=1)))
+            thread.start()
+            thread.join()
+        parallel.assert_called_once()
+        self.assertEqual([text.strip() for text in results], ["page 0", "page 1"])
+
+    def test_hung_worker_is_terminated(self):
+        pool = utils._get_pool(1)
+        worker_pid = pool.submit(os.getpid).result(timeout=30)
+        future = pool.submit(time.sleep, 60)
+        with mock.patch('posts.utils.HANG_GRACE_SECONDS', 0), self.assertRaises(utils.ExtractionError):
+            utils._page_result(future, 0, 0.2)
+
+        deadline = time.monotonic() + 10
+        while worker_pid in [process.pid for process in multiprocessing.active_children()]:
+            self.assertLess(time.monotonic(), deadline)
+            time.sleep(0.05)
+        self.assertIsNot(utils._get_pool(1), pool)
+
+    def test_broken_document_is_an_error_not_partial_text(self):
+        with self.assertRaises(utils.ExtractionError):
+            utils.extract_text_from_file(BytesIO(b'%PDF-1.4 broken'), 'broken.pdf')
+
+        client = APIClient()
+        client.force_authenticate(get_user_model().objects.create_user('author', password='pass'))
+        document = SimpleUploadedFile('broken.pdf', b'%PDF-1.4 broken', content_type='application/pdf')
+        response = client.post('/api/posts/create/', {'title': 'doc', 'type': 'document', 'document': document})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('broken.pdf', response.data['document'][0])
+        self.assertFalse(Post.objects.exists())
+
+
+class ChunkIdTests(TestCase):
+    def test_split_never_exceeds_chunk_id_base(self):
+        text = ' '.join(f'w{i}' for i in range(3000))
+        chunks = split_into_chunks(text, chunk_words=2, overlap_words=0, max_chunks=5000)
+        self.assertEqual(len(chunks), CHUNK_ID_BASE)
+        self.assertEqual(len(split_into_chunks(text, chunk_words=2, overlap_words=0, max_chunks=10)), 10)
+        with override_settings(CHUNKING={'MAX_CHUNKS': 5000}):
+            self.assertEqual(get_chunking_config()['MAX_CHUNKS'], CHUNK_ID_BASE)
+
+    def test_item_id_bound(self):
+        index = ChunkIndex()
+        item_ids = np.array([chunk_item_id(7, 0), chunk_item_id(7, CHUNK_ID_BASE - 1), chunk_item_id(8, 0)])
+        self.assertEqual(index.post_ids(item_ids).tolist(), [7, 7, 8])
+        for chunk in (-1, CHUNK_ID_BASE):
+            with self.assertRaises(ValueError):
+                chunk_item_id(7, chunk)
+        # фрагменты сверх предела не попадают в индекс под id соседнего поста
+        vectors = np.ones((CHUNK_ID_BASE + 1, 4), dtype=np.float32)
+        with self.assertRaises(ValueError):
+            index._row_items(7, pack_embeddings(vectors))
+
+
+@override_settings(LSH={'ENABLED': True, 'NUM_PERM': 128, 'BANDS': 32, 'SHINGLE_WORDS': 5,
+                        'DUPLICATE_JACCARD': 0.9, 'MAX_CANDIDATES': 5})
+class MinHashCandidateTests(TestCase):
+    def test_near_duplicate_is_found_among_noise_candidates(self):
+        author = get_user_model().objects.create_user('author', password='pass')
+        words = [f'word{i}' for i in range(400)]
+        query = minhash_signature(' '.join(words))
+        query_buckets = band_buckets(query)
+
+        # шумовые посты созданы раньше, в каждой корзине запроса их больше MAX_CANDIDATES
+        noise = pack_signature(minhash_signature('noise ' * 50))
+        posts = Post.objects.bulk_create([
+            Post(user=author, title=f'noise {i}', type='text', content='noise', sha256_hash=f'{i:064x}',
+                 minhash=noise)
+            for i in range(len(query_buckets) * 6)
+        ])
+        LSHBucket.objects.bulk_create([
+            LSHBucket(post=post, bucket=query_buckets[i % len(query_buckets)]) for i, post in enumerate(posts)
+        ])
+
+        words[200] = 'changed'
+        copy = minhash_signature(' '.join(words))
+        original = Post.objects.create(user=author, title='original', type='text', content='copy',
+                                       sha256_hash='f' * 64, minhash=pack_signature(copy))
+        index_signature(original.pk, copy)
+
+        candidates = find_candidates(query)
+        self.assertEqual(len(candidates), 5)
+        jaccard, post_id = candidates[0]
+        self.assertEqual(post_id, original.pk)
+        self.assertTrue(is_near_duplicate(jaccard))
+        self.assertNotIn(original.pk, [post_id for _, post_id in find_candidates(query, exclude_pk=original.pk)])
+
+    def test_duplicate_threshold_is_strict(self):
+        self.assertFalse(is_near_duplicate(0.9))
+        self.assertTrue(is_near_duplicate(0.91))
+        self.assertFalse(is_near_duplicate(0.5, threshold=0.5))
+
+
+def make_picture(seed, size=(640, 480)):
+    rng = np.random.default_rng(seed)
+    picture = Image.new('RGB', size, (255, 255, 255))
+    draw = ImageDraw.Draw(picture)
+    for _ in range(12):
+        x, y, r = rng.integers(0, size[0]), rng.integers(0, size[1]), rng.integers(20, 150)
+        draw.ellipse([x - r, y - r, x + r, y + r], fill=tuple(int(c) for c in rng.integers(0, 256, 3)))
+    return picture
+
+
+def encoded(picture, format, **options):
+    buffer = BytesIO()
+    picture.save(buffer, format, **options)
+    buffer.seek(0)
+    return buffer
+
+
+class ImageHashTests(TestCase):
+    def test_hash_is_stable_under_resize_and_recompress(self):
+        for algorithm in ALGORITHMS:
+            with self.subTest(algorithm=algorithm), override_settings(IMAGE_HASH={'ALGORITHM': algorithm}):
+                for seed in range(3):
+                    picture = make_picture(seed)
+                    original = image_hash(encoded(picture, 'PNG'))
+                    copies = [
+                        encoded(picture.resize((320, 240)), 'PNG'),
+                        encoded(picture, 'JPEG', quality=60),
+                        encoded(picture.resize((1280, 960)), 'JPEG', quality=40),
+                    ]
+                    for copy in copies:
+                        self.assertEqual(classify_distance(hamming(original, image_hash(copy))), 'duplicate')
+                    other = image_hash(encoded(make_picture(seed + 100), 'PNG'))
+                    self.assertEqual(classify_distance(hamming(original, other)), 'original')
+
+    def test_multi_index_finds_everything_within_radius(self):
+        rng = np.random.default_rng(0)
+        query = int(rng.integers(0, 2 ** 63, dtype=np.uint64)) | 1 << 63
+        values = [int(value) for value in rng.integers(0, 2 ** 63, 3000, dtype=np.uint64)]
+        # рядом с запросом: разное число изменённых бит, в том числе все в одном блоке
+        for distance in range(0, 13):
+            for _ in range(5):
+                bits = rng.choice(HASH_BITS, distance, replace=False)
+                values.append(query ^ sum(1 << int(bit) for bit in bits))
+        values.append(query ^ 0xFFF)
+        table = MultiIndexHash(blocks=4)
+        for item_id, value in enumerate(values):
+            table.add(value, item_id)
+
+        for radius in (0, 3, 4, 7, 10, 11):
+            expected = sorted((hamming(query, value), item_id) for item_id, value in enumerate(values)
+                              if hamming(query, value) <= radius)
+            self.assertEqual(table.search(query, radius), expected)
+            self.assertTrue(expected)
+
+        table.remove(len(values) - 1)
+        self.assertNotIn(len(values) - 1, [item_id for _, item_id in table.search(query, 12)])
+
+    def test_posts_deleted_in_other_process_stop_matching(self):
+        user = get_user_model().objects.create_user('author', password='pass')
+        picture = make_picture(0)
+        post = Post.objects.create(user=user, title='picture', type='image', sha256_hash='a' * 64, status='original',
+                                   image_hash=to_hex(image_hash(encoded(picture, 'PNG'))))
+        copy = encoded(picture.resize((320, 240)), 'JPEG', quality=60)
+        with mock.patch('posts.image_hash._index', ImageHashIndex(prune_check_seconds=0)):
+            self.assertEqual(analyze_content('image', copy)['fields']['status'], 'duplicate')
+            # удаление в другом процессе: post_delete до индекса этого процесса не доходит
+            with mock.patch('posts.image_hash._index', None):
+                Post.objects.filter(pk=post.pk).delete()
+            copy.seek(0)
+            self.assertEqual(analyze_content('image', copy)['fields']['status'], 'original')
+
+
+class UploadHashingTests(TestCase):
+    def setUp(self):
+        self.media = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media)
+
+    def upload(self, content):
+        document = SimpleUploadedFile('upload.bin', content, content_type='application/octet-stream')
+        request = RequestFactory().post('/api/posts/create/', {'type': 'document', 'document': document})
+        return request.FILES['document']
+
+    def assert_hash_matches_stored_file(self, uploaded, content):
+        self.assertEqual(uploaded.sha256, hashlib.sha256(content).hexdigest())
+        with override_settings(MEDIA_ROOT=self.media):
+            name = default_storage.save('documents/upload.bin', uploaded)
+            # временный файл перенесён в хранилище, как после запроса закрываем его
+            uploaded.close()
+            with default_storage.open(name, 'rb') as stored:
+                self.assertFalse(hasattr(stored, 'sha256'))
+                self.assertEqual(file_sha256(stored), uploaded.sha256)
+
+    def test_in_memory_upload(self):
+        content = os.urandom(200 * 1024)
+        uploaded = self.upload(content)
+        self.assertIsInstance(uploaded, InMemoryUploadedFile)
+        self.assert_hash_matches_stored_file(uploaded, content)
+
+    @override_settings(FILE_UPLOAD_MAX_MEMORY_SIZE=64 * 1024)
+    def test_temporary_file_upload(self):
+        content = os.urandom(300 * 1024 + 17)
+        uploaded = self.upload(content)
+        self.assertIsInstance(uploaded, TemporaryUploadedFile)
+        self.assert_hash_matches_stored_file(uploaded, content)
+
+
+def ledger_record(i, prefix='h'):
+    return {'timestamp': '2025-01-01T00:00:00', 'hash': f'{prefix}{i:063x}', 'user': 'author', 'title': f'post {i}'}
+
+
+class LedgerTestMixin:
+    def setUp(self):
+        super().setUp()
+        self.tmp = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmp)
+        self.paths = {
+            'PATH': os.path.join(self.tmp, 'ledger.jsonl'),
+            'INDEX_PATH': os.path.join(self.tmp, 'ledger_index.sqlite3'),
+            'BLOCKS_PATH': os.path.join(self.tmp, 'ledger_blocks.jsonl'),
+        }
+
+    def make_ledger(self, **options):
+        ledger = Ledger(self.paths['PATH'], self.paths['INDEX_PATH'], self.paths['BLOCKS_PATH'], **options)
+        self.addCleanup(ledger.close)
+        return ledger
+
+    def use_ledger_settings(self, **options):
+        """Глобальный журнал (get_ledger) во временном каталоге."""
+        override = override_settings(LEDGER={**get_ledger_config(), **self.paths, **options})
+        override.enable()
+        self.addCleanup(override.disable)
+        blockchain_utils._ledger = None
+        self.addCleanup(setattr, blockchain_utils, '_ledger', None)
+        self.addCleanup(lambda: blockchain_utils._ledger and blockchain_utils._ledger.close())
+
+
+class LedgerTests(LedgerTestMixin, TestCase):
+    def test_concurrent_writers_do_not_interleave(self):
+        # у каждого писателя свой дескриптор, как у разных процессов: исключает только flock
+        writers = [self.make_ledger(fsync_every=1000) for _ in range(4)]
+
+        def write(number, ledger):
+            for batch in range(20):
+                ledger.append_many([ledger_record(number * 1000 + batch * 10 + i) for i in range(10)])
+
+        threads = [threading.Thread(target=write, args=(number, ledger)) for number, ledger in enumerate(writers)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        records = list(writers[0])
+        self.assertEqual(len(records), 800)
+        self.assertEqual(len({record['hash'] for record in records}), 800)
+        # индекс каждого писателя догоняет чужие записи
+        for ledger in writers:
+            for number in range(4):
+                self.assertEqual(ledger.find(ledger_record(number * 1000 + 199)['hash'])['title'],
+                                 f'post {number * 1000 + 199}')
+
+    def test_torn_last_line_is_truncated_on_open(self):
+        ledger = self.make_ledger()
+        ledger.append_many([ledger_record(i) for i in range(3)])
+        ledger.close()
+        size = os.path.getsize(self.paths['PATH'])
+        with open(self.paths['PATH'], 'ab') as f:
+            f.write(b'{"timestamp": "2025-01-01T00:00:00", "hash": "torn')
+
+        ledger = self.make_ledger()
+        self.assertFalse(ledger.contains('torn'))
+        self.assertEqual(os.path.getsize(self.paths['PATH']), size)
+        self.assertEqual(ledger.append(ledger_record(3)), size)
+        self.assertEqual([record['title'] for record in ledger], ['post 0', 'post 1', 'post 2', 'post 3'])
+
+    def test_index_is_rebuilt_after_deletion(self):
+        ledger = self.make_ledger()
+        records = [ledger_record(i) for i in range(50)] + [ledger_record(7)]
+        offsets = ledger.append_many(records)
+        ledger.close()
+        for suffix in ('', '-wal', '-shm'):
+            if os.path.exists(self.paths['INDEX_PATH'] + suffix):
+                os.remove(self.paths['INDEX_PATH'] + suffix)
+
+        ledger = self.make_ledger()
+        self.assertEqual(ledger.offsets(ledger_record(7)['hash']), [offsets[7], offsets[50]])
+        self.assertEqual(ledger.find(ledger_record(42)['hash'])['title'], 'post 42')
+
+    def test_is_hash_recorded(self):
+        self.use_ledger_settings()
+        record = save_to_blockchain('a' * 64, 'author', 'title')
+        self.assertEqual(record['hash'], 'a' * 64)
+        self.assertTrue(is_hash_recorded('a' * 64))
+        self.assertFalse(is_hash_recorded('b' * 64))
+
+    def test_import_legacy_log(self):
+        self.use_ledger_settings()
+        source = os.path.join(self.tmp, 'blockchain_log.json')
+        legacy = [{**ledger_record(i), 'extra': 'dropped'} for i in range(5)]
+        with open(source, 'w', encoding='utf-8') as f:
+            json.dump(legacy, f)
+
+        out = StringIO()
+        call_command('import_blockchain_log', source=source, stdout=out)
+        self.assertIn('5', out.getvalue())
+        self.assertFalse(os.path.exists(source))
+        self.assertTrue(os.path.exists(source + '.imported'))
+        self.assertEqual(list(get_ledger()), [ledger_record(i) for i in range(5)])
+        self.assertTrue(is_hash_recorded(ledger_record(4)['hash']))
+
+        # исходный файл переименован: повторный запуск не продублирует записи
+        with self.assertRaises(CommandError):
+            call_command('import_blockchain_log', source=source, stdout=StringIO())
+        self.assertEqual(len(list(get_ledger())), 5)
+
+
+class LedgerProofTests(LedgerTestMixin, TestCase):
+    def test_merkle_proofs_round_trip_for_odd_sizes(self):
+        for size in (1, 2, 3, 5, 7, 13):
+            data = [f'record {i}'.encode() for i in range(size)]
+            levels = build_levels([leaf_hash(item) for item in data])
+            root = merkle_root([leaf_hash(item) for item in data])
+            for index, item in enumerate(data):
+                proof = inclusion_proof(levels, index)
+                self.assertTrue(verify_proof(item, proof, root), (size, index))
+                self.assertFalse(verify_proof(item + b'!', proof, root))
+
+    def test_proof_fails_after_flipping_one_leaf(self):
+        data = [f'record {i}'.encode() for i in range(7)]
+        root = merkle_root([leaf_hash(item) for item in data])
+        data[6] = b'record 6!'
+        levels = build_levels([leaf_hash(item) for item in data])
+        # последний лист нечётного уровня поднимается без пары: его подмену тоже видно
+        for index in (0, 6):
+            self.assertFalse(verify_proof(data[index], inclusion_proof(levels, index), root))
+
+    def test_ledger_proof_on_odd_sized_block(self):
+        ledger = self.make_ledger(block_interval=3600)
+        # свежие записи: по времени блок ещё не закрывается
+        now = timezone.now().replace(tzinfo=None).isoformat()
+        records = [{**ledger_record(i), 'timestamp': now} for i in range(7)]
+        ledger.append_many(records)
+        self.assertEqual(ledger.proof(records[6]['hash']), {'hash': records[6]['hash'], 'sealed': False})
+        self.assertEqual(ledger.seal(), 1)
+
+        for i in (0, 3, 6):
+            proof = ledger.proof(records[i]['hash'])
+            self.assertTrue(proof['sealed'])
+            self.assertEqual(proof['block']['count'], 7)
+            self.assertEqual(json.loads(proof['record']), records[i])
+            self.assertTrue(verify_proof(proof['record'].encode('utf-8'), proof['proof'], proof['block']['merkle_root']))
+        self.assertIsNone(ledger.proof('missing'))
+
+    def test_verify_chain_detects_edited_block(self):
+        ledger = self.make_ledger(block_size=4, block_interval=3600)
+        ledger.append_many([ledger_record(i) for i in range(11)])
+        ledger.seal()
+        self.assertEqual(verify_chain(ledger), (3, None))
+
+        # подмена записи во втором блоке с сохранением длины строки
+        with open(self.paths['PATH'], 'r+b') as f:
+            content = f.read()
+            f.seek(0)
+            f.write(content.replace(b'"post 5"', b'"post X"'))
+        checked, error = verify_chain(ledger)
+        self.assertEqual(checked, 1)
+        self.assertIn("блок 1", error)
+
+        with open(self.paths['PATH'], 'r+b') as f:
+            f.write(content)
+        # подмена корня в заголовке блока ломает его хэш
+        with open(self.paths['BLOCKS_PATH'], 'r+b') as f:
+            blocks = f.read()
+            root = json.loads(blocks.splitlines()[2])['merkle_root']
+            f.seek(0)
+            f.write(blocks.replace(root.encode(), b'0' * 64))
+        self.assertEqual(verify_chain(ledger), (2, "блок 2: хэш заголовка не совпадает"))
+
+    def test_proof_view_is_202_until_sealed(self):
+        self.use_ledger_settings(BLOCK_SIZE=1024, BLOCK_INTERVAL_SECONDS=3600)
+        record = save_to_blockchain('c' * 64, 'author', 'title')
+        client = APIClient()
+        client.force_authenticate(get_user_model().objects.create_user('author', password='pass'))
+
+        response = client.get('/api/posts/ledger/proof/', {'hash': 'c' * 64})
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(response.data, {'hash': 'c' * 64, 'sealed': False})
+
+        get_ledger().seal()
+        response = client.get('/api/posts/ledger/proof/', {'hash': 'c' * 64})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(json.loads(response.data['record']), record)
+        self.assertTrue(verify_proof(response.data['record'].encode('utf-8'), response.data['proof'],
+                                     response.data['block']['merkle_root']))
+
+        self.assertEqual(client.get('/api/posts/ledger/proof/', {'hash': 'd' * 64}).status_code, 404)
+        self.assertEqual(client.get('/api/posts/ledger/proof/').status_code, 400)
+
+
+class BloomFilterTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = get_user_model().objects.create_user('author', password='pass')
+
+    def setUp(self):
+        bloom._filter = None
+        self.addCleanup(setattr, bloom, '_filter', None)
+
+    def create_posts(self, start, count, **fields):
+        return Post.objects.bulk_create([
+            Post(user=self.author, title=f'post {i}', type='text', content='text', sha256_hash=f'{i:064x}',
+                 status='original', **fields)
+            for i in range(start, start + count)
+        ])
+
+    def test_false_positive_rate_is_near_target(self):
+        for error_rate in (0.01, 0.001):
+            bloom_filter = bloom.BloomFilter(20000, error_rate)
+            bloom_filter.add_many([f'member {i}' for i in range(20000)])
+            self.assertTrue(bloom_filter.contains_many([f'member {i}' for i in range(20000)]).all())
+            rate = bloom_filter.contains_many([f'other {i}' for i in range(100000)]).mean()
+            self.assertLess(rate, error_rate * 1.5)
+            self.assertGreater(rate, error_rate / 3)
+
+    def test_no_false_negatives_after_sync_and_growth(self):
+        self.create_posts(0, 30)
+        known = bloom.KnownHashFilter(capacity=50, error_rate=0.01)
+        known.sync()
+        self.assertEqual(known.capacity, 50)
+
+        # посты других процессов и пост, который ещё обрабатывается
+        self.create_posts(30, 40)
+        processing = Post.objects.create(user=self.author, title='processing', type='text', content='',
+                                         sha256_hash='', status='processing')
+        known.sync()
+        # 70 > 50: фильтр перестроен с удвоенной ёмкостью
+        self.assertEqual(known.capacity, 100)
+        self.assertTrue(known.might_contain([f'{i:064x}' for i in range(70)]).all())
+
+        Post.objects.filter(pk=processing.pk).update(sha256_hash='e' * 64, status='original')
+        self.create_posts(70, 500)
+        known.sync()
+        self.assertEqual(known.capacity, 800)
+        self.assertTrue(known.might_contain(['e' * 64] + [f'{i:064x}' for i in range(570)]).all())
+        self.assertLess(known.might_contain([f'{i:064x}' for i in range(10 ** 6, 10 ** 6 + 2000)]).mean(), 0.02)
+
+    def test_verify_hashes_after_rebuild(self):
+        self.create_posts(0, 20)
+        with override_settings(HASH_VERIFICATION={**get_verification_config(), 'BLOOM_CAPACITY': 8}):
+            found = bloom.verify_hashes([f'{i:064x}' for i in range(25)])
+        self.assertEqual(sum(post is not None for post in found.values()), 20)
+        self.assertEqual(found[f'{3:064x}']['title'], 'post 3')
+        self.assertIsNone(found[f'{22:064x}'])
+        self.assertEqual(bloom.get_hash_filter().capacity, 32)
+
+
+class PostVerifyBatchTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = get_user_model().objects.create_user('author', password='pass')
+        cls.document = Post.objects.create(user=cls.author, title='document', type='document', content='text',
+                                           sha256_hash='a' * 64, status='original', document='documents/a.pdf')
+        cls.text = Post.objects.create(user=cls.author, title='text', type='text', content='text',
+                                       sha256_hash='b' * 64, status='original')
+
+    def setUp(self):
+        bloom._filter = None
+        self.addCleanup(setattr, bloom, '_filter', None)
+        self.client = APIClient()
+        self.client.force_authenticate(self.author)
+
+    def check_results(self, response):
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual((response.data['count'], response.data['found']), (3, 2))
+        results = {result['hash']: result for result in response.data['results']}
+        # найденные записи совпадают с ответом одиночной проверки
+        for post in (self.document, self.text):
+            single = self.client.get('/api/posts/verify/', {'hash': post.sha256_hash}).data
+            self.assertEqual(results[post.sha256_hash], {'hash': post.sha256_hash, **single})
+        self.assertEqual(results['c' * 64], {'hash': 'c' * 64, 'exists': False})
+        self.assertEqual(results['a' * 64]['document_url'], 'http://testserver/media/documents/a.pdf')
+
+    def test_json_body(self):
+        response = self.client.post('/api/posts/verify/batch/', {'hashes': ['a' * 64, 'b' * 64, 'c' * 64, 'a' * 64]},
+                                    format='json')
+        self.check_results(response)
+
+    def test_line_streamed_body(self):
+        body = f"{'a' * 64}\n\n{'b' * 64}\r\n  {'c' * 64}  \n"
+        response = self.client.post('/api/posts/verify/batch/', body, content_type='text/plain')
+        self.check_results(response)
+
+    def test_limits(self):
+        with override_settings(HASH_VERIFICATION={**get_verification_config(), 'MAX_HASHES': 2}):
+            response = self.client.post('/api/posts/verify/batch/', '\n'.join(['a' * 64] * 3),
+                                        content_type='text/plain')
+        self.assertEqual(response.status_code, 413)
+        self.assertEqual(self.client.post('/api/posts/verify/batch/', '', content_type='text/plain').status_code, 400)
+        response = self.client.post('/api/posts/verify/batch/', {'hashes': 'a'}, format='json')
+        self.assertEqual(response.status_code, 400)
+
+
+class PostCreateMixin(LedgerTestMixin):
+    """
+    Создание постов через API на заглушке модели (benchmarks.stub_model); индексы,
+    кэш эмбеддингов, медиа и журнал у каждого теста свои.
+    """
+
+    def setUp(self):
+        super().setUp()
+        self.use_ledger_settings()
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+        settings_override = override_settings(
+            MEDIA_ROOT=media_root,
+            EMBEDDING_MODEL={'NAME': 'bow-stub', 'LOADER': 'benchmarks.stub_model.load', 'PRELOAD': False},
+            EMBEDDING_BATCHING={'ENABLED': False},
+            EMBEDDING_CACHE={'MAX_ITEMS': 100, 'DISK_PATH': None},
+            SIMILARITY_SEARCH={**settings.SIMILARITY_SEARCH, 'INDEX_PATH': None, 'CHUNK_INDEX_PATH': None,
+                               'PRUNE_CHECK_SECONDS': 0},
+        )
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        for name in ('embedding_index._index', 'chunking._chunk_index', 'image_hash._index',
+                     'embedding_cache._cache', 'bloom._filter'):
+            patcher = mock.patch(f'posts.{name}', None)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.author = get_user_model().objects.create_user('author', password='pass')
+        self.client = APIClient()
+        self.client.force_authenticate(self.author)
+
+    def create_post(self, **data):
+        return self.client.post('/api/posts/create/', {'title': 'post', **data})
+
+    def document(self, text, name='doc.txt'):
+        return SimpleUploadedFile(name, text.encode('utf-8'), content_type='text/plain')
+
+
+class PostCreateTests(PostCreateMixin, TestCase):
+    def test_exact_copy_is_duplicate_without_model(self):
+        text = ' '.join(f'word{i}' for i in range(50))
+        first = self.create_post(type='document', document=self.document(text))
+        self.assertEqual((first.status_code, first.data['status']), (201, 'original'))
+
+        # кэш эмбеддингов пуст и LSH выключен: ответ даёт только поиск по SHA-256
+        with mock.patch('posts.embedding_cache._cache', None), override_settings(LSH={'ENABLED': False}), \
+                mock.patch('posts.embedding_service.get_model', side_effect=AssertionError("модель не нужна")):
+            second = self.create_post(type='document', document=self.document(text))
+        self.assertEqual(second.status_code, 201)
+        self.assertEqual((second.data['status'], second.data['similarity_score']), ('duplicate', 1.0))
+        self.assertEqual(second.data['sha256_hash'], first.data['sha256_hash'])
+
+    def test_near_copy_skips_model_and_vector_search(self):
+        words = [f'word{i}' for i in range(400)]
+        original = self.create_post(type='text', content=' '.join(words))
+        self.assertEqual(original.data['status'], 'original')
+        words[200] = 'changed'
+        before = lsh_stats()
+
+        with mock.patch('posts.embedding_cache._cache', None), \
+                mock.patch('posts.embedding_service.get_model', side_effect=AssertionError("модель не нужна")), \
+                mock.patch('posts.ingestion.get_index', side_effect=AssertionError("поиск по векторам не нужен")), \
+                mock.patch('posts.ingestion.chunk_similarity', side_effect=AssertionError("поиск по фрагментам не нужен")):
+            result = analyze_content('text', ' '.join(words))
+
+        fields = result['fields']
+        self.assertEqual(fields['status'], 'duplicate')
+        self.assertGreater(fields['similarity_score'], 0.9)
+        self.assertLess(fields['similarity_score'], 1.0)
+        # эмбеддинг взят у оригинала, подпись сохранится для следующих проверок
+        stored = Post.objects.get(pk=original.data['id'])
+        self.assertEqual(fields['embedding_vector'], bytes(stored.embedding_vector))
+        self.assertIsNotNone(fields['minhash'])
+        after = lsh_stats()
+        self.assertEqual((after['checked'] - before['checked'], after['skipped_inference'] - before['skipped_inference']),
+                         (1, 1))
+
+    @override_settings(CHUNKING={'CHUNK_WORDS': 40, 'OVERLAP_WORDS': 0})
+    def test_borrowed_paragraph_is_reported_by_chunk(self):
+        paragraph = ' '.join(f'quote{i}' for i in range(40))
+        source = self.create_post(type='document', document=self.document(
+            paragraph + ' ' + ' '.join(f'source{i}' for i in range(40)), 'source.txt'))
+        text = ' '.join(f'own{i}' for i in range(80)) + '\n\n' + paragraph
+        response = self.create_post(type='document', document=self.document(text, 'borrowed.txt'))
+
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.data['chunk_matches'][0],
+                         {'post_id': source.data['id'], 'chunk': 2, 'matched_chunk': 0, 'similarity': 1.0})
+        self.assertEqual(response.data['similarity_score'], 1.0)
+        spans = Post.objects.get(pk=response.data['id']).chunk_spans
+        self.assertEqual(len(spans), 3)
+        self.assertEqual(text[slice(*spans[2])], paragraph)
+
+    def test_resized_copy_is_duplicate_and_edited_copy_suspicious(self):
+        def upload(image, name, format, **options):
+            return SimpleUploadedFile(name, encoded(image, format, **options).getvalue(), content_type=f'image/{format.lower()}')
+
+        picture = make_picture(0)
+        original = self.create_post(type='image', image=upload(picture, 'original.png', 'PNG'))
+        self.assertEqual((original.status_code, original.data['status']), (201, 'original'))
+
+        resized = self.create_post(type='image', image=upload(picture.resize((320, 240)), 'resized.jpg', 'JPEG', quality=70))
+        self.assertEqual(resized.data['status'], 'duplicate')
+        self.assertGreaterEqual(resized.data['similarity_score'], 1 - 4 / HASH_BITS)
+
+        edited = picture.copy()
+        ImageDraw.Draw(edited).rectangle([40, 40, 100, 100], fill=(0, 0, 0))
+        response = self.create_post(type='image', image=upload(edited, 'edited.png', 'PNG'))
+        self.assertEqual(response.data['status'], 'suspicious')
+        self.assertLess(response.data['similarity_score'], resized.data['similarity_score'])
+
+
+@override_settings(POST_INGESTION={'ASYNC': True, 'START_LOCAL_WORKERS': False, 'MAX_ATTEMPTS': 3})
+class AsyncPostCreateTests(PostCreateMixin, TestCase):
+    def test_create_is_accepted_and_finished_by_worker(self):
+        text = ' '.join(f'word{i}' for i in range(50))
+        response = self.create_post(type='document', document=self.document(text))
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(response.data['status'], 'processing')
+        status_url = f"/api/posts/{response.data['id']}/status/"
+        pending = self.client.get(status_url).data
+        self.assertEqual((pending['status'], pending['sha256_hash']), ('processing', None))
+        self.assertEqual((pending['job']['state'], pending['job']['stage']), ('pending', 'extract'))
+
+        with mock.patch('posts.ingestion.finalize_post', wraps=finalize_post) as finalize:
+            self.assertTrue(ingestion_queue.process_next_job())
+        self.assertFalse(ingestion_queue.process_next_job())
+
+        post = Post.objects.get(pk=response.data['id'])
+        finalize.assert_called_once()
+        self.assertEqual(finalize.call_args.args[0].pk, post.pk)
+        self.assertEqual(post.content, text)
+        self.assertEqual(post.sha256_hash, text_sha256(text))
+        self.assertTrue(is_hash_recorded(post.sha256_hash))
+        done = self.client.get(status_url).data
+        self.assertEqual((done['status'], done['sha256_hash']), ('original', post.sha256_hash))
+        self.assertEqual((done['job']['state'], done['job']['stage'], done['job']['attempts']), ('done', 'report', 0))
+
+    def test_broken_document_fails_without_retries(self):
+        document = SimpleUploadedFile('broken.pdf', b'%PDF-1.4 broken', content_type='application/pdf')
+        response = self.create_post(type='document', document=document)
+        self.assertEqual(response.status_code, 202)
+        with self.assertLogs('posts.ingestion_queue', 'ERROR'):
+            self.assertTrue(ingestion_queue.process_next_job())
+
+        job = IngestionJob.objects.get(post_id=response.data['id'])
+        self.assertEqual((job.state, job.attempts), ('failed', 1))
+        self.assertIn('ExtractionError', job.last_error)
+        status = self.client.get(f"/api/posts/{response.data['id']}/status/").data
+        self.assertEqual((status['status'], status['job']['state']), ('failed', 'failed'))
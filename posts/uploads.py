@@ -0,0 +1,73 @@
+"""
+SHA-256 загружаемых файлов, посчитанный по частям, пока Django принимает
+загрузку (см. FILE_UPLOAD_HANDLERS), и потоковое хэширование файлов и
+текста без полной копии содержимого в памяти.
+"""
+import hashlib
+
+from django.core.files.uploadhandler import MemoryFileUploadHandler, TemporaryFileUploadHandler
+
+HASH_CHUNK_SIZE = 64 * 1024
+TEXT_SLICE_CHARS = 256 * 1024
+
+
+class HashingUploadMixin:
+    """Считает SHA-256 по приходящим кускам и кладёт его в атрибут sha256 готового файла."""
+
+    def new_file(self, *args, **kwargs):
+        # до super(): MemoryFileUploadHandler.new_file прерывается StopFutureHandlers
+        self._sha256 = hashlib.sha256()
+        super().new_file(*args, **kwargs)
+
+    def receive_data_chunk(self, raw_data, start):
+        if self._consumes_data():
+            self._sha256.update(raw_data)
+        return super().receive_data_chunk(raw_data, start)
+
+    def file_complete(self, file_size):
+        file_obj = super().file_complete(file_size)
+        if file_obj is not None:
+            file_obj.sha256 = self._sha256.hexdigest()
+        return file_obj
+
+    def _consumes_data(self):
+        return True
+
+
+class HashingMemoryFileUploadHandler(HashingUploadMixin, MemoryFileUploadHandler):
+    def _consumes_data(self):
+        # большой файл этот обработчик пропускает дальше, его хэширует следующий
+        return self.activated
+
+
+class HashingTemporaryFileUploadHandler(HashingUploadMixin, TemporaryFileUploadHandler):
+    pass
+
+
+def file_sha256(file_obj):
+    """SHA-256 файла: готовый из обработчика загрузки или по кускам chunks()."""
+    digest = getattr(file_obj, 'sha256', None)
+    if digest:
+        return digest
+    hasher = hashlib.sha256()
+    if hasattr(file_obj, 'chunks'):
+        pieces = file_obj.chunks(HASH_CHUNK_SIZE)
+    else:
+        file_obj.seek(0)
+        pieces = iter(lambda: file_obj.read(HASH_CHUNK_SIZE), b'')
+    for piece in pieces:
+        hasher.update(piece)
+    file_obj.seek(0)
+    return hasher.hexdigest()
+
+
+def update_with_text(hasher, text):
+    # UTF-8 кодирует символы независимо, поэтому хэш срезов равен хэшу всей строки
+    for start in range(0, len(text), TEXT_SLICE_CHARS):
+        hasher.update(text[start:start + TEXT_SLICE_CHARS].encode('utf-8'))
+
+
+def text_sha256(text):
+    hasher = hashlib.sha256()
+    update_with_text(hasher, text)
+    return hasher.hexdigest()
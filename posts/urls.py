@@ -6,19 +6,43 @@ from .views import (
     PostCreateView, PostVerifyView, PostReportView,
     PostDeleteView, PostVoteView,
     PostCommentsListView, PostCommentCreateView,
-    CommentUpdateView, CommentDeleteView, PostListView
+    CommentUpdateView, CommentDeleteView, PostListView,
+    ModelStatusView, PostStatusView, LedgerProofView, PostVerifyBatchView,
+    PostReportExportView, ProfileListView, ProfileDownloadView,
 )
+from .async_views import get_config as get_async_config
+
+if get_async_config()['ENABLED']:
+    # под ASGI: чтение — async-представления, создание и отчёт — в пуле потоков
+    from .async_views import offloaded, post_comments, post_list, post_verify
+
+    list_view, verify_view, comments_view = post_list, post_verify, post_comments
+    create_view = offloaded(PostCreateView.as_view())
+    report_view = offloaded(PostReportView.as_view())
+else:
+    list_view, verify_view, comments_view = (
+        PostListView.as_view(), PostVerifyView.as_view(), PostCommentsListView.as_view()
+    )
+    create_view = PostCreateView.as_view()
+    report_view = PostReportView.as_view()
 
 urlpatterns = [
-    path('', PostListView.as_view(), name='post-list'),
+    path('', list_view, name='post-list'),
 
-    path('create/', PostCreateView.as_view(), name='post-create'),
-    path('verify/', PostVerifyView.as_view(), name='post-verify'),
-    path('report/', PostReportView.as_view(), name='post-report'),
+    path('create/', create_view, name='post-create'),
+    path('verify/', verify_view, name='post-verify'),
+    path('verify/batch/', PostVerifyBatchView.as_view(), name='post-verify-batch'),
+    path('report/', report_view, name='post-report'),
+    path('report/export/', PostReportExportView.as_view(), name='post-report-export'),
+    path('ledger/proof/', LedgerProofView.as_view(), name='ledger-proof'),
+    path('model/status/', ModelStatusView.as_view(), name='model-status'),
+    path('profiles/', ProfileListView.as_view(), name='profile-list'),
+    path('profiles/<str:capture_id>/', ProfileDownloadView.as_view(), name='profile-download'),
 
     # Новые пути:
+    path('<int:pk>/status/', PostStatusView.as_view(), name='post-status'),
     path('<int:pk>/vote/', PostVoteView.as_view(), name='post-vote'),
-    path('<int:pk>/comments/', PostCommentsListView.as_view(), name='post-comments-list'),
+    path('<int:pk>/comments/', comments_view, name='post-comments-list'),
     path('<int:pk>/comments/add/', PostCommentCreateView.as_view(), name='post-comments-create'),
 
     path('<int:pk>/', PostDeleteView.as_view(), name='post-delete'),
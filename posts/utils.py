@@ -1,15 +1,253 @@
+import codecs
+import hashlib
+import multiprocessing
+import os
+import shutil
+import signal
+import tempfile
+import threading
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FutureTimeoutError
+
 import docx2txt
 import PyPDF2
+from django.conf import settings
 
-def extract_text_from_file(file_obj, file_name):
-    if file_name.endswith('.docx'):
-        return docx2txt.process(file_obj)
-    elif file_name.endswith('.pdf'):
-        reader = PyPDF2.PdfReader(file_obj)
+from .uploads import HASH_CHUNK_SIZE, update_with_text
+
+PDF_DEFAULTS = {
+    'WORKERS': 4,
+    'PARALLEL_MIN_PAGES': 16,
+    'MAX_PAGES': 2000,
+    'MAX_BYTES': 20 * 1024 * 1024,
+    'PAGE_TIMEOUT_SECONDS': 10,
+}
+
+
+def get_pdf_config():
+    return {**PDF_DEFAULTS, **getattr(settings, 'PDF_EXTRACTION', {})}
+
+
+# Сколько ждать сверх PAGE_TIMEOUT_SECONDS процесс, который не прервал зависшую страницу сам
+HANG_GRACE_SECONDS = 5
+
+
+class ExtractionError(Exception):
+    """Текст документа не удалось извлечь целиком."""
+
+
+class PageTimeout(Exception):
+    pass
+
+
+def _on_page_timeout(signum, frame):
+    raise PageTimeout()
+
+
+def _init_worker(pids):
+    # pid процесса нужен, чтобы завершить его, если он зависнет вне Python-кода
+    pids.put(os.getpid())
+    signal.signal(signal.SIGALRM, _on_page_timeout)
+
+
+# В процессах пула держим ридер последнего файла, чтобы не разбирать PDF заново на каждой странице
+_worker_reader = (None, None)
+
+
+def _extract_page(path, index, timeout):
+    """Текст страницы или None, если разбор не уложился в timeout секунд (считаются в процессе пула)."""
+    global _worker_reader
+    signal.setitimer(signal.ITIMER_REAL, timeout)
+    try:
+        if _worker_reader[0] != path:
+            _worker_reader = (path, PyPDF2.PdfReader(path))
+        return _worker_reader[1].pages[index].extract_text() or ''
+    except PageTimeout:
+        return None
+    finally:
+        signal.setitimer(signal.ITIMER_REAL, 0)
+
+
+_pool = None
+_pool_pid = None
+_pool_workers = None
+_pool_lock = threading.Lock()
+
+
+def _get_pool(workers):
+    global _pool, _pool_pid, _pool_workers
+    with _pool_lock:
+        if _pool is None or _pool_pid != os.getpid():
+            # spawn: дочерние процессы не наследуют потоки и соединения Django
+            context = multiprocessing.get_context('spawn')
+            _pool_workers = context.SimpleQueue()
+            _pool = ProcessPoolExecutor(workers, mp_context=context, initializer=_init_worker,
+                                        initargs=(_pool_workers,))
+            _pool_pid = os.getpid()
+        return _pool
+
+
+def _discard_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(wait=False, cancel_futures=True)
+            # зависшую задачу не отменить, поэтому процессы пула завершаем; следующий вызов создаст новый пул
+            while not _pool_workers.empty():
+                try:
+                    os.kill(_pool_workers.get(), signal.SIGTERM)
+                except ProcessLookupError:
+                    pass
+            _pool = None
+
+
+def _local_path(file_obj):
+    """Путь к файлу на диске (для процессов пула) и временный файл, который нужно удалить."""
+    if hasattr(file_obj, 'temporary_file_path'):
+        return file_obj.temporary_file_path(), None
+    path = getattr(file_obj, 'path', None)
+    if path and os.path.exists(path):
+        return path, None
+    file_obj.seek(0)
+    tmp = tempfile.NamedTemporaryFile(suffix='.pdf', delete=False)
+    with tmp:
+        shutil.copyfileobj(file_obj, tmp)
+    return tmp.name, tmp.name
+
+
+def _iter_parallel(file_obj, page_count, workers, timeout):
+    path, tmp_path = _local_path(file_obj)
+    pool = _get_pool(workers)
+    window = workers * 4
+    pending = {}
+    try:
+        for index in range(page_count):
+            pending[index] = pool.submit(_extract_page, path, index, timeout)
+            first = index - window + 1
+            if first >= 0:
+                yield _page_result(pending.pop(first), first, timeout)
+        for index in sorted(pending):
+            yield _page_result(pending.pop(index), index, timeout)
+    finally:
+        for future in pending.values():
+            future.cancel()
+        if tmp_path:
+            os.remove(tmp_path)
+
+
+def _page_result(future, index, timeout):
+    # страницы уходят в процессы по порядку: когда ждём эту, она уже разбирается
+    try:
+        text = future.result(timeout=timeout + HANG_GRACE_SECONDS)
+    except FutureTimeoutError:
+        _discard_pool()
+        raise ExtractionError(f"Процесс разбора завис на странице {index + 1}")
+    return '' if text is None else text
+
+
+def _iter_serial(reader, page_count, timeout):
+    """Страницы в текущем потоке; таймаут — SIGALRM, поэтому только в главном потоке."""
+    for index in range(page_count):
+        previous = signal.signal(signal.SIGALRM, _on_page_timeout)
+        signal.setitimer(signal.ITIMER_REAL, timeout)
         try:
-            return '\n'.join([page.extract_text() or '' for page in reader.pages])
-        except Exception:
-            return ''
-    elif file_name.endswith('.txt'):
-        return file_obj.read().decode('utf-8')
-    return ''
+            text = reader.pages[index].extract_text() or ''
+        except PageTimeout:
+            text = ''
+        finally:
+            signal.setitimer(signal.ITIMER_REAL, 0)
+            signal.signal(signal.SIGALRM, previous)
+        yield text
+
+
+def iter_pdf_pages(file_obj, max_pages=None, max_bytes=None, page_timeout=None, workers=None):
+    """
+    Текст страниц PDF по порядку, по одной. Большие документы разбираются пулом
+    процессов; страница, разбор которой занял больше page_timeout секунд, даёт
+    пустую строку. SIGALRM доступен только главному потоку, поэтому в потоке
+    запроса и маленькие документы разбираются пулом.
+    Останавливается на max_pages страницах или max_bytes байтах текста (UTF-8).
+    """
+    config = get_pdf_config()
+    max_pages = max_pages or config['MAX_PAGES']
+    max_bytes = max_bytes or config['MAX_BYTES']
+    page_timeout = page_timeout or config['PAGE_TIMEOUT_SECONDS']
+    workers = workers or config['WORKERS']
+
+    reader = PyPDF2.PdfReader(file_obj)
+    page_count = min(len(reader.pages), max_pages)
+
+    if workers > 1 and page_count >= config['PARALLEL_MIN_PAGES']:
+        pages = _iter_parallel(file_obj, page_count, workers, page_timeout)
+    elif threading.current_thread() is threading.main_thread():
+        pages = _iter_serial(reader, page_count, page_timeout)
+    else:
+        pages = _iter_parallel(file_obj, page_count, max(workers, 1), page_timeout)
+
+    remaining = max_bytes
+    try:
+        for text in pages:
+            encoded = text.encode('utf-8')
+            if len(encoded) >= remaining:
+                yield encoded[:remaining].decode('utf-8', errors='ignore')
+                return
+            remaining -= len(encoded)
+            yield text
+    finally:
+        close = getattr(pages, 'close', None)
+        if close:
+            close()
+
+
+def iter_text_from_file(file_obj, file_name):
+    """
+    Текст документа частями (для PDF — по страницам); части соединяются через '\\n'.
+    Документ, который не удалось разобрать, — ExtractionError, а не обрезанный текст.
+    """
+    try:
+        if file_name.endswith('.docx'):
+            yield docx2txt.process(file_obj)
+        elif file_name.endswith('.pdf'):
+            yield from iter_pdf_pages(file_obj)
+        elif file_name.endswith('.txt'):
+            yield ''.join(_iter_txt(file_obj, get_pdf_config()['MAX_BYTES']))
+    except ExtractionError:
+        raise
+    except Exception as exc:
+        raise ExtractionError(f"Не удалось извлечь текст из {file_name}: {exc}") from exc
+
+
+def _iter_chunks(file_obj):
+    if hasattr(file_obj, 'chunks'):
+        return file_obj.chunks(HASH_CHUNK_SIZE)
+    return iter(lambda: file_obj.read(HASH_CHUNK_SIZE), b'')
+
+
+def _iter_txt(file_obj, max_bytes):
+    """Декодирует .txt по кускам, не дальше max_bytes байт файла."""
+    decoder = codecs.getincrementaldecoder('utf-8')()
+    remaining = max_bytes
+    for chunk in _iter_chunks(file_obj):
+        chunk = chunk[:remaining]
+        remaining -= len(chunk)
+        if remaining <= 0:
+            # обрезанный посередине последний символ отбрасывается
+            yield decoder.decode(chunk)
+            return
+        yield decoder.decode(chunk)
+    yield decoder.decode(b'', final=True)
+
+
+def extract_text_from_file(file_obj, file_name):
+    return '\n'.join(iter_text_from_file(file_obj, file_name))
+
+
+def extract_text_and_hash(file_obj, file_name):
+    """Текст документа и SHA-256 его UTF-8, посчитанный по частям без отдельной копии в байтах."""
+    hasher = hashlib.sha256()
+    parts = []
+    for part in iter_text_from_file(file_obj, file_name):
+        if parts:
+            hasher.update(b'\n')
+        update_with_text(hasher, part)
+        parts.append(part)
+    return '\n'.join(parts), hasher.hexdigest()
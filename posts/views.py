@@ -1,22 +1,32 @@
 from rest_framework import generics, permissions, status
+from rest_framework.exceptions import ValidationError
 from rest_framework.views import APIView
 from rest_framework.response import Response
-from django.http import FileResponse
+from django.http import FileResponse, Http404, StreamingHttpResponse
 from django.shortcuts import get_object_or_404
+from django.urls import reverse
 from django.core.exceptions import PermissionDenied
-from django.conf import settings
+from django.core.handlers.asgi import ASGIRequest
+from django.db import IntegrityError, transaction
+from django.db.models import F
 from .models import Post, Comment, Vote
 from .serializers import PostCreateSerializer, CommentSerializer
-from .utils import extract_text_from_file
-from .blockchain_utils import save_to_blockchain
-from .pdf_utils import generate_report_pdf
-from sentence_transformers import SentenceTransformer, util
+from .pdf_utils import REPORT_FIELDS, ensure_report, get_config as get_reports_config, report_context
+from .report_export import FORMATS as EXPORT_FORMATS, aiter_export, export_contexts, iter_export_pdf, iter_export_zip
+from .file_responses import serve_file
+from .ingestion import read_post_content, analyze_content, finalize_post
+from .ingestion_queue import enqueue_post, is_async_enabled
+from .utils import ExtractionError
+from .model_registry import registry
+from .profiling import capture_path, list_captures
+from .metrics import (
+    POSTS_CREATED, REPORT_REQUEST_SECONDS, VERIFY_LOOKUPS, VERIFY_REQUEST_SECONDS, stage, timed_response,
+    track_stages,
+)
+from .blockchain_utils import get_ledger
+from .bloom import get_config as get_verification_config, get_hash_filter, verify_hashes
 from drf_yasg.utils import swagger_auto_schema
 from drf_yasg import openapi
-import hashlib, json, numpy as np, os
-
-
-model = SentenceTransformer('all-MiniLM-L6-v2')
 
 
 class PostCreateView(generics.CreateAPIView):
@@ -41,100 +51,277 @@ class PostCreateView(generics.CreateAPIView):
     def post(self, request, *args, **kwargs):
         return super().post(request, *args, **kwargs)
 
+    def create(self, request, *args, **kwargs):
+        response = super().create(request, *args, **kwargs)
+        if is_async_enabled():
+            response.status_code = status.HTTP_202_ACCEPTED
+        return response
+
     def perform_create(self, serializer):
         post_type = self.request.data.get('type')
-        text_data = ""
 
-        if post_type == 'document':
-            file = self.request.FILES['document']
-            text_data = extract_text_from_file(file, file.name)
-        elif post_type == 'text':
-            text_data = self.request.data.get('content', '')
-        elif post_type == 'image':
-            text_data = self.request.FILES['image'].read()
+        if is_async_enabled():
+            # файл сохраняется сейчас, всё остальное делают фоновые воркеры
+            post = serializer.save(
+                user=self.request.user,
+                content=self.request.data.get('content', '') if post_type == 'text' else '',
+                sha256_hash='',
+                status='processing',
+                similarity_score=None,
+            )
+            enqueue_post(post)
+            POSTS_CREATED.inc(type=post_type, status=post.status)
+            return
+
+        with track_stages(post_type):
+            with stage('extract'):
+                try:
+                    content, sha256_hash = read_post_content(post_type, self.request.data, self.request.FILES)
+                except ExtractionError as exc:
+                    raise ValidationError({'document': [str(exc)]})
+            result = analyze_content(post_type, content, sha256_hash=sha256_hash)
+            with stage('save'):
+                post = serializer.save(user=self.request.user, **result['fields'])
+            finalize_post(post, result['vector'], result['chunk_vectors'])
+        POSTS_CREATED.inc(type=post_type, status=post.status)
 
-        text_bytes = text_data.encode('utf-8') if isinstance(text_data, str) else text_data
-        sha256_hash = hashlib.sha256(text_bytes).hexdigest()
 
-        embedding = None
-        similarity = 0.0
-        status = "original"
+class PostStatusView(APIView):
+    permission_classes = [permissions.IsAuthenticated]
 
-        if post_type in ['text', 'document'] and text_data.strip():
-            new_embedding = model.encode(text_data, convert_to_tensor=True).cpu()
-            all_posts = Post.objects.exclude(embedding__isnull=True)
-            max_sim = 0.0
+    def get(self, request, pk):
+        post = get_object_or_404(Post.objects.select_related('ingestion_job'), pk=pk)
+        job = getattr(post, 'ingestion_job', None)
+        return Response({
+            "id": post.id,
+            "status": post.status,
+            "similarity_score": post.similarity_score,
+            "sha256_hash": post.sha256_hash or None,
+            "chunk_matches": post.chunk_matches,
+            "job": {
+                "state": job.state,
+                "stage": job.stage,
+                "attempts": job.attempts,
+                "last_error": job.last_error or None,
+                "next_attempt_at": job.next_attempt_at,
+            } if job else None,
+        })
+
+
+class ModelStatusView(APIView):
+    permission_classes = [permissions.IsAdminUser]
+
+    def get(self, request):
+        return Response(registry.stats())
+
+
+class ProfileListView(APIView):
+    permission_classes = [permissions.IsAdminUser]
+
+    @swagger_auto_schema(operation_description="Снимки профилировщика запросов, новые первыми")
+    def get(self, request):
+        captures = list_captures()
+        for capture in captures:
+            capture['download_url'] = request.build_absolute_uri(reverse('profile-download', args=[capture['id']]))
+        return Response(captures)
 
-            for post in all_posts:
-                try:
-                    if not post.embedding:
-                        continue
-                    existing = json.loads(post.embedding)
-                    existing_tensor = np.asarray(existing, dtype=np.float32)
-                    sim = float(util.cos_sim(new_embedding, existing_tensor).item())
-                    if sim > max_sim:
-                        max_sim = sim
-                except Exception:
-                    continue
-
-            similarity = round(max_sim, 4)
-            if similarity > 0.9:
-                status = "duplicate"
-            elif similarity > 0.6:
-                status = "suspicious"
-            embedding = json.dumps(new_embedding.tolist())
-
-        serializer.save(
-            user=self.request.user,
-            content=text_data if isinstance(text_data, str) else '',
-            sha256_hash=sha256_hash,
-            status=status,
-            similarity_score=similarity,
-            embedding=embedding
-        )
 
-        save_to_blockchain(sha256_hash, self.request.user.username, serializer.validated_data.get('title'))
+class ProfileDownloadView(APIView):
+    permission_classes = [permissions.IsAdminUser]
+
+    @swagger_auto_schema(operation_description="Collapsed stacks снимка (для flamegraph.pl или speedscope)")
+    def get(self, request, capture_id):
+        path = capture_path(capture_id)
+        if path is None:
+            raise Http404
+        return FileResponse(open(path, 'rb'), as_attachment=True, filename=f'profile_{capture_id}.folded',
+                            content_type='text/plain; charset=utf-8')
+
+
+def verify_queryset(sha256_hash):
+    return Post.objects.select_related('user').filter(sha256_hash=sha256_hash).order_by('-created_at')
+
+
+def document_url(request, name):
+    return request.build_absolute_uri(Post.document.field.storage.url(name)) if name else None
+
+
+def verify_result(request, post):
+    if post is None:
+        return {"exists": False}
+    return {
+        "exists": True,
+        "title": post.title,
+        "user": post.user.username,
+        "created_at": post.created_at,
+        "document_url": document_url(request, post.document.name),
+    }
 
 
 class PostVerifyView(APIView):
     permission_classes = [permissions.IsAuthenticated]
 
+    @timed_response(VERIFY_REQUEST_SECONDS, endpoint='single')
     def get(self, request):
         hash_to_check = request.query_params.get('hash')
         if not hash_to_check:
             return Response({"error": "Hash parameter is required."}, status=400)
 
-        post = Post.objects.filter(sha256_hash=hash_to_check).order_by('-created_at').first()
+        if get_verification_config()['BLOOM_ENABLED']:
+            known = get_hash_filter()
+            known.sync()
+            if not known.might_contain([hash_to_check])[0]:
+                VERIFY_LOOKUPS.inc(result='bloom_rejected')
+                return Response({"exists": False})
+
+        post = verify_queryset(hash_to_check).first()
+        VERIFY_LOOKUPS.inc(result='found' if post else 'not_found')
+        return Response(verify_result(request, post))
 
-        if post:
-            return Response({
-                "exists": True,
-                "title": post.title,
-                "user": post.user.username,
-                "created_at": post.created_at,
-                "document_url": request.build_absolute_uri(post.document.url) if post.document else None,
-            })
-        return Response({"exists": False})
+
+class PostVerifyBatchView(APIView):
+    permission_classes = [permissions.IsAuthenticated]
+
+    @swagger_auto_schema(
+        operation_description=(
+            "Проверка списка хэшей одним запросом: JSON {\"hashes\": [...]} или "
+            "text/plain с хэшем на каждой строке"
+        ),
+        request_body=openapi.Schema(
+            type=openapi.TYPE_OBJECT,
+            required=['hashes'],
+            properties={'hashes': openapi.Schema(type=openapi.TYPE_ARRAY, items=openapi.Schema(type=openapi.TYPE_STRING))},
+        ),
+    )
+    @timed_response(VERIFY_REQUEST_SECONDS, endpoint='batch')
+    def post(self, request):
+        max_hashes = get_verification_config()['MAX_HASHES']
+        if request.content_type.startswith('application/json'):
+            data = request.data
+            hashes = data.get('hashes') if isinstance(data, dict) else data
+            if not isinstance(hashes, list) or not all(isinstance(h, str) for h in hashes):
+                return Response({"error": "Expected a list of hashes."}, status=400)
+            hashes = [h.strip() for h in hashes if h.strip()]
+        else:
+            # построчный поток: тело не собирается в одну строку
+            hashes = []
+            for line in request.stream or []:
+                line = line.strip().decode('utf-8', errors='replace')
+                if line:
+                    hashes.append(line)
+                if len(hashes) > max_hashes:
+                    break
+        if not hashes:
+            return Response({"error": "Hashes are required."}, status=400)
+        if len(hashes) > max_hashes:
+            return Response({"error": f"At most {max_hashes} hashes per request."}, status=413)
+
+        found = verify_hashes(hashes)
+        results = []
+        for sha256_hash, post in found.items():
+            result = {"hash": sha256_hash, "exists": post is not None}
+            if post is not None:
+                # те же поля, что у verify_result
+                document = post.pop('document')
+                result.update(post, document_url=document_url(request, document))
+            results.append(result)
+        return Response({
+            "count": len(results),
+            "found": sum(1 for post in found.values() if post is not None),
+            "results": results,
+        })
+
+
+class LedgerProofView(APIView):
+    permission_classes = [permissions.IsAuthenticated]
+
+    @swagger_auto_schema(
+        operation_description="Доказательство включения хэша в блок журнала (путь в дереве Меркла)",
+        manual_parameters=[openapi.Parameter('hash', openapi.IN_QUERY, type=openapi.TYPE_STRING, required=True)],
+    )
+    def get(self, request):
+        hash_to_check = request.query_params.get('hash')
+        if not hash_to_check:
+            return Response({"error": "Hash parameter is required."}, status=400)
+
+        proof = get_ledger().proof(hash_to_check)
+        if proof is None:
+            return Response({"error": "Hash is not recorded in the ledger."}, status=404)
+        if not proof['sealed']:
+            # запись есть, но её блок ещё не запечатан
+            return Response(proof, status=status.HTTP_202_ACCEPTED)
+        return Response(proof)
 
 
 class PostReportView(APIView):
     permission_classes = [permissions.IsAuthenticated]
 
+    @timed_response(REPORT_REQUEST_SECONDS)
     def get(self, request):
         hash_to_check = request.query_params.get("hash")
         if not hash_to_check:
             return Response({"error": "Hash parameter is required."}, status=400)
 
-        post = Post.objects.filter(sha256_hash=hash_to_check).order_by("-created_at").first()
+        post = (
+            Post.objects.filter(sha256_hash=hash_to_check)
+            .select_related('user').only(*REPORT_FIELDS)
+            .order_by("-created_at").first()
+        )
         if not post:
             return Response({"error": "Report not found. Try re-uploading the post."}, status=404)
 
-        pdf_path = os.path.join(settings.MEDIA_ROOT, "reports", f"report_{post.sha256_hash}.pdf")
+        pdf_path, fingerprint = ensure_report(report_context(post))
+        return serve_file(request, pdf_path, "application/pdf", fingerprint)
+
 
-        if not os.path.exists(pdf_path):
-            generate_report_pdf(post)
+class PostReportExportView(APIView):
+    permission_classes = [permissions.IsAuthenticated]
 
-        return FileResponse(open(pdf_path, "rb"), content_type="application/pdf")
+    @swagger_auto_schema(
+        operation_description=(
+            "Отчёты по списку хэшей одним потоковым ответом: многостраничный PDF "
+            "или ZIP с отчётом на каждый пост (ненайденные хэши — в missing.txt)"
+        ),
+        request_body=openapi.Schema(
+            type=openapi.TYPE_OBJECT,
+            required=['hashes'],
+            properties={
+                'hashes': openapi.Schema(type=openapi.TYPE_ARRAY, items=openapi.Schema(type=openapi.TYPE_STRING)),
+                'format': openapi.Schema(type=openapi.TYPE_STRING, enum=list(EXPORT_FORMATS), default='zip'),
+            },
+        ),
+    )
+    def post(self, request):
+        max_hashes = get_reports_config()['EXPORT_MAX_HASHES']
+        data = request.data if isinstance(request.data, dict) else {}
+        hashes = data.get('hashes')
+        export_format = data.get('format', 'zip')
+        if not isinstance(hashes, list) or not all(isinstance(h, str) for h in hashes):
+            return Response({"error": "Expected a list of hashes."}, status=400)
+        if export_format not in EXPORT_FORMATS:
+            return Response({"error": f"Format must be one of: {', '.join(EXPORT_FORMATS)}."}, status=400)
+        hashes = [h.strip() for h in hashes if h.strip()]
+        if not hashes:
+            return Response({"error": "Hashes are required."}, status=400)
+        if len(hashes) > max_hashes:
+            return Response({"error": f"At most {max_hashes} hashes per request."}, status=413)
+
+        # посты выбираются до начала потока: генератор ответа к БД не обращается
+        contexts, missing = export_contexts(hashes)
+        if not contexts:
+            return Response({"error": "No posts found for these hashes."}, status=404)
+
+        if export_format == 'pdf':
+            chunks = iter_export_pdf(contexts)
+        else:
+            chunks = iter_export_zip(contexts, missing)
+        if isinstance(request._request, ASGIRequest):
+            chunks = aiter_export(chunks)
+        response = StreamingHttpResponse(chunks, content_type=f'application/{export_format}')
+        response['Content-Disposition'] = f'attachment; filename="reports_{len(contexts)}.{export_format}"'
+        response['X-Reports-Count'] = str(len(contexts))
+        response['X-Missing-Count'] = str(len(missing))
+        return response
 
 
 class PostDeleteView(generics.DestroyAPIView):
@@ -151,9 +338,23 @@ class PostVoteView(APIView):
     permission_classes = [permissions.IsAuthenticated]
 
     def post(self, request, pk):
-        post = get_object_or_404(Post, pk=pk)
-        Vote.objects.get_or_create(user=request.user, post=post)
-        return Response({"message": "Vote added"})
+        post = get_object_or_404(Post.objects.only('id'), pk=pk)
+        with transaction.atomic():
+            try:
+                # уникальность (user, post) проверяет БД: из двух одновременных голосов пройдёт один
+                with transaction.atomic():
+                    Vote.objects.create(user=request.user, post=post)
+            except IntegrityError:
+                message = "Already voted"
+            else:
+                Post.objects.filter(pk=post.pk).update(vote_count=F('vote_count') + 1)
+                message = "Vote added"
+        vote_count = Post.objects.filter(pk=post.pk).values_list('vote_count', flat=True).first()
+        return Response({"message": message, "vote_count": vote_count})
+
+
+def comments_queryset(post_id):
+    return Comment.objects.filter(post_id=post_id).select_related('user').order_by('created_at')
 
 
 class PostCommentsListView(generics.ListAPIView):
@@ -161,8 +362,7 @@ class PostCommentsListView(generics.ListAPIView):
     permission_classes = [permissions.AllowAny]
 
     def get_queryset(self):
-        post_id = self.kwargs['pk']
-        return Comment.objects.filter(post_id=post_id)
+        return comments_queryset(self.kwargs['pk'])
 
 
 class PostCommentCreateView(generics.CreateAPIView):
@@ -170,8 +370,10 @@ class PostCommentCreateView(generics.CreateAPIView):
     permission_classes = [permissions.IsAuthenticated]
 
     def perform_create(self, serializer):
-        post = get_object_or_404(Post, pk=self.kwargs['pk'])
-        serializer.save(post=post, user=self.request.user)
+        post = get_object_or_404(Post.objects.only('id'), pk=self.kwargs['pk'])
+        with transaction.atomic():
+            serializer.save(post=post, user=self.request.user)
+            Post.objects.filter(pk=post.pk).update(comment_count=F('comment_count') + 1)
 
 
 class CommentUpdateView(generics.UpdateAPIView):
@@ -192,13 +394,22 @@ class CommentDeleteView(generics.DestroyAPIView):
     def perform_destroy(self, instance):
         if instance.user != self.request.user:
             raise PermissionDenied("Вы можете удалять только свои комментарии.")
-        instance.delete()
+        with transaction.atomic():
+            instance.delete()
+            Post.objects.filter(pk=instance.post_id, comment_count__gt=0).update(
+                comment_count=F('comment_count') - 1
+            )
 
-from rest_framework import generics
-from .models import Post
-from .serializers import PostCreateSerializer
+from .pagination import KeysetPagination
+from .serializers import PostListSerializer
 
 class PostListView(generics.ListAPIView):
-    queryset = Post.objects.all().order_by('-created_at')
-    serializer_class = PostCreateSerializer
+    # content, эмбеддинги и прочие большие колонки в ленту не загружаются
+    LIST_FIELDS = [
+        'id', 'title', 'type', 'image', 'document', 'status', 'similarity_score',
+        'sha256_hash', 'vote_count', 'comment_count', 'created_at', 'user__id', 'user__username',
+    ]
+    queryset = Post.objects.select_related('user').only(*LIST_FIELDS).order_by('-created_at', '-id')
+    serializer_class = PostListSerializer
+    pagination_class = KeysetPagination
     permission_classes = [permissions.AllowAny]  # или IsAuthenticated если нужно